@@ -37,6 +37,9 @@ class Settings(BaseSettings):
     # Path to Firebase service account credentials
     FIREBASE_CREDENTIALS_PATH: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "firebase-credentials.json")
     
+    # Directory the Gradio app writes its metrics snapshot to (served at /api/metrics)
+    GRADIO_METRICS_DIR: str = os.getenv("GRADIO_METRICS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "gradio_app", "metrics"))
+    
     # Mailgun configuration for sending emails (e.g., bug reports)
     MAILGUN_API_KEY: str = os.getenv("MAILGUN_API_KEY", "")
     MAILGUN_DOMAIN: str = os.getenv("MAILGUN_DOMAIN", "")
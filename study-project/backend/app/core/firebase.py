@@ -7,9 +7,16 @@ import os
 import json
 import glob
 import sys
+import sqlite3
+import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Database of the Gradio app's SQLite assignment store (settings.Study.ASSIGNMENT_DB_FILE)
+ASSIGNMENT_DB_FILE = "assignments.db"
+# Owner index of the Gradio app's lock files (see FileAssignmentStore)
+LOCK_USER_INDEX_DIR = "by_user"
+
 async def store_study_data(data: Dict[Any, Any]) -> None:
   study_token = data.get("study_token")
   timestamp = data.get("timestamp")
@@ -128,6 +135,26 @@ async def store_study_data(data: Dict[Any, Any]) -> None:
     logger.error(f"Error storing study data for user {study_token}: {str(e)}")
     raise e
   
+# Owner of a Gradio app lock file: JSON record {"user_id": ..., "reserved_at": ..., "expires_at": ...}
+# or "user_id:timestamp" in lock files of older versions
+def _get_lock_file_owner(lock_content: str) -> str:
+  if lock_content.startswith("{"):
+    try:
+      return json.loads(lock_content).get("user_id")
+    except ValueError:
+      return None
+  return lock_content.split(":", 1)[0] if ":" in lock_content else None
+
+def _release_user_reservations_in_db(db_path: str, study_token: str) -> int:
+  connection = sqlite3.connect(db_path, timeout=5.0, isolation_level=None)
+  try:
+    connection.execute("BEGIN IMMEDIATE")
+    cursor = connection.execute("DELETE FROM reservations WHERE user_id = ?", (study_token,))
+    connection.execute("COMMIT")
+    return cursor.rowcount
+  finally:
+    connection.close()
+
 async def release_user_locks(study_token: str) -> None:
   logger.info(f"[LOCK_RELEASE] Attempting to release locks for user {study_token}")
   try:
@@ -135,6 +162,15 @@ async def release_user_locks(study_token: str) -> None:
                                   "gradio_app")
     locks_dir = os.path.join(gradio_app_path, "feedback", "locks")
     
+    # Releases the reservations in one transaction if the Gradio app uses the SQLite assignment store
+    db_path = os.path.join(gradio_app_path, "feedback", ASSIGNMENT_DB_FILE)
+    if os.path.exists(db_path):
+      try:
+        released_count = await asyncio.to_thread(_release_user_reservations_in_db, db_path, study_token)
+        logger.info(f"[LOCK_RELEASE] Released {released_count} reservations for user {study_token} in {ASSIGNMENT_DB_FILE}")
+      except Exception as e:
+        logger.error(f"[LOCK_RELEASE] Error releasing reservations in {ASSIGNMENT_DB_FILE}: {str(e)}")
+    
     if not os.path.exists(locks_dir):
       logger.warning(f"[LOCK_RELEASE] Locks directory does not exist: {locks_dir}")
       try:
@@ -144,39 +180,56 @@ async def release_user_locks(study_token: str) -> None:
         logger.error(f"[LOCK_RELEASE] Error creating locks directory: {str(e)}")
       return
     
+    # Owner markers written by the Gradio app (locks/by_user/<user_id>/<scenario_condition_key>)
+    # point to the user's lock files, so only those need to be read
+    user_index_base = os.path.join(locks_dir, LOCK_USER_INDEX_DIR)
+    user_index_dir = os.path.join(user_index_base, study_token)
+    has_valid_token = study_token not in (".", "..") and os.sep not in study_token
+    
     try:
-      lock_files = [os.path.join(locks_dir, f) for f in os.listdir(locks_dir) if f.endswith('.lock')]
-      logger.info(f"[LOCK_RELEASE] Found {len(lock_files)} lock files before release")
+      if os.path.isdir(user_index_base) and has_valid_token:
+        scenario_condition_keys = os.listdir(user_index_dir) if os.path.isdir(user_index_dir) else []
+        lock_files = [os.path.join(locks_dir, f"{key}.lock") for key in scenario_condition_keys]
+      else:
+        lock_files = [os.path.join(locks_dir, f) for f in os.listdir(locks_dir) if f.endswith('.lock')]
+      logger.info(f"[LOCK_RELEASE] Found {len(lock_files)} lock files to check for user {study_token}")
     except Exception as e:
       logger.error(f"[LOCK_RELEASE] Error listing lock files: {str(e)}")
       return
     
     removed_count = 0
     for lock_file_path in lock_files:
+      lock_file_name = os.path.basename(lock_file_path)
       try:
         with open(lock_file_path, 'r') as f:
           lock_content = f.read().strip()
           
-        if study_token in lock_content:
-          logger.info(f"[LOCK_RELEASE] Removing lock file for user {study_token}: {os.path.basename(lock_file_path)}")
+        if _get_lock_file_owner(lock_content) == study_token:
+          logger.info(f"[LOCK_RELEASE] Removing lock file for user {study_token}: {lock_file_name}")
           try:
             os.remove(lock_file_path)
             removed_count += 1
           except PermissionError:
-            logger.warning(f"[LOCK_RELEASE] Permission denied when removing lock file: {os.path.basename(lock_file_path)}")
+            logger.warning(f"[LOCK_RELEASE] Permission denied when removing lock file: {lock_file_name}")
           except FileNotFoundError:
-            logger.warning(f"[LOCK_RELEASE] Lock file no longer exists: {os.path.basename(lock_file_path)}")
+            logger.warning(f"[LOCK_RELEASE] Lock file no longer exists: {lock_file_name}")
           except Exception as remove_error:
-            logger.error(f"[LOCK_RELEASE] Error removing lock file {os.path.basename(lock_file_path)}: {str(remove_error)}")
-        
+            logger.error(f"[LOCK_RELEASE] Error removing lock file {lock_file_name}: {str(remove_error)}")
+      
+      except FileNotFoundError:
+        logger.info(f"[LOCK_RELEASE] Lock file already released: {lock_file_name}")
       except Exception as e:
-        logger.error(f"[LOCK_RELEASE] Error processing lock file {os.path.basename(lock_file_path)}: {str(e)}")
+        logger.error(f"[LOCK_RELEASE] Error processing lock file {lock_file_name}: {str(e)}")
     
-    try:
-      remaining_files = len([f for f in os.listdir(locks_dir) if f.endswith('.lock')])
-      logger.info(f"[LOCK_RELEASE] Removed {removed_count} lock files. {remaining_files} remaining.")
-    except Exception as e:
-      logger.error(f"[LOCK_RELEASE] Error counting remaining lock files: {str(e)}")
+    if has_valid_token and os.path.isdir(user_index_dir):
+      try:
+        for marker in os.listdir(user_index_dir):
+          os.remove(os.path.join(user_index_dir, marker))
+        os.rmdir(user_index_dir)
+      except Exception as e:
+        logger.error(f"[LOCK_RELEASE] Error removing owner markers for user {study_token}: {str(e)}")
+    
+    logger.info(f"[LOCK_RELEASE] Removed {removed_count} lock files for user {study_token}")
     
   except Exception as e:
     logger.error(f"[LOCK_RELEASE] Error in release_user_locks for user {study_token}: {str(e)}")
@@ -0,0 +1,94 @@
+# File: backend/app/core/metrics.py
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Tuple
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Bucket bounds in seconds of the request latency histogram
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Request counts and latencies of the API and page routes, per route template
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, str], int] = {}
+        self._latencies: Dict[Tuple[str, str], List] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float):
+        with self._lock:
+            key = (method, route, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            buckets, total = self._latencies.get((method, route), ([0] * len(REQUEST_BUCKETS), 0.0))
+            for index, bound in enumerate(REQUEST_BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+            self._latencies[(method, route)] = (buckets, total + seconds)
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            requests = dict(self._requests)
+            latencies = {key: (list(buckets), total) for key, (buckets, total) in self._latencies.items()}
+
+        lines = [
+            "# HELP study_backend_requests_total Backend requests by route and status",
+            "# TYPE study_backend_requests_total counter"
+        ]
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f'study_backend_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+        lines.append("# HELP study_backend_request_seconds Backend request latency by route")
+        lines.append("# TYPE study_backend_request_seconds histogram")
+        for (method, route), (buckets, total) in sorted(latencies.items()):
+            count = sum(value for (m, r, _), value in requests.items() if m == method and r == route)
+            for bound, bucket_count in zip(REQUEST_BUCKETS, buckets):
+                lines.append(f'study_backend_request_seconds_bucket{{method="{method}",route="{route}",le="{bound}"}} {bucket_count}')
+            lines.append(f'study_backend_request_seconds_bucket{{method="{method}",route="{route}",le="+Inf"}} {count}')
+            lines.append(f'study_backend_request_seconds_sum{{method="{method}",route="{route}"}} {total}')
+            lines.append(f'study_backend_request_seconds_count{{method="{method}",route="{route}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+request_metrics = RequestMetrics()
+
+# Middleware to record the request metrics (static files are counted as one route)
+class RequestMetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            route_path = getattr(route, "path", None) or "static"
+            request_metrics.observe(request.method, route_path, status, time.perf_counter() - start)
+
+# Reads the metrics the Gradio app writes to GRADIO_METRICS_DIR/metrics.prom and adds
+# the age of that snapshot (empty if the Gradio app hasn't written one yet)
+def read_gradio_metrics() -> str:
+    path = os.path.join(settings.GRADIO_METRICS_DIR, "metrics.prom")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        age = time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return ""
+    except Exception as e:
+        logger.error(f"[Metrics] Error reading Gradio metrics from {path}: {str(e)}")
+        return ""
+
+    return (
+        content
+        + "# HELP study_gradio_snapshot_age_seconds Age of the Gradio metrics snapshot\n"
+        + "# TYPE study_gradio_snapshot_age_seconds gauge\n"
+        + f"study_gradio_snapshot_age_seconds {age:.3f}\n"
+    )
@@ -7,6 +7,7 @@ from firebase_admin import credentials
 
 from app.core.config import get_settings
 from app.core.middleware import SecurityHeadersMiddleware, SessionTrackingMiddleware
+from app.core.metrics import RequestMetricsMiddleware
 from app.routers import api, pages
 
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +31,7 @@ app.add_middleware(
 )
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(SessionTrackingMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
 
 # Add routers
 app.include_router(api.router, prefix=settings.API_V1_STR)
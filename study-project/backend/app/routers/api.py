@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Request, Body
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from typing import Dict, Any, Optional
 import logging
 from datetime import datetime, timezone
@@ -7,6 +7,7 @@ import requests
 from pydantic import BaseModel, Field
 from app.core.config import get_settings
 from app.core.firebase import store_study_data, release_user_locks
+from app.core.metrics import request_metrics, read_gradio_metrics
 import json
 
 settings = get_settings()
@@ -92,6 +93,14 @@ async def submit_study(request: Request):
 async def get_study_token(request: Request):
     return {"study_token": request.cookies.get("study_token")}
 
+# Prometheus text exposition of the backend request metrics and the Gradio app metrics
+@router.get("/metrics")
+async def metrics():
+    return PlainTextResponse(
+        request_metrics.render_prometheus() + read_gradio_metrics(),
+        media_type="text/plain; version=0.0.4"
+    )
+
 @router.post("/report-bug")
 async def report_bug(report: BugReport):
     try:
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Compares computing typing delays token by token with the random module (previous
+# streaming implementation) against building the whole DelaySchedule with NumPy.
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(script_dir)
+sys.path.insert(0, project_dir)
+
+from gradio_app.config import settings
+from gradio_app.models.response_cache import ResponseCache
+from gradio_app.models.delay_schedule import DelaySchedule
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark per-token vs. vectorized delay computation')
+    parser.add_argument('--scenario', default="scenario4", help='Scenario ID of the response to use')
+    parser.add_argument('--condition', default="slow-hard", help='Condition of the response to use')
+    parser.add_argument('--repeats', type=int, default=50, help='Number of schedules built per approach')
+    parser.add_argument('--seed', type=int, default=1234, help='Session seed used for the vectorized schedule')
+    return parser.parse_args()
+
+def per_token_delays(compiled_response):
+    chat = settings.Chat
+    delays = []
+    for i, token_text in enumerate(compiled_response.deltas):
+        if not token_text:
+            delays.append(0.0)
+            continue
+
+        min_delay, max_delay = chat.RESPONSE_DELAY_RANGE
+        delay = random.uniform(min_delay, max_delay) / chat.RESPONSE_BASE_DELAY_DIVISOR
+        if random.random() < chat.TYPING_VARIANCE_CHANCE:
+            delay *= chat.TYPING_VARIANCE_RESPONSE_DELAY_MULTIPLIER
+        if token_text[-1] in {'.', ',', '!', '?', ';'}:
+            delay *= chat.PUNCTUATION_DELAY_MULTIPLIER
+        if random.random() < chat.EXTRA_HESITATION_PROBABILITY:
+            delay += chat.EXTRA_HESITATION_DELAY
+        delays.append(delay)
+    return delays
+
+def timed(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Compiles the response directly: the scenario manager would start the study state (task distributor, index files)
+    response_cache = ResponseCache(os.path.join(project_dir, "gradio_app", "answers"))
+    compiled_response = response_cache.get(args.scenario, args.condition)
+    if compiled_response is None:
+        logging.error(f"No response found for {args.scenario}/{args.condition}")
+        sys.exit(1)
+
+    token_count = len(compiled_response)
+    seed = DelaySchedule.derive_seed(args.seed, args.scenario, args.condition)
+
+    per_token_time = timed(lambda: per_token_delays(compiled_response), args.repeats)
+    schedule_time = timed(lambda: DelaySchedule.build(compiled_response, seed=seed), args.repeats)
+
+    first = DelaySchedule.build(compiled_response, seed=seed)
+    second = DelaySchedule.build(compiled_response, seed=seed)
+    reproducible = bool((first.delays == second.delays).all())
+
+    logging.info(f"Response {args.scenario}/{args.condition}: {token_count} tokens")
+    logging.info(f"Per-token random delays: {per_token_time * 1e3:.3f} ms per response ({per_token_time / token_count * 1e6:.3f} µs/token)")
+    logging.info(f"Vectorized DelaySchedule: {schedule_time * 1e3:.3f} ms per response ({schedule_time / token_count * 1e6:.3f} µs/token)")
+    logging.info(f"Planned typing duration: {first.total_duration:.2f} s, reproducible with same seed: {reproducible}")
+
+    sys.exit(0)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Compares the per-token decode cost of re-decoding the whole response on every
+# token (previous streaming implementation) against the incremental detokenizer.
+
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(script_dir)
+sys.path.insert(0, project_dir)
+
+from gradio_app.utils.detokenizer import IncrementalDetokenizer
+from gradio_app.utils.tokenizer import get_encoder
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark full re-decode vs. incremental detokenization')
+    parser.add_argument('--model', default="gpt-4o", help='Model name used to select the tiktoken encoding')
+    parser.add_argument('--lengths', default="100,200,400,800,1600", help='Comma separated response lengths in tokens')
+    parser.add_argument('--repeats', type=int, default=5, help='Number of runs per length (best run is reported)')
+    return parser.parse_args()
+
+def load_corpus_tokens(tokenizer, min_tokens):
+    answers_dir = os.path.join(project_dir, "gradio_app", "answers")
+    response_files = sorted(glob.glob(os.path.join(answers_dir, "*", "*", "response.txt")))
+
+    text = ""
+    for response_file in response_files:
+        with open(response_file, "r", encoding="utf-8") as f:
+            text += f.read() + "\n\n"
+
+    if not text:
+        text = "Dies ist ein Beispieltext mit Umlauten (ä, ö, ü, ß) und Emojis 🩺💊.\n"
+
+    tokens = tokenizer.encode(text)
+    while len(tokens) < min_tokens:
+        tokens = tokens + tokens
+    return tokens
+
+def run_full_decode(tokenizer, tokens):
+    accumulated_tokens = []
+    accumulated_text = ""
+    for token in tokens:
+        accumulated_tokens.append(token)
+        new_text = tokenizer.decode(accumulated_tokens)
+        accumulated_text = new_text
+    return accumulated_text
+
+def run_incremental_decode(tokenizer, tokens):
+    detokenizer = IncrementalDetokenizer(tokenizer)
+    parts = []
+    for token in tokens:
+        parts.append(detokenizer.push(token))
+    parts.append(detokenizer.flush())
+    return "".join(parts)
+
+def best_time(fn, tokenizer, tokens, repeats):
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(tokenizer, tokens)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == "__main__":
+    args = parse_args()
+    lengths = [int(length) for length in args.lengths.split(",") if length.strip()]
+
+    tokenizer = get_encoder(args.model)
+    corpus_tokens = load_corpus_tokens(tokenizer, max(lengths))
+
+    logging.info(f"{'tokens':>8} | {'full decode µs/token':>22} | {'incremental µs/token':>22} | {'speedup':>8}")
+
+    for length in lengths:
+        tokens = corpus_tokens[:length]
+        full_time, full_text = best_time(run_full_decode, tokenizer, tokens, args.repeats)
+        incremental_time, incremental_text = best_time(run_incremental_decode, tokenizer, tokens, args.repeats)
+
+        if full_text != incremental_text:
+            logging.error(f"Decoded text mismatch for {length} tokens")
+            sys.exit(1)
+
+        full_per_token = full_time / length * 1e6
+        incremental_per_token = incremental_time / length * 1e6
+        speedup = full_time / incremental_time if incremental_time > 0 else float("inf")
+
+        logging.info(f"{length:>8} | {full_per_token:>22.2f} | {incremental_per_token:>22.2f} | {speedup:>7.1f}x")
+
+    sys.exit(0)
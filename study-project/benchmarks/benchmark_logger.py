@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Compares the per-call cost of the previous log_print (inspect.stack() on every call)
+# with the current one (sys._getframe, cached module loggers, lazy %-formatting) for
+# printed, level-filtered and disabled records at several call stack depths.
+# Printed output goes to os.devnull while timing.
+
+import os
+import sys
+import time
+import inspect
+import logging
+import argparse
+import contextlib
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(script_dir)
+sys.path.insert(0, project_dir)
+
+from gradio_app.config import GradioSettings
+from gradio_app.utils.logger import log_print, configure_logging, DEBUG
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the per-call cost of log_print')
+    parser.add_argument('--calls', type=int, default=20000, help='Number of log calls per measurement')
+    parser.add_argument('--depths', default="5,20,50", help='Comma separated call stack depths of the logging caller')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of runs per measurement (best run is reported)')
+    parser.add_argument('--async-queue', action='store_true', help='Print through the QueueHandler listener thread')
+    return parser.parse_args()
+
+def legacy_log_print(message):
+    if GradioSettings.Logging.ENABLED:
+        caller_frame = inspect.stack()[1]
+        filename = os.path.basename(caller_frame.filename)
+
+        formatted_message = GradioSettings.Logging.FORMAT.format(
+            filename=filename,
+            message=message
+        )
+        print(formatted_message)
+
+# Typical hot path call: the message is an f-string for the previous implementation
+# and lazy %-arguments for the current one
+def call_legacy(calls, user_id, scenario_id):
+    for _ in range(calls):
+        legacy_log_print(f"Marked scenario {scenario_id} as in-progress for user {user_id}")
+
+def call_current(calls, user_id, scenario_id):
+    for _ in range(calls):
+        log_print("Marked scenario %s as in-progress for user %s", scenario_id, user_id)
+
+def call_current_debug(calls, user_id, scenario_id):
+    for _ in range(calls):
+        log_print("Marked scenario %s as in-progress for user %s", scenario_id, user_id, level=DEBUG)
+
+# Runs fn at the given call stack depth
+def at_depth(depth, fn, *args):
+    if depth <= 1:
+        return fn(*args)
+    return at_depth(depth - 1, fn, *args)
+
+def best_per_call(fn, depth, calls, repeats):
+    best = None
+    for _ in range(repeats):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            at_depth(depth, fn, calls, "user123", "scenario1_condition2")
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / calls * 1e6
+
+if __name__ == "__main__":
+    args = parse_args()
+    depths = [int(depth) for depth in args.depths.split(",") if depth.strip()]
+    configure_logging(level="INFO", use_queue=args.async_queue)
+
+    logging.info(f"{'depth':>6} | {'case':<10} | {'previous µs/call':>17} | {'current µs/call':>16} | {'speedup':>8}")
+
+    for depth in depths:
+        cases = [
+            ("printed", True, call_current),
+            ("filtered", True, call_current_debug),
+            ("disabled", False, call_current),
+        ]
+        for case, enabled, current_fn in cases:
+            GradioSettings.Logging.ENABLED = enabled
+            # The previous implementation had no levels: a "filtered" record was printed
+            legacy_time = best_per_call(call_legacy, depth, args.calls, args.repeats)
+            current_time = best_per_call(current_fn, depth, args.calls, args.repeats)
+            speedup = legacy_time / current_time if current_time > 0 else float("inf")
+            logging.info(f"{depth:>6} | {case:<10} | {legacy_time:>17.2f} | {current_time:>16.2f} | {speedup:>7.1f}x")
+
+    GradioSettings.Logging.ENABLED = True
+    sys.exit(0)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# Measures reservations per second under contention: several threads repeatedly reserve
+# and release a small set of scenario-condition keys. Compares the previous lock file
+# acquisition (write + fsync, reopen + flock, rewrite + fsync) with the O_EXCL lock files
+# of the FileAssignmentStore and with the SQLite store. Also counts reservations whose
+# lock file named another owner while held (clobbered by a competing attempt).
+
+import os
+import sys
+import time
+import fcntl
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(script_dir)
+sys.path.insert(0, project_dir)
+
+from gradio_app.config import settings
+from gradio_app.models.assignment_store import FileAssignmentStore, SQLiteAssignmentStore
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark reservation throughput under contention')
+    parser.add_argument('--threads', type=int, default=16, help='Number of competing threads')
+    parser.add_argument('--keys', type=int, default=16, help='Number of scenario-condition keys')
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds per backend')
+    parser.add_argument('--hold-time', type=float, default=0.0, help='Seconds a reservation is held before release')
+    parser.add_argument('--retry-wait', type=float, default=0.0005, help='Seconds a thread waits after a failed attempt')
+    parser.add_argument('--backends', default="legacy,file,sqlite", help='Comma separated backends: legacy, file, sqlite')
+    parser.add_argument('--app-logging', action='store_true', help='Keep the log output of the Gradio app enabled')
+    return parser.parse_args()
+
+class LegacyLockFiles:
+    """
+    Lock file acquisition of the previous FileAssignmentStore.
+    """
+
+    def __init__(self, feedback_dir):
+        self.lock_file_base = os.path.join(feedback_dir, "locks")
+        os.makedirs(self.lock_file_base, exist_ok=True)
+        self._local = threading.local()
+
+    def _get_lock_file_path(self, scenario_condition_key):
+        return os.path.join(self.lock_file_base, f"{scenario_condition_key}.lock")
+
+    # Open lock file handles of the current thread (the flock is held while the handle is open)
+    def _get_handles(self):
+        if not hasattr(self._local, "handles"):
+            self._local.handles = {}
+        return self._local.handles
+
+    def reserve(self, scenario_condition_key, user_id, expires_at=None):
+        lock_file_path = self._get_lock_file_path(scenario_condition_key)
+        lock_file = None
+        try:
+            with open(lock_file_path, 'w') as f:
+                f.write(f"{user_id}:{datetime.now().isoformat()}")
+                f.flush()
+                os.fsync(f.fileno())
+
+            lock_file = open(lock_file_path, 'r+')
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(f"{user_id}:{datetime.now().isoformat()}")
+            lock_file.flush()
+            os.fsync(lock_file.fileno())
+
+            self._get_handles()[scenario_condition_key] = lock_file
+            return True
+        except IOError:
+            if lock_file:
+                lock_file.close()
+            return False
+
+    def get_reservation_owner(self, scenario_condition_key):
+        try:
+            with open(self._get_lock_file_path(scenario_condition_key), 'r') as f:
+                content = f.read().strip()
+            return content.split(':', 1)[0] if content else None
+        except FileNotFoundError:
+            return None
+
+    def release(self, scenario_condition_key):
+        lock_file = self._get_handles().pop(scenario_condition_key, None)
+        try:
+            os.remove(self._get_lock_file_path(scenario_condition_key))
+        except FileNotFoundError:
+            pass
+        if lock_file:
+            lock_file.close()
+
+def create_backend(name, feedback_dir):
+    if name == "legacy":
+        return LegacyLockFiles(feedback_dir)
+    if name == "file":
+        return FileAssignmentStore(feedback_dir)
+    if name == "sqlite":
+        return SQLiteAssignmentStore(feedback_dir)
+    raise ValueError(f"Unknown backend: {name}")
+
+def run_backend(name, args):
+    feedback_dir = tempfile.mkdtemp(prefix=f"benchmark_reservations_{name}_")
+    store = create_backend(name, feedback_dir)
+    keys = [f"scenario{index // 4 + 1}_condition{index % 4}" for index in range(args.keys)]
+
+    counts = {"attempts": 0, "reserved": 0, "clobbered": 0}
+    counts_lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def worker(thread_index):
+        rng = random.Random(thread_index)
+        user_id = f"bench{thread_index}"
+        attempts = reserved = clobbered = 0
+
+        while time.perf_counter() < stop_at:
+            scenario_condition_key = rng.choice(keys)
+            attempts += 1
+            if not store.reserve(scenario_condition_key, user_id, expires_at=datetime.now() + timedelta(minutes=60)):
+                # Without a pause, spinning threads starve the holders of the GIL
+                time.sleep(args.retry_wait)
+                continue
+
+            reserved += 1
+            if args.hold_time:
+                time.sleep(args.hold_time)
+            if store.get_reservation_owner(scenario_condition_key) != user_id:
+                clobbered += 1
+            store.release(scenario_condition_key)
+
+        with counts_lock:
+            counts["attempts"] += attempts
+            counts["reserved"] += reserved
+            counts["clobbered"] += clobbered
+
+    threads = [threading.Thread(target=worker, args=(thread_index,)) for thread_index in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    shutil.rmtree(feedback_dir, ignore_errors=True)
+    return counts, elapsed
+
+if __name__ == "__main__":
+    args = parse_args()
+    settings.Logging.ENABLED = args.app_logging
+
+    logging.info(f"{args.threads} threads competing for {args.keys} keys, {args.duration:.1f} s per backend")
+    for name in [backend.strip() for backend in args.backends.split(",") if backend.strip()]:
+        counts, elapsed = run_backend(name, args)
+        logging.info(
+            f"{name:>6}: {counts['reserved'] / elapsed:9.1f} reservations/s, "
+            f"{counts['attempts'] / elapsed:9.1f} attempts/s, "
+            f"{counts['reserved']}/{counts['attempts']} succeeded, {counts['clobbered']} clobbered owner records"
+        )
+
+    sys.exit(0)
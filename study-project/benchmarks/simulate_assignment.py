@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# Drives synthetic participants through the TaskDistributor (reserve, complete or abandon)
+# against a temporary feedback directory and reports assignment latency, state lock
+# contention and how evenly the completions are spread over the scenario/condition cells.
+# Used to compare selection strategies (--scenario-order) and assignment stores (--store).
+
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(script_dir)
+sys.path.insert(0, project_dir)
+
+from gradio_app.config import settings
+from gradio_app.models.selection_algorithm import TaskDistributor
+from gradio_app.utils.journal import journal_writer
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Simulate participants against the TaskDistributor')
+    parser.add_argument('--participants', type=int, default=2000, help='Number of synthetic participants')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of participants active at the same time')
+    parser.add_argument('--abandon-rate', type=float, default=0.1, help='Probability that a participant leaves the study before finishing')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Seconds a participant spends on a scenario before completing it')
+    parser.add_argument('--retries', type=int, default=3, help='Selection attempts of a participant when no scenario is free')
+    parser.add_argument('--retry-wait', type=float, default=0.01, help='Seconds a participant waits before selecting again')
+    parser.add_argument('--store', choices=["file", "sqlite"], default=settings.Study.ASSIGNMENT_STORE, help='Assignment store backend')
+    parser.add_argument('--scenario-order', choices=["latin_square", "random"], default=settings.Study.SCENARIO_ORDER, help='Scenario order strategy')
+    parser.add_argument('--answers-dir', default=os.path.join(project_dir, "gradio_app", "answers"), help='Scenario tree to assign from')
+    parser.add_argument('--feedback-dir', default=None, help='Feedback directory to use (default: new temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary feedback directory')
+    parser.add_argument('--seed', type=int, default=1234, help='Random seed of the participant behaviour')
+    parser.add_argument('--app-logging', action='store_true', help='Keep the log output of the Gradio app enabled')
+    return parser.parse_args()
+
+class TimedLock:
+    """
+    Wraps the TaskDistributor state lock and records how long every acquire waited.
+    """
+
+    def __init__(self, lock):
+        self._lock = lock
+        self.wait_times = []
+
+    def acquire(self, *args, **kwargs):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(*args, **kwargs)
+        self.wait_times.append(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+class SimulationStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.select_latencies = []
+        self.complete_latencies = []
+        self.assignments = 0
+        self.failed_selections = 0
+        self.finished = 0
+        self.abandoned = 0
+        self.turned_away = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def format_latencies(values):
+    return (
+        f"p50 {percentile(values, 0.50) * 1e3:.3f} ms, p90 {percentile(values, 0.90) * 1e3:.3f} ms, "
+        f"p99 {percentile(values, 0.99) * 1e3:.3f} ms, max {max(values, default=0.0) * 1e3:.3f} ms"
+    )
+
+def run_participant(task_distributor, participant_index, args, stats):
+    user_id = f"sim{participant_index:06d}"
+    rng = random.Random(args.seed * 1000003 + participant_index)
+    scenarios_to_do = task_distributor.max_scenarios_per_user
+    abandon_after = rng.randrange(scenarios_to_do) if rng.random() < args.abandon_rate else None
+
+    for scenario_index in range(scenarios_to_do):
+        scenario_id = condition = None
+        for attempt in range(args.retries):
+            start = time.perf_counter()
+            scenario_id, condition = task_distributor.select_next_scenario_for_user(user_id)
+            stats.select_latencies.append(time.perf_counter() - start)
+            if scenario_id:
+                break
+            stats.add(failed_selections=1)
+            time.sleep(args.retry_wait)
+
+        if not scenario_id:
+            stats.add(turned_away=1)
+            task_distributor.release_all_user_locks(user_id)
+            return
+
+        stats.add(assignments=1)
+        if args.think_time:
+            time.sleep(rng.uniform(0.5, 1.5) * args.think_time)
+
+        if abandon_after == scenario_index:
+            # Tab closed: the reservation is released and the partial data is moved to the backup
+            task_distributor.release_all_user_locks(user_id)
+            task_distributor.cleanup_user_data(user_id)
+            stats.add(abandoned=1)
+            return
+
+        start = time.perf_counter()
+        task_distributor.mark_scenario_completed(user_id, scenario_id, condition)
+        stats.complete_latencies.append(time.perf_counter() - start)
+
+    stats.add(finished=1)
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    settings.Study.ASSIGNMENT_STORE = args.store
+    settings.Study.SCENARIO_ORDER = args.scenario_order
+    settings.Logging.ENABLED = args.app_logging
+
+    feedback_dir = args.feedback_dir or tempfile.mkdtemp(prefix="simulate_assignment_")
+    task_distributor = TaskDistributor(os.path.abspath(args.answers_dir), feedback_dir)
+    timed_lock = TimedLock(task_distributor.state_lock)
+    task_distributor.state_lock = timed_lock
+
+    scenario_conditions = task_distributor.catalog_loader.get().scenario_condition_pairs()
+    if not scenario_conditions:
+        logging.error(f"No scenarios found in {args.answers_dir}")
+        sys.exit(1)
+
+    logging.info(f"Simulating {args.participants} participants ({args.concurrency} concurrent, abandon rate {args.abandon_rate}) "
+                 f"with store '{args.store}' and scenario order '{args.scenario_order}' in {feedback_dir}")
+
+    stats = SimulationStats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(run_participant, task_distributor, participant_index, args, stats)
+            for participant_index in range(args.participants)
+        ]
+        for future in futures:
+            future.result()
+    # Completion records are written in batches by the journal writer
+    journal_writer.flush()
+    wall_time = time.perf_counter() - start
+
+    cell_counts = [
+        task_distributor.global_completions.get(f"{scenario_id}_{condition}", 0)
+        for scenario_id, condition in scenario_conditions
+    ]
+    condition_balanced_users = sum(
+        1 for completions in task_distributor.user_completions.values()
+        if len({key.split('_', 1)[1] for key in completions}) == len(completions)
+    )
+    lock_wait_total = sum(timed_lock.wait_times)
+
+    logging.info(f"Wall time: {wall_time:.2f} s, {stats.assignments / wall_time:.1f} assignments/s")
+    logging.info(f"Participants: {stats.finished} finished, {stats.abandoned} abandoned, {stats.turned_away} turned away")
+    logging.info(f"Assignments: {stats.assignments}, failed selections: {stats.failed_selections}")
+    logging.info(f"Selection latency: {format_latencies(stats.select_latencies)}")
+    logging.info(f"Completion latency: {format_latencies(stats.complete_latencies)}")
+    logging.info(f"State lock: {len(timed_lock.wait_times)} acquires, waited {lock_wait_total:.3f} s in total "
+                 f"({lock_wait_total / (wall_time * args.concurrency) * 100:.1f}% of participant time), "
+                 f"p99 {percentile(timed_lock.wait_times, 0.99) * 1e3:.3f} ms, max {max(timed_lock.wait_times, default=0.0) * 1e3:.3f} ms")
+    journal_stats = journal_writer.stats()
+    logging.info(f"Journal: {journal_stats['records']} records written in {journal_stats['batches']} batches")
+    logging.info(f"Cell balance over {len(cell_counts)} cells: min {min(cell_counts)}, max {max(cell_counts)}, "
+                 f"mean {statistics.mean(cell_counts):.2f}, variance {statistics.pvariance(cell_counts):.3f}")
+    logging.info(f"Participants without a repeated condition: {condition_balanced_users}/{len(task_distributor.user_completions)}")
+
+    if args.feedback_dir is None and not args.keep:
+        shutil.rmtree(feedback_dir, ignore_errors=True)
+
+    sys.exit(0)
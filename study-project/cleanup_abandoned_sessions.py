@@ -24,6 +24,8 @@ logging.basicConfig(
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, script_dir)
 
+from gradio_app.models.assignment_store import parse_lock_record
+
 def cleanup_stale_lock_files(lock_dir, stale_hours=1.0):
     if not os.path.exists(lock_dir):
         logging.warning(f"Lock directory does not exist: {lock_dir}")
@@ -45,17 +47,13 @@ def cleanup_stale_lock_files(lock_dir, stale_hours=1.0):
                 is_stale_by_content = False
                 try:
                     with open(lock_file, 'r') as f:
-                        content = f.read().strip()
+                        record = parse_lock_record(f.read())
                     
-                    if ':' in content:
-                        parts = content.split(':', 1)
-                        if len(parts) >= 2:
-                            timestamp_str = parts[1].split('T')[0]
-                            try:
-                                today_str = current_time.strftime('%Y-%m-%d')
-                                is_stale_by_content = timestamp_str != today_str
-                            except Exception:
-                                pass
+                    if record and record["expires_at"]:
+                        is_stale_by_content = record["expires_at"] <= current_time
+                    elif record and record["reserved_at"]:
+                        # Lock files of older versions have no expiry, only the reservation time
+                        is_stale_by_content = record["reserved_at"].date() != current_time.date()
                 
                 except Exception as e:
                     logging.error(f"Error reading lock file content: {str(e)}")
@@ -19,6 +19,9 @@ logging.basicConfig(
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, script_dir)
 
+# Manifest of the chart cache of gradio_app/models/metrics_visualizer.py
+CHART_MANIFEST_FILE = "chart_manifest.json"
+
 def load_environment():
     backend_env_path = os.path.join(script_dir, 'backend', '.env')
     if os.path.exists(backend_env_path):
@@ -27,6 +30,20 @@ def load_environment():
     else:
         logging.warning(f"Backend .env file not found at {backend_env_path}")
 
+# Files of the charts cached by the metrics visualizer (it removes them itself once unused)
+def load_cached_chart_files(cache_dir):
+    manifest_path = os.path.join(cache_dir, CHART_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return set()
+    
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("entries", {})
+        return {entry["file"] for entry in entries.values() if entry.get("file")}
+    except Exception as e:
+        logging.error(f"Error reading chart manifest {manifest_path}: {str(e)}")
+        return None
+
 def cleanup_local_cache(cache_dir, max_age_days=7):
     if not os.path.exists(cache_dir):
         logging.warning(f"Cache directory {cache_dir} does not exist")
@@ -42,8 +59,14 @@ def cleanup_local_cache(cache_dir, max_age_days=7):
             "design_chart.png"
         ]
         
+        cached_files = load_cached_chart_files(cache_dir)
+        if cached_files is None:
+            logging.warning("Chart manifest unreadable, skipping the cache cleanup")
+            return 0
+        
         logging.info(f"Cleaning up cache directory: {cache_dir}")
         logging.info(f"Essential charts that will be preserved: {essential_charts}")
+        logging.info(f"Cached charts that will be preserved: {len(cached_files)}")
         
         for file_name in os.listdir(cache_dir):
             file_path = os.path.join(cache_dir, file_name)
@@ -55,6 +78,9 @@ def cleanup_local_cache(cache_dir, max_age_days=7):
                 logging.info(f"Keeping essential chart: {file_name}")
                 continue
             
+            if file_name in cached_files or file_name.startswith(CHART_MANIFEST_FILE):
+                continue
+            
             mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
             age_days = (now - mtime).days
             
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Exports the static word vector table of the spaCy similarity model as .npy files,
+# so the Gradio app can run with SIMILARITY_BACKEND=vectors without loading the model.
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+import numpy as np
+import spacy
+from spacy.attrs import LOWER
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+
+from gradio_app.config import settings
+from gradio_app.models.similarity import (
+    VECTOR_TABLE_METADATA_FILE,
+    VECTOR_TABLE_VECTORS_FILE,
+    VECTOR_TABLE_KEYS_FILE,
+    VECTOR_TABLE_ROWS_FILE
+)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export the word vectors of the similarity model for the vector-only backend')
+    parser.add_argument('--model', default=settings.Chat.SIMILARITY_SPACY_MODEL, help='spaCy model to export the vectors from')
+    parser.add_argument('--output-dir', default=settings.Chat.SIMILARITY_VECTORS_DIR, help='Directory to write the vector table to')
+    return parser.parse_args()
+
+def export_vectors(model_name, output_dir):
+    logging.info(f"Loading spaCy model {model_name}")
+    nlp = spacy.load(model_name, exclude=settings.Chat.SIMILARITY_EXCLUDED_PIPES)
+    vectors = nlp.vocab.vectors
+
+    if vectors.size == 0:
+        logging.error(f"Model {model_name} has no word vectors")
+        return False
+
+    # Sorted key (string hash) -> row mapping, looked up with np.searchsorted
+    key_rows = sorted((int(key), int(row)) for key, row in vectors.key2row.items())
+    keys = np.array([key for key, _ in key_rows], dtype=np.uint64)
+    rows = np.array([row for _, row in key_rows], dtype=np.int64)
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, VECTOR_TABLE_VECTORS_FILE), np.ascontiguousarray(vectors.data, dtype=np.float32))
+    np.save(os.path.join(output_dir, VECTOR_TABLE_KEYS_FILE), keys)
+    np.save(os.path.join(output_dir, VECTOR_TABLE_ROWS_FILE), rows)
+
+    metadata = {
+        "model": model_name,
+        "language": nlp.lang,
+        "attr": "LOWER" if getattr(vectors, "attr", None) == LOWER else "ORTH",
+        "shape": list(vectors.data.shape),
+        "keys": len(keys)
+    }
+    with open(os.path.join(output_dir, VECTOR_TABLE_METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+    logging.info(f"Exported {vectors.data.shape[0]} vectors ({len(keys)} keys) to {output_dir}")
+    return True
+
+def verify_scores(model_name, output_dir):
+    from gradio_app.models.similarity import SpacySimilarity, VectorTableSimilarity
+    from gradio_app.models.scenario import scenario_manager
+
+    spacy_backend = SpacySimilarity(model_name)
+    vector_backend = VectorTableSimilarity(output_dir)
+
+    questions = list(dict.fromkeys(scenario_manager.get_scenario_questions()))
+    max_difference = 0.0
+    for question in questions:
+        for other_question in questions:
+            difference = abs(spacy_backend.similarity(question, other_question) - vector_backend.similarity(question, other_question))
+            max_difference = max(max_difference, difference)
+
+    logging.info(f"Max. score difference between spaCy and vector table backend on {len(questions)} questions: {max_difference:.2e}")
+    return max_difference < 1e-5
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if not export_vectors(args.model, args.output_dir):
+        sys.exit(1)
+
+    if not verify_scores(args.model, args.output_dir):
+        logging.error("Vector table backend scores differ from the spaCy backend")
+        sys.exit(1)
+
+    sys.exit(0)
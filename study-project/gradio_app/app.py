@@ -2,6 +2,7 @@ import os
 import sys
 import traceback
 import uuid
+import random
 from datetime import datetime, timedelta
 import gradio as gr
 
@@ -11,6 +12,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from gradio_app.config import settings
 from gradio_app.utils.logger import log_print
 from gradio_app.utils.assets import load_asset
+from gradio_app.utils.tokenizer import warm_encoders
+from gradio_app.utils.metrics import metrics_registry
 from gradio_app.models.scenario import scenario_manager
 from gradio_app.models.chat import chat_model
 from gradio_app.models.feedback import feedback_model
@@ -46,6 +49,14 @@ class UserSession:
         # Token rate data
         self.token_rate_tokens_per_second = None
         
+        # Planned-vs-actual pacing of the last streamed response
+        self.stream_pacing = None
+        
+        # Seed for the simulated typing delays, stored with the feedback so the
+        # delay schedules of this session can be reproduced. Drawn on authentication,
+        # as gr.State copies this initial session object for every visitor.
+        self.delay_seed = None
+        
         # Session timeout in minutes (default: 60 minutes)
         self.timeout_minutes = 60
         
@@ -54,6 +65,21 @@ class UserSession:
     def update_activity(self):
         self.last_activity = datetime.now()
     
+    # Renews the lease on the current scenario (takes the state lock and rewrites the reservation,
+    # so it is only called from the synchronous heartbeat handler, never on the event loop).
+    # An open tab without activity for a whole lease doesn't renew, so its reservation expires.
+    def renew_reservation(self):
+        if not self.study_token or not self.current_scenario_id or self.feedback_submitted or self.study_completed:
+            return
+        
+        if datetime.now() - self.last_activity > timedelta(seconds=settings.Study.RESERVATION_LEASE_SECONDS):
+            return
+        
+        try:
+            scenario_manager.task_distributor.renew_lease(self.study_token, self.current_scenario_id, self.current_condition)
+        except Exception as e:
+            log_print(f"Error renewing reservation lease for {self.study_token}: {str(e)}")
+    
     def is_timed_out(self):
         time_since_activity = datetime.now() - self.last_activity
         timeout_threshold = timedelta(minutes=self.timeout_minutes)
@@ -67,6 +93,7 @@ class UserSession:
     def set_authentication(self, study_token):
         self.study_token = study_token
         self.is_authenticated = True
+        self.delay_seed = random.getrandbits(32)
         log_print(f"Session {self.session_id} authenticated with token: {study_token}")
     
     def set_scenario(self, scenario_id, condition, scenario_data):
@@ -75,10 +102,12 @@ class UserSession:
         self.current_scenario_data = scenario_data
         
         self.token_rate_tokens_per_second = None
+        self.stream_pacing = None
         
         self.feedback_submitted = False
         
         self.chat_history = []
+        self.update_activity()
         
         if scenario_id and scenario_id not in self.scenario_history:
             self.scenario_history.append(scenario_id)
@@ -113,6 +142,11 @@ class ChatApp:
     def launch(self):
         try:
             log_print("Launching application")
+            self._warm_caches()
+            # Builds the lock and completion indexes, importing the scenario manager only reads them
+            scenario_manager.task_distributor.store.prepare()
+            scenario_manager.task_distributor.start_reaper()
+            self._start_metrics()
             self.build_interface()
             self.interface.queue(max_size=settings.QUEUE_SIZE).launch(
                 server_name=settings.HOST,
@@ -126,7 +160,32 @@ class ChatApp:
             log_print(f"Error launching application: {str(e)}")
             gr.Error("Die Anwendung konnte nicht gestartet werden. Bitte kontaktieren Sie den Administrator.")
             raise
-    
+
+    # Registers the gauge collectors and writes the metrics snapshot periodically,
+    # which the backend serves at /api/metrics and the metrics report reads
+    def _start_metrics(self):
+        metrics_registry.add_collector(scenario_manager.task_distributor.collect_metrics)
+        metrics_registry.add_collector(chat_model.collect_metrics)
+        metrics_registry.start_snapshot_writer()
+
+    # Loads the tokenizer, precompiles all scenario responses and vectorizes the scenario questions
+    # so the first participants don't pay for it. Failures are not fatal, as all are also loaded lazily.
+    def _warm_caches(self):
+        try:
+            warm_encoders()
+        except Exception as e:
+            log_print(f"Error loading tokenizer: {str(e)}")
+        
+        try:
+            scenario_manager.warm_response_cache()
+        except Exception as e:
+            log_print(f"Error warming response cache: {str(e)}")
+        
+        try:
+            chat_model.warm_similarity_cache(scenario_manager.get_scenario_questions())
+        except Exception as e:
+            log_print(f"Error warming similarity cache: {str(e)}")
+
     def build_interface(self):
         with gr.Blocks(analytics_enabled=False, css=self.custom_css, theme=settings.Visuals.GRADIO_THEME) as self.interface:
             self.components["session"] = gr.State(UserSession())
@@ -137,6 +196,9 @@ class ChatApp:
             self.components["scenario_id_state"] = gr.State("")
             self.components["condition_state"] = gr.State("")
             
+            # Keeps the scenario reservation of an open page alive while the participant reads or thinks
+            self.components["heartbeat_timer"] = gr.Timer(settings.Study.HEARTBEAT_INTERVAL_SECONDS)
+            
             with gr.Column(elem_id="app-container"):
                 self._build_token_auth()
                 
@@ -210,8 +272,22 @@ class ChatApp:
         self._setup_input_validation()
         self._setup_chat_events()
         self._setup_feedback_events()
+        self._setup_heartbeat_events()
         log_print("All events set up")
     
+    def _setup_heartbeat_events(self):
+        self.components["heartbeat_timer"].tick(
+            fn=self._renew_reservation_heartbeat,
+            inputs=[self.components["session"]],
+            outputs=None,
+            queue=False,
+            show_progress="hidden"
+        )
+    
+    def _renew_reservation_heartbeat(self, session):
+        if session:
+            session.renew_reservation()
+    
     def _setup_token_auth_events(self):
         self.components["auth_button"].click(
             fn=auth_model.validate_token,
@@ -252,11 +328,11 @@ class ChatApp:
                 log_print(f"POST-SELECT: selected_next_scenario_for_user returned: {scenario_id}, {condition}")
                 
                 if scenario_id and condition:
-                    lock_file_path = os.path.join(scenario_manager.task_distributor.lock_file_base, f"{scenario_id}_{condition}.lock")
-                    if os.path.exists(lock_file_path):
-                        log_print(f"Lock file verified: {lock_file_path} exists for initial scenario")
+                    reservation_owner = scenario_manager.task_distributor.store.get_reservation_owner(f"{scenario_id}_{condition}")
+                    if reservation_owner == session.study_token:
+                        log_print(f"Reservation verified: {scenario_id}_{condition} is reserved for initial scenario")
                     else:
-                        log_print(f"WARNING: Lock file doesn't exist for initial scenario: {lock_file_path}")
+                        log_print(f"WARNING: Reservation doesn't exist for initial scenario: {scenario_id}_{condition} (owner: {reservation_owner})")
             
             if not scenario_id or not condition:
                 scenario_data = settings.Scenario.COMPLETION_SCENARIO
@@ -271,12 +347,8 @@ class ChatApp:
                 
                 log_print(f"User {session.study_token} has no available scenarios (completed)")
             else:
-                scenario_path = os.path.join(scenario_manager.scenarios_dir, scenario_id, condition, "scenario.json")
-                
                 try:
-                    with open(scenario_path, "r", encoding="utf-8") as f:
-                        import json
-                        scenario_data = json.load(f)
+                    scenario_data = scenario_manager.get_scenario_data(scenario_id, condition)
                     
                     session.set_scenario(scenario_id, condition, scenario_data)
                     
@@ -321,13 +393,17 @@ class ChatApp:
     
     def _setup_input_validation(self):
         self.components["user_input"].input(
-            fn=chat_model.validate_input,
+            fn=chat_model.validate_input_debounced,
             inputs=[
                 self.components["user_input"],
                 self.components["session"]
             ],
             outputs=[self.components["send_btn"]],
-            queue=True
+            queue=True,
+            trigger_mode="multiple",
+            concurrency_limit=settings.Chat.VALIDATION_CONCURRENCY_LIMIT,
+            concurrency_id="input_validation",
+            show_progress="hidden"
         )
     
     def _check_session_timeout(self, user_input, chat_history, session):
@@ -378,7 +454,7 @@ class ChatApp:
             ],
             queue=False
         ).then(
-            fn=chat_model.generate_streaming_response,
+            fn=chat_model.generate_streaming_response_async,
             inputs=[
                 self.components["message_state"],
                 self.components["chatbot"],
@@ -389,6 +465,7 @@ class ChatApp:
                 self.components["chatbot"]
             ],
             queue=True,
+            concurrency_limit=settings.Chat.STREAMING_CONCURRENCY_LIMIT,
             show_progress="hidden"
         ).then(
             fn=self._show_feedback_with_session,
@@ -608,12 +685,8 @@ class ChatApp:
                     session
                 ]
             
-            scenario_path = os.path.join(scenario_manager.scenarios_dir, scenario_id, condition, "scenario.json")
-            
             try:
-                with open(scenario_path, "r", encoding="utf-8") as f:
-                    import json
-                    scenario_data = json.load(f)
+                scenario_data = scenario_manager.get_scenario_data(scenario_id, condition)
                 
                 session.set_scenario(scenario_id, condition, scenario_data)
                 
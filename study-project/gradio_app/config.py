@@ -32,9 +32,25 @@ class GradioSettings:
         MESSAGE_VALIDATION_NOT_SIMILAR = "Deine Frage entspricht noch nicht der Frage des aktuellen Szenarios. Bitte passe deine Nachricht an die aktuelle Frage an."
         MESSAGE_VALIDATION_NOT_SIMILAR_VISIBLE = False
 
+        # Similarity model (only the tokenizer and the static word vectors are used)
+        SIMILARITY_BACKEND = os.environ.get("SIMILARITY_BACKEND", "spacy") # "spacy" (loads the model) or "vectors" (memory-mapped vector table exported with export_similarity_vectors.py)
+        SIMILARITY_SPACY_MODEL = "de_core_news_md"
+        SIMILARITY_VECTORS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "similarity_vectors")
+        SIMILARITY_EXCLUDED_PIPES = ["tok2vec", "tagger", "morphologizer", "parser", "lemmatizer", "attribute_ruler", "ner", "senter"]
+        SIMILARITY_CACHE_SIZE = 2048 # Number of message vectors kept in the LRU cache
+
+        # Input validation debouncing. Validations run as async jobs in their own
+        # concurrency group, so they don't hold the workers used by other events
+        VALIDATION_DEBOUNCE_SECONDS = 0.3 # Only the latest input of a session within this window is validated
+        VALIDATION_CONCURRENCY_LIMIT = None
+
         # Tokenizer model name
         TOKENIZER_MODEL_NAME = "gpt-4o"
 
+        # Max. number of responses streamed at once (None = unlimited). Streaming runs
+        # as an async generator on the event loop, so it does not need a worker thread each
+        STREAMING_CONCURRENCY_LIMIT = None
+
         # Avatar settings
         AVATAR_FALLBACK_SVG_COLOR = "#4a90e2"
         AVATAR_SIZE = 48
@@ -78,6 +94,9 @@ Ein Fehler ist aufgetreten. Bitte versuche es erneut."""
         NEWLINE_DELAY = 0.0885  # Delay for empty line/newline 
         CODE_BLOCK_MARKER_DELAY = 0.22125  # Delay for code block markers 
         
+        # Streaming update coalescing
+        STREAM_COALESCE_WINDOW = 0.05  # Tokens planned within the same window (in seconds) are sent as one UI update (0 = one update per token)
+        
         # Text streaming variations
         TYPING_VARIANCE_CHANCE = 0.177  # Chance for a typing variance 
         TYPING_VARIANCE_RESPONSE_DELAY_MULTIPLIER = 1.10625  # Multiplier for delay when thinking 
@@ -148,8 +167,17 @@ Ein Fehler ist aufgetreten. Bitte versuche es erneut."""
         # Delay and timeout settings
         FEEDBACK_CONFIRMATION_DELAY = 0.5  # Delay after saving feedback before showing confirmation
         FEEDBACK_COOKIE_FETCH_TIMEOUT = 10.0  # Timeout for fetching the study token cookie
+        
+        # Group-commit journal for feedback and completion records (see utils/journal.py)
+        JOURNAL_MAX_QUEUE_SIZE = 1024  # Records waiting to be written, submitting blocks while the queue is full
+        JOURNAL_MAX_BATCH_SIZE = 256  # Records written and fsynced together
+        JOURNAL_MAX_BATCH_DELAY = 0.002  # Seconds the writer waits for more records before writing a batch
 
     class Scenario:
+        # Seconds between mtime checks of the answers directory; the scenario catalog is rebuilt
+        # when a scenario, condition or file changed (0 disables the check, use refresh_catalog)
+        CATALOG_CHECK_INTERVAL_SECONDS = 30
+        
         # Scenario messages with markdown
         NO_SCENARIO_RESPONSE = """## ⚠️ Keine Antwort verfügbar
         
@@ -175,6 +203,26 @@ Beim Laden der Antwort ist ein Fehler aufgetreten."""
         }
 
     class Study:
+        # Storage of scenario reservations and completions: "file" (lock files + completion index,
+        # single process) or "sqlite" (SQLite database in WAL mode, can be shared by several processes)
+        ASSIGNMENT_STORE = os.environ.get("ASSIGNMENT_STORE", "file")
+        ASSIGNMENT_DB_FILE = "assignments.db"  # Created in the feedback directory
+        ASSIGNMENT_DB_TIMEOUT = 5.0  # Seconds to wait for a concurrent writer
+        
+        # Scenario order of a participant: "latin_square" (rows of a balanced Latin square, assigned
+        # round-robin) or "random". Conditions are always the least-completed ones the participant hasn't seen.
+        SCENARIO_ORDER = os.environ.get("SCENARIO_ORDER", "latin_square")
+        
+        # Reservations are leases renewed by a heartbeat while the page is open and the participant
+        # was active within the last lease. A closed or idle tab frees its scenario after at most
+        # one lease plus one reaper interval.
+        RESERVATION_LEASE_SECONDS = 300
+        HEARTBEAT_INTERVAL_SECONDS = 60
+        
+        # Background reaper for abandoned sessions
+        RESERVATION_REAPER_INTERVAL_SECONDS = 30  # How often expired leases are released
+        ABANDONED_SESSION_SWEEP_INTERVAL_SECONDS = 600  # How often user directories and orphaned reservations are checked
+        
         # Latency ranges for different conditions
         LATENCY_RANGES = {
             "fast": (0.7, 0.9),  # Fast response time range: between 0.7 and 0.9 seconds thinking delay
@@ -193,8 +241,25 @@ Beim Laden der Antwort ist ein Fehler aufgetreten."""
             min_delay, max_delay = latency_range
             return random.uniform(min_delay, max_delay)
 
+    class Metrics:
+        # The metrics registry (utils/metrics.py) is written to this directory as metrics.prom
+        # (served by the backend at /api/metrics) and metrics.json (read by the metrics report)
+        SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics")
+        SNAPSHOT_INTERVAL_SECONDS = 15  # 0 disables the snapshot writer
+        SNAPSHOT_MAX_AGE_SECONDS = 300  # Older snapshots are ignored by the metrics report
+        # Bucket bounds in seconds of the Prometheus histograms (the registry keeps finer buckets)
+        PROMETHEUS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+        # Charts of the metrics report (models/metrics_visualizer.py)
+        CHART_UPLOAD_WORKERS = 4  # Concurrent ImgBB uploads over one pooled HTTP session
+        CHART_UPLOAD_TIMEOUT_SECONDS = 30
+        CHART_UPLOAD_EXPIRATION_SECONDS = 7 * 24 * 60 * 60  # ImgBB deletes the uploaded charts after 7 days
+        CHART_CACHE_ENABLED = True  # Reuse the PNG and URL of charts whose input didn't change (logs/metrics_images/chart_manifest.json)
+        CHART_URL_REFRESH_MARGIN_SECONDS = 3 * 24 * 60 * 60  # Cached URLs in a report stay valid at least this long, older ones are uploaded again
+
     class Logging:
         ENABLED = True
-        FORMAT = "[{filename}] {message}"
+        FORMAT = "[{filename}] {message}" # Also available: {level}
+        LEVEL = os.environ.get("LOG_LEVEL", "INFO") # Records below this level are dropped before formatting
+        ASYNC = os.environ.get("LOG_ASYNC", "0") == "1" # Prints on a background thread (QueueHandler) instead of the calling thread
 
 settings = GradioSettings()
\ No newline at end of file
@@ -0,0 +1,167 @@
+# Counter-balanced selection of the next scenario/condition pair for a participant
+import random
+
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print
+
+SCENARIO_ORDER_LATIN_SQUARE = "latin_square"
+SCENARIO_ORDER_RANDOM = "random"
+
+
+# Rows of a balanced Latin square (Williams design) over the given items: every item
+# appears once in every position and follows every other item equally often.
+# An odd number of items needs the mirrored rows as well (2n rows).
+def balanced_latin_square(items):
+    items = list(items)
+    n = len(items)
+    rows = []
+
+    for row_index in range(n):
+        row = []
+        low, high = 0, 0
+        for position in range(n):
+            if position < 2 or position % 2 != 0:
+                value = low
+                low += 1
+            else:
+                value = n - high - 1
+                high += 1
+            row.append(items[(value + row_index) % n])
+        rows.append(row)
+
+    if n % 2 != 0:
+        rows.extend([list(reversed(row)) for row in rows])
+
+    return rows
+
+
+class ConditionBuckets:
+    """
+    Bucket queue of the conditions of one scenario keyed by completion count.
+    Changing a count moves the condition to another bucket in O(1), and the
+    least-completed conditions are read from the non-empty buckets in sorted
+    order. There are at most as many buckets as conditions, so neither depends
+    on the number of participants or on the gaps between the counts.
+    """
+
+    __slots__ = ("counts", "buckets")
+
+    def __init__(self, condition_counts):
+        self.counts = {}
+        self.buckets = {}
+
+        for condition, count in condition_counts.items():
+            self.counts[condition] = count
+            self.buckets.setdefault(count, {})[condition] = None
+
+    def shift(self, condition, delta):
+        count = self.counts.get(condition)
+        if count is None:
+            return
+
+        new_count = max(0, count + delta)
+        if new_count == count:
+            return
+
+        bucket = self.buckets[count]
+        del bucket[condition]
+        if not bucket:
+            del self.buckets[count]
+
+        self.counts[condition] = new_count
+        self.buckets.setdefault(new_count, {})[condition] = None
+
+    # Yields the conditions from least to most completed, ties in random order
+    def iter_least_completed(self):
+        for count in sorted(self.buckets):
+            conditions = list(self.buckets.get(count, ()))
+            random.shuffle(conditions)
+            yield from conditions
+
+
+class AssignmentEngine:
+    """
+    Keeps per-(scenario, condition) completion counters in bucket queues and
+    yields the candidate pairs for a participant in priority order: scenarios in
+    the participant's counterbalanced order (a row of a balanced Latin square, or
+    random), and within a scenario the least-completed conditions the participant
+    has not experienced yet, skipping pairs reserved by another participant.
+    Callers must serialize access (TaskDistributor holds its state_lock).
+    """
+
+    def __init__(self, scenario_conditions, global_completions, scenario_order=None):
+        self.scenario_order = scenario_order or settings.Study.SCENARIO_ORDER
+        if self.scenario_order not in (SCENARIO_ORDER_LATIN_SQUARE, SCENARIO_ORDER_RANDOM):
+            log_print(f"Unknown scenario order '{self.scenario_order}', using {SCENARIO_ORDER_LATIN_SQUARE}")
+            self.scenario_order = SCENARIO_ORDER_LATIN_SQUARE
+
+        self.user_rows = {}
+        self._next_row = 0
+        self.rebuild(scenario_conditions, global_completions)
+
+    # (Re)builds the buckets and Latin square rows, e.g. after the scenario catalog changed.
+    # scenario_conditions maps scenario_id -> conditions.
+    def rebuild(self, scenario_conditions, global_completions):
+        self.scenario_ids = tuple(scenario_conditions)
+        self.buckets = {
+            scenario_id: ConditionBuckets({
+                condition: global_completions.get(f"{scenario_id}_{condition}", 0)
+                for condition in conditions
+            })
+            for scenario_id, conditions in scenario_conditions.items()
+        }
+        self.latin_square_rows = balanced_latin_square(self.scenario_ids)
+
+    def record_completion(self, scenario_condition_key):
+        self._shift(scenario_condition_key, 1)
+
+    def record_removal(self, scenario_condition_key):
+        self._shift(scenario_condition_key, -1)
+
+    def _shift(self, scenario_condition_key, delta):
+        scenario_id, condition = scenario_condition_key.split('_', 1)
+        buckets = self.buckets.get(scenario_id)
+        if buckets is not None:
+            buckets.shift(condition, delta)
+
+    def get_condition_count(self, scenario_id, condition):
+        buckets = self.buckets.get(scenario_id)
+        return buckets.counts.get(condition, 0) if buckets else 0
+
+    # Scenario order of a participant. Latin square rows are handed out round-robin
+    # on the participant's first selection and kept for the following ones.
+    def get_scenario_order(self, user_id):
+        if self.scenario_order == SCENARIO_ORDER_RANDOM or not self.latin_square_rows:
+            scenario_ids = list(self.scenario_ids)
+            random.shuffle(scenario_ids)
+            return scenario_ids
+
+        row_index = self.user_rows.get(user_id)
+        if row_index is None:
+            row_index = self._next_row
+            self._next_row += 1
+            self.user_rows[user_id] = row_index
+
+        return self.latin_square_rows[row_index % len(self.latin_square_rows)]
+
+    def forget_user(self, user_id):
+        self.user_rows.pop(user_id, None)
+
+    # Yields (scenario_id, condition) candidates in priority order. The first pass only
+    # offers conditions the participant hasn't experienced, the second pass any condition.
+    # is_reserved(scenario_condition_key) tells whether a pair is held by someone else.
+    def iter_candidates(self, user_id, completed_scenarios, experienced_conditions, is_reserved):
+        scenario_order = [
+            scenario_id for scenario_id in self.get_scenario_order(user_id)
+            if scenario_id not in completed_scenarios
+        ]
+
+        for allow_experienced in (False, True):
+            for scenario_id in scenario_order:
+                for condition in self.buckets[scenario_id].iter_least_completed():
+                    experienced = condition in experienced_conditions
+                    if experienced != allow_experienced:
+                        continue
+                    if is_reserved(f"{scenario_id}_{condition}"):
+                        continue
+                    yield scenario_id, condition
@@ -0,0 +1,593 @@
+# Persistent storage of scenario reservations and completions for the TaskDistributor
+import os
+import glob
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print
+from gradio_app.models.completion_index import CompletionIndex
+from gradio_app.utils.journal import journal_writer
+
+# Directory in feedback/locks with one owner marker file per reservation (by_user/<user_id>/<key>)
+USER_INDEX_DIR = "by_user"
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+# Content of a lock file: {"user_id": ..., "reserved_at": ..., "expires_at": ...}
+def format_lock_record(user_id, reserved_at, expires_at=None):
+    return json.dumps({
+        "user_id": user_id,
+        "reserved_at": reserved_at.isoformat(),
+        "expires_at": expires_at.isoformat() if expires_at else None
+    })
+
+
+# Parses the content of a lock file into a dict with user_id, reserved_at and expires_at
+# (datetimes or None). Also reads the "user_id:timestamp" format of older lock files.
+# Returns None for empty or unreadable content.
+def parse_lock_record(content):
+    content = content.strip()
+    if not content:
+        return None
+
+    if content.startswith("{"):
+        try:
+            record = json.loads(content)
+        except ValueError:
+            return None
+        return {
+            "user_id": record.get("user_id"),
+            "reserved_at": _parse_timestamp(record.get("reserved_at")),
+            "expires_at": _parse_timestamp(record.get("expires_at"))
+        }
+
+    user_id, _, reserved_at = content.partition(':')
+    return {
+        "user_id": user_id or None,
+        "reserved_at": _parse_timestamp(reserved_at),
+        "expires_at": None
+    }
+
+
+class FileAssignmentStore:
+    """
+    Stores reservations as lock files in feedback/locks and completions in the
+    append-only completion index. A lock file is created atomically with
+    O_CREAT | O_EXCL and holds a JSON record of the owner, reservation time and
+    expiry, written with a single fsync. Every reservation also has an empty
+    owner marker file in feedback/locks/by_user/<user_id>/<scenario_condition_key>,
+    so the reservations of a user are found without reading every lock file.
+    Creating the store and loading the completions don't write to the feedback
+    directory; the lock directory and the indexes are set up by prepare.
+    """
+
+    def __init__(self, feedback_dir):
+        self.feedback_dir = feedback_dir
+        self.lock_file_base = os.path.join(feedback_dir, "locks")
+        self.user_index_base = os.path.join(self.lock_file_base, USER_INDEX_DIR)
+
+        self.completion_index = CompletionIndex(feedback_dir, journal=journal_writer)
+
+        self._prepared = False
+        self._prepare_lock = threading.Lock()
+
+    # Creates the lock directory, the owner markers of existing lock files and the completion
+    # index (e.g. first start after an update). Called by the app at startup and before the
+    # first write of other processes, so processes that only read never write to the feedback directory.
+    def prepare(self):
+        if self._prepared:
+            return
+
+        with self._prepare_lock:
+            if self._prepared:
+                return
+
+            os.makedirs(self.user_index_base, exist_ok=True)
+            self._rebuild_user_index()
+
+            if not self.completion_index.exists():
+                log_print("Completion index not found, building it from the feedback directory")
+                self.completion_index.rebuild()
+            self._prepared = True
+
+    def _get_lock_file_path(self, scenario_condition_key):
+        return os.path.join(self.lock_file_base, f"{scenario_condition_key}.lock")
+
+    # Returns the owner index directory of a user (None for IDs that are no valid directory name)
+    def _get_user_index_dir(self, user_id):
+        if not user_id or user_id in (".", "..") or os.sep in user_id:
+            return None
+        return os.path.join(self.user_index_base, user_id)
+
+    def _read_lock_record(self, lock_file_path):
+        with open(lock_file_path, 'r') as f:
+            return parse_lock_record(f.read())
+
+    def _read_lock_owner(self, lock_file_path):
+        record = self._read_lock_record(lock_file_path)
+        return record["user_id"] if record else None
+
+    # Creates a lock file with the given content, fails (returns False) if it already exists
+    def _create_lock_file(self, lock_file_path, content):
+        try:
+            fd = os.open(lock_file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+
+        try:
+            os.write(fd, content.encode("utf-8"))
+            os.fsync(fd)
+        except Exception:
+            os.close(fd)
+            os.remove(lock_file_path)
+            raise
+        os.close(fd)
+        return True
+
+    # Atomically replaces the content of a lock file (written to a temp file and renamed over it)
+    def _replace_lock_file(self, lock_file_path, content):
+        temp_path = f"{lock_file_path}.{uuid.uuid4().hex}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            os.write(fd, content.encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp_path, lock_file_path)
+
+    # Removes a lock file only if it still holds the given record. The file is renamed away
+    # first, only one process can do that; if the renamed file is no longer that record
+    # (renewed or re-created in the meantime) it is put back. Returns True if the lock file is gone.
+    def _remove_lock_file_if(self, lock_file_path, matches):
+        removed_path = f"{lock_file_path}.{uuid.uuid4().hex}.removed"
+        try:
+            os.rename(lock_file_path, removed_path)
+        except FileNotFoundError:
+            return True
+
+        try:
+            if matches(self._read_lock_record(removed_path)):
+                return True
+            try:
+                os.link(removed_path, lock_file_path)
+            except FileExistsError:
+                log_print(f"Lock file {os.path.basename(lock_file_path)} was re-created during a conditional removal")
+            return False
+        finally:
+            os.remove(removed_path)
+
+    # Removes an expired lock file so it can be re-created
+    def _take_over_expired(self, lock_file_path, expired_record):
+        return self._remove_lock_file_if(lock_file_path, lambda record: record == expired_record)
+
+    def _add_owner_marker(self, scenario_condition_key, user_id):
+        user_index_dir = self._get_user_index_dir(user_id)
+        if user_index_dir:
+            os.makedirs(user_index_dir, exist_ok=True)
+            open(os.path.join(user_index_dir, scenario_condition_key), 'a').close()
+
+    def _remove_owner_marker(self, scenario_condition_key, user_id):
+        user_index_dir = self._get_user_index_dir(user_id)
+        if not user_index_dir:
+            return
+        try:
+            os.remove(os.path.join(user_index_dir, scenario_condition_key))
+            if not os.listdir(user_index_dir):
+                os.rmdir(user_index_dir)
+        except OSError:
+            pass
+
+    # Creates the owner markers of existing lock files (e.g. written before the index existed)
+    def _rebuild_user_index(self):
+        for lock_file in glob.glob(os.path.join(self.lock_file_base, "*.lock")):
+            try:
+                self._add_owner_marker(os.path.basename(lock_file).replace(".lock", ""), self._read_lock_owner(lock_file))
+            except Exception as e:
+                log_print(f"Error indexing lock file {os.path.basename(lock_file)}: {str(e)}")
+
+    # Returns (user_completions, global_completions), read from the feedback files until prepare built the index
+    def load_completions(self):
+        return self.completion_index.load_or_crawl()
+
+    # Reserves a scenario-condition pair for a user. Succeeds if the pair is free, already
+    # reserved by the same user (the record is renewed) or its reservation has expired.
+    def reserve(self, scenario_condition_key, user_id, expires_at=None):
+        self.prepare()
+        lock_file_path = self._get_lock_file_path(scenario_condition_key)
+        reserved_at = datetime.now()
+        content = format_lock_record(user_id, reserved_at, expires_at)
+
+        try:
+            if self._create_lock_file(lock_file_path, content):
+                self._add_owner_marker(scenario_condition_key, user_id)
+                return True
+
+            try:
+                current_record = self._read_lock_record(lock_file_path)
+            except FileNotFoundError:
+                current_record = None
+            if not current_record:
+                # Released or still being written by another reservation
+                return False
+
+            if current_record["user_id"] == user_id:
+                self._replace_lock_file(lock_file_path, content)
+                self._add_owner_marker(scenario_condition_key, user_id)
+                return True
+
+            expired_at = current_record["expires_at"]
+            if expired_at and expired_at <= reserved_at and self._take_over_expired(lock_file_path, current_record):
+                log_print(f"Taking over expired reservation {scenario_condition_key} of user {current_record['user_id']}")
+                self._remove_owner_marker(scenario_condition_key, current_record["user_id"])
+                if self._create_lock_file(lock_file_path, content):
+                    self._add_owner_marker(scenario_condition_key, user_id)
+                    return True
+
+            return False
+        except Exception as e:
+            log_print(f"Error acquiring lock for {scenario_condition_key}: {str(e)}")
+            return False
+
+    # Moves the expiry of a reservation held by the user. Returns False if the
+    # reservation is gone or held by someone else.
+    def renew(self, scenario_condition_key, user_id, expires_at):
+        lock_file_path = self._get_lock_file_path(scenario_condition_key)
+        try:
+            record = self._read_lock_record(lock_file_path)
+            if not record or record["user_id"] != user_id:
+                return False
+
+            reserved_at = record["reserved_at"] or datetime.now()
+            self._replace_lock_file(lock_file_path, format_lock_record(user_id, reserved_at, expires_at))
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            log_print(f"Error renewing lock for {scenario_condition_key}: {str(e)}")
+            return False
+
+    # Releases a reservation. With a user_id, only if the lock record still has that owner
+    # and expiry (not renewed or reclaimed by another user since the caller read it).
+    def release(self, scenario_condition_key, user_id=None, expires_at=None):
+        lock_file_path = self._get_lock_file_path(scenario_condition_key)
+        try:
+            if user_id is None:
+                owner = self._read_lock_owner(lock_file_path)
+                os.remove(lock_file_path)
+            else:
+                owner = user_id
+                still_held = lambda record: bool(record) and record["user_id"] == user_id and record["expires_at"] == expires_at
+                if not self._remove_lock_file_if(lock_file_path, still_held):
+                    log_print(f"Lock for {scenario_condition_key} was renewed or reclaimed, not releasing it")
+                    return False
+            self._remove_owner_marker(scenario_condition_key, owner)
+            log_print(f"Released file lock for {scenario_condition_key}")
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            log_print(f"Error releasing lock for {scenario_condition_key}: {str(e)}")
+            return False
+
+    # Releases the user's reservation and appends the completion to the index.
+    # Returns a Future that resolves once the index record is on disk.
+    def complete(self, user_id, scenario_id, condition):
+        self.prepare()
+        scenario_condition_key = f"{scenario_id}_{condition}"
+        if self.get_reservation_owner(scenario_condition_key) == user_id:
+            self.release(scenario_condition_key)
+        return self.completion_index.append_completion(user_id, scenario_id, condition)
+
+    def purge_user(self, user_id):
+        self.prepare()
+        return self.completion_index.append_purge(user_id)
+
+    def get_reservation_owner(self, scenario_condition_key):
+        try:
+            return self._read_lock_owner(self._get_lock_file_path(scenario_condition_key))
+        except FileNotFoundError:
+            return None
+
+    # Returns the scenario-condition keys reserved by a user (reads only the user's
+    # lock files; markers whose lock file is gone or owned by someone else are removed)
+    def find_user_reservations(self, user_id):
+        user_index_dir = self._get_user_index_dir(user_id)
+        if not user_index_dir or not os.path.isdir(user_index_dir):
+            return []
+
+        user_reservations = []
+        for scenario_condition_key in sorted(os.listdir(user_index_dir)):
+            if self.get_reservation_owner(scenario_condition_key) == user_id:
+                user_reservations.append(scenario_condition_key)
+            else:
+                self._remove_owner_marker(scenario_condition_key, user_id)
+        return user_reservations
+
+    # Releases all reservations of a user and returns their keys
+    def release_user(self, user_id):
+        self.prepare()
+        user_reservations = self.find_user_reservations(user_id)
+        for scenario_condition_key in user_reservations:
+            self.release(scenario_condition_key)
+        return user_reservations
+
+    def count_reservations(self):
+        return len(glob.glob(os.path.join(self.lock_file_base, "*.lock")))
+
+    # Removes reservations that are not tracked by this process and expired (or, without
+    # an expiry in the record, older than the timeout)
+    def remove_orphaned_reservations(self, active_keys, timeout_threshold):
+        removed_keys = []
+        now = datetime.now()
+        for lock_file in glob.glob(os.path.join(self.lock_file_base, "*.lock")):
+            scenario_condition_key = os.path.basename(lock_file).replace(".lock", "")
+            if scenario_condition_key in active_keys:
+                continue
+            try:
+                file_age = now - datetime.fromtimestamp(os.path.getmtime(lock_file))
+                record = self._read_lock_record(lock_file)
+                expires_at = record["expires_at"] if record else None
+                is_orphaned = expires_at <= now if expires_at else file_age > timeout_threshold
+                if not is_orphaned:
+                    continue
+                log_print(f"Removing orphaned lock file: {scenario_condition_key}, age: {file_age}")
+                # Only removes the record that was read, a reserve in the meantime keeps its lock
+                if record and record["user_id"]:
+                    released = self.release(scenario_condition_key, record["user_id"], expires_at)
+                else:
+                    released = self._remove_lock_file_if(lock_file, lambda current: current == record)
+                if released:
+                    removed_keys.append(scenario_condition_key)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                log_print(f"Error processing orphaned lock file {scenario_condition_key}: {str(e)}")
+        return removed_keys
+
+
+class SQLiteAssignmentStore:
+    """
+    Stores reservations and completions in a SQLite database in WAL mode.
+    Reserve, complete and release are single transactions, so several
+    processes (Gradio workers, cleanup scripts, the backend) can share one
+    assignment state. Each thread uses its own connection.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS reservations (
+            scenario_condition_key TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            reserved_at TEXT NOT NULL,
+            expires_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS reservations_user_id ON reservations (user_id);
+        CREATE TABLE IF NOT EXISTS completions (
+            user_id TEXT NOT NULL,
+            scenario_id TEXT NOT NULL,
+            condition TEXT NOT NULL,
+            completed_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, scenario_id, condition)
+        );
+    """
+
+    def __init__(self, feedback_dir, db_file=None):
+        self.feedback_dir = feedback_dir
+        os.makedirs(feedback_dir, exist_ok=True)
+        self.db_path = os.path.join(feedback_dir, db_file or settings.Study.ASSIGNMENT_DB_FILE)
+        self._local = threading.local()
+
+        self._connection().executescript(self.SCHEMA)
+        self._migrate_schema()
+
+        self._prepared = False
+        self._prepare_lock = threading.Lock()
+
+    # Imports the completion index (or the feedback files) into a new database once. Same
+    # callers as FileAssignmentStore.prepare, processes that only read don't import.
+    def prepare(self):
+        if self._prepared:
+            return
+
+        with self._prepare_lock:
+            if self._prepared:
+                return
+
+            if self._count_completions() == 0:
+                self._import_completions()
+            self._prepared = True
+
+    # Adds the columns of newer versions to an existing database
+    def _migrate_schema(self):
+        columns = [row[1] for row in self._connection().execute("PRAGMA table_info(reservations)").fetchall()]
+        if "expires_at" not in columns:
+            self._connection().execute("ALTER TABLE reservations ADD COLUMN expires_at TEXT")
+
+    # Returns the connection of the current thread (autocommit mode, reads run without a transaction)
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=settings.Study.ASSIGNMENT_DB_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def _count_completions(self):
+        return self._connection().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def load_completions(self):
+        # A new database before prepare: reads the completions it will import
+        if not self._prepared and self._count_completions() == 0:
+            return CompletionIndex(self.feedback_dir).load_or_crawl()
+
+        user_completions = {}
+        global_completions = {}
+        rows = self._connection().execute(
+            "SELECT user_id, scenario_id, condition FROM completions ORDER BY completed_at"
+        ).fetchall()
+
+        for user_id, scenario_id, condition in rows:
+            scenario_condition_key = f"{scenario_id}_{condition}"
+            user_completions.setdefault(user_id, []).append(scenario_condition_key)
+            global_completions[scenario_condition_key] = global_completions.get(scenario_condition_key, 0) + 1
+
+        return user_completions, global_completions
+
+    def _import_completions(self):
+        completion_index = CompletionIndex(self.feedback_dir)
+        if completion_index.exists():
+            user_completions, _ = completion_index.load()
+            rows = [
+                (user_id, *scenario_condition_key.split('_', 1), "")
+                for user_id, scenario_condition_keys in user_completions.items()
+                for scenario_condition_key in scenario_condition_keys
+            ]
+        else:
+            rows = [
+                (record["user_id"], record["scenario_id"], record["condition"], record["timestamp"])
+                for record in completion_index.crawl_feedback_dir()
+            ]
+
+        if rows:
+            with self._transaction() as connection:
+                connection.executemany("INSERT OR IGNORE INTO completions VALUES (?, ?, ?, ?)", rows)
+            log_print(f"Imported {len(rows)} completions into {self.db_path}")
+
+    # Same rules as FileAssignmentStore.reserve: free, same user or expired reservation
+    def reserve(self, scenario_condition_key, user_id, expires_at=None):
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                """
+                INSERT INTO reservations (scenario_condition_key, user_id, reserved_at, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (scenario_condition_key) DO UPDATE SET
+                    user_id = excluded.user_id, reserved_at = excluded.reserved_at, expires_at = excluded.expires_at
+                WHERE reservations.user_id = excluded.user_id OR reservations.expires_at <= excluded.reserved_at
+                """,
+                (scenario_condition_key, user_id, datetime.now().isoformat(), expires_at.isoformat() if expires_at else None)
+            )
+            return cursor.rowcount > 0
+
+    def renew(self, scenario_condition_key, user_id, expires_at):
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE reservations SET expires_at = ? WHERE scenario_condition_key = ? AND user_id = ?",
+                (expires_at.isoformat(), scenario_condition_key, user_id)
+            )
+            return cursor.rowcount > 0
+
+    # Same rules as FileAssignmentStore.release: with a user_id, only if owner and expiry still match
+    def release(self, scenario_condition_key, user_id=None, expires_at=None):
+        with self._transaction() as connection:
+            if user_id is None:
+                cursor = connection.execute("DELETE FROM reservations WHERE scenario_condition_key = ?", (scenario_condition_key,))
+            else:
+                cursor = connection.execute(
+                    "DELETE FROM reservations WHERE scenario_condition_key = ? AND user_id = ? AND expires_at IS ?",
+                    (scenario_condition_key, user_id, expires_at.isoformat() if expires_at else None)
+                )
+            return cursor.rowcount > 0
+
+    def complete(self, user_id, scenario_id, condition):
+        self.prepare()
+        with self._transaction() as connection:
+            connection.execute(
+                "DELETE FROM reservations WHERE scenario_condition_key = ? AND user_id = ?",
+                (f"{scenario_id}_{condition}", user_id)
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO completions VALUES (?, ?, ?, ?)",
+                (user_id, scenario_id, condition, datetime.now().isoformat())
+            )
+
+    def purge_user(self, user_id):
+        self.prepare()
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM completions WHERE user_id = ?", (user_id,))
+
+    def get_reservation_owner(self, scenario_condition_key):
+        row = self._connection().execute(
+            "SELECT user_id FROM reservations WHERE scenario_condition_key = ?", (scenario_condition_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def find_user_reservations(self, user_id):
+        rows = self._connection().execute(
+            "SELECT scenario_condition_key FROM reservations WHERE user_id = ? ORDER BY reserved_at", (user_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def release_user(self, user_id):
+        with self._transaction() as connection:
+            user_reservations = [row[0] for row in connection.execute(
+                "SELECT scenario_condition_key FROM reservations WHERE user_id = ?", (user_id,)
+            ).fetchall()]
+            connection.execute("DELETE FROM reservations WHERE user_id = ?", (user_id,))
+        return user_reservations
+
+    def count_reservations(self):
+        return self._connection().execute("SELECT COUNT(*) FROM reservations").fetchone()[0]
+
+    def remove_orphaned_reservations(self, active_keys, timeout_threshold):
+        now = datetime.now().isoformat()
+        cutoff = (datetime.now() - timeout_threshold).isoformat()
+        orphaned_condition = "(expires_at IS NOT NULL AND expires_at <= ?) OR (expires_at IS NULL AND reserved_at < ?)"
+        with self._transaction() as connection:
+            rows = connection.execute(
+                f"SELECT scenario_condition_key FROM reservations WHERE {orphaned_condition}", (now, cutoff)
+            ).fetchall()
+            removed_keys = [row[0] for row in rows if row[0] not in active_keys]
+            connection.executemany(
+                f"DELETE FROM reservations WHERE scenario_condition_key = ? AND ({orphaned_condition})",
+                [(key, now, cutoff) for key in removed_keys]
+            )
+        for scenario_condition_key in removed_keys:
+            log_print(f"Removing orphaned reservation: {scenario_condition_key}")
+        return removed_keys
+
+
+class _Transaction:
+    """
+    Runs a `with` block on a SQLite connection in autocommit mode as one
+    BEGIN IMMEDIATE ... COMMIT transaction
+    (the write lock is taken up front, so concurrent writers wait for the
+    busy timeout instead of failing on lock upgrade).
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.connection.execute("COMMIT")
+        else:
+            self.connection.execute("ROLLBACK")
+        return False
+
+
+# Creates the assignment store selected in settings.Study.ASSIGNMENT_STORE
+def create_assignment_store(feedback_dir, store_type=None):
+    store_type = store_type or settings.Study.ASSIGNMENT_STORE
+    log_print(f"Using assignment store: {store_type}")
+
+    if store_type == "sqlite":
+        return SQLiteAssignmentStore(feedback_dir)
+    if store_type == "file":
+        return FileAssignmentStore(feedback_dir)
+    raise ValueError(f"Unknown assignment store: {store_type}")
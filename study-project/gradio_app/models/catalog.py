@@ -0,0 +1,197 @@
+# Precomputed, immutable view of the scenario/condition tree in the answers directory
+import os
+import copy
+import json
+import time
+import threading
+from types import MappingProxyType
+
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print
+
+SCENARIO_FILE = "scenario.json"
+RESPONSE_FILE = "response.txt"
+
+
+class ResponseInfo:
+    """
+    File metadata of a response.txt at the time the catalog was built.
+    """
+
+    __slots__ = ("path", "size", "mtime_ns")
+
+    def __init__(self, path, size, mtime_ns):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+
+# Lists the sub directories of a directory in sorted order (empty if it doesn't exist)
+def _list_subdirs(path):
+    try:
+        with os.scandir(path) as entries:
+            return sorted(entry.name for entry in entries if entry.is_dir())
+    except FileNotFoundError:
+        return []
+
+
+def _stat_mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+# Snapshot of the modification times of every directory and file the catalog is built
+# from. Adding, removing or editing a scenario, condition or file changes the signature.
+def scan_signature(scenarios_dir):
+    signature = [(scenarios_dir, _stat_mtime_ns(scenarios_dir))]
+    for scenario_id in _list_subdirs(scenarios_dir):
+        scenario_path = os.path.join(scenarios_dir, scenario_id)
+        signature.append((scenario_path, _stat_mtime_ns(scenario_path)))
+        for condition in _list_subdirs(scenario_path):
+            condition_path = os.path.join(scenario_path, condition)
+            signature.append((condition_path, _stat_mtime_ns(condition_path)))
+            for file_name in (SCENARIO_FILE, RESPONSE_FILE):
+                file_path = os.path.join(condition_path, file_name)
+                signature.append((file_path, _stat_mtime_ns(file_path)))
+    return tuple(signature)
+
+
+class ScenarioCatalog:
+    """
+    Immutable snapshot of the available scenarios, their conditions, the parsed
+    scenario.json and the response.txt metadata of every scenario/condition pair.
+    Built once from the answers directory so that scenario selection and loading
+    are pure in-memory lookups; a changed tree produces a new catalog instead of
+    mutating this one.
+    """
+
+    def __init__(self, scenarios_dir, conditions, scenario_data, responses, signature):
+        self.scenarios_dir = scenarios_dir
+        self.scenario_ids = tuple(conditions.keys())
+        self._conditions = MappingProxyType({
+            scenario_id: tuple(scenario_conditions)
+            for scenario_id, scenario_conditions in conditions.items()
+        })
+        self._scenario_data = MappingProxyType(dict(scenario_data))
+        self._responses = MappingProxyType(dict(responses))
+        self.signature = signature
+        self.built_at = time.time()
+
+    @classmethod
+    def build(cls, scenarios_dir):
+        signature = scan_signature(scenarios_dir)
+        if not os.path.exists(scenarios_dir):
+            log_print(f"Scenarios directory not found: {scenarios_dir}")
+
+        conditions = {}
+        scenario_data = {}
+        responses = {}
+
+        for scenario_id in _list_subdirs(scenarios_dir):
+            scenario_path = os.path.join(scenarios_dir, scenario_id)
+            scenario_conditions = _list_subdirs(scenario_path)
+            if not scenario_conditions:
+                log_print(f"No condition folders found for scenario {scenario_id}")
+            conditions[scenario_id] = scenario_conditions
+
+            for condition in scenario_conditions:
+                condition_path = os.path.join(scenario_path, condition)
+
+                scenario_file = os.path.join(condition_path, SCENARIO_FILE)
+                try:
+                    with open(scenario_file, "r", encoding="utf-8") as f:
+                        scenario_data[(scenario_id, condition)] = json.load(f)
+                except FileNotFoundError:
+                    log_print(f"Scenario file not found: {scenario_file}")
+                except Exception as e:
+                    log_print(f"Error loading scenario data from {scenario_file}: {str(e)}")
+
+                response_file = os.path.join(condition_path, RESPONSE_FILE)
+                try:
+                    response_stat = os.stat(response_file)
+                    responses[(scenario_id, condition)] = ResponseInfo(
+                        response_file, response_stat.st_size, response_stat.st_mtime_ns
+                    )
+                except FileNotFoundError:
+                    log_print(f"Response file not found: {response_file}")
+
+        catalog = cls(scenarios_dir, conditions, scenario_data, responses, signature)
+        log_print(f"Built scenario catalog with {len(catalog.scenario_ids)} scenarios and {len(catalog.scenario_condition_pairs())} scenario-condition pairs")
+        return catalog
+
+    def get_conditions(self, scenario_id):
+        return self._conditions.get(scenario_id, ())
+
+    def scenario_condition_pairs(self):
+        return [
+            (scenario_id, condition)
+            for scenario_id in self.scenario_ids
+            for condition in self._conditions[scenario_id]
+        ]
+
+    def has_scenario(self, scenario_id, condition):
+        return condition in self._conditions.get(scenario_id, ())
+
+    # Returns a copy of the parsed scenario.json (None if it is missing or unreadable),
+    # so callers can't alter the shared catalog data
+    def get_scenario_data(self, scenario_id, condition):
+        scenario_data = self._scenario_data.get((scenario_id, condition))
+        return copy.deepcopy(scenario_data) if scenario_data is not None else None
+
+    def get_response_info(self, scenario_id, condition):
+        return self._responses.get((scenario_id, condition))
+
+    def is_stale(self):
+        return scan_signature(self.scenarios_dir) != self.signature
+
+
+class ScenarioCatalogLoader:
+    """
+    Holds the current ScenarioCatalog of a scenarios directory. The catalog is
+    rebuilt on demand (refresh) or when the mtime check, done at most once per
+    check interval, finds that the directory tree changed. Readers always get a
+    complete catalog, a rebuild swaps the reference atomically.
+    """
+
+    def __init__(self, scenarios_dir, check_interval=None):
+        self.scenarios_dir = scenarios_dir
+        self.check_interval = (
+            settings.Scenario.CATALOG_CHECK_INTERVAL_SECONDS if check_interval is None else check_interval
+        )
+        self._refresh_lock = threading.Lock()
+        self._refresh_callbacks = []
+        self._catalog = ScenarioCatalog.build(scenarios_dir)
+        self._last_check = time.monotonic()
+
+    # Registers a callable that is invoked with the new catalog after every rebuild
+    def add_refresh_callback(self, callback):
+        self._refresh_callbacks.append(callback)
+
+    def get(self):
+        if self.check_interval and time.monotonic() - self._last_check >= self.check_interval:
+            self.refresh(force=False)
+        return self._catalog
+
+    # Rebuilds the catalog (force=True) or only if the directory tree changed.
+    # Returns True if a new catalog was built.
+    def refresh(self, force=True):
+        with self._refresh_lock:
+            now = time.monotonic()
+            if not force and self.check_interval and now - self._last_check < self.check_interval:
+                # Another thread just checked the tree
+                return False
+            self._last_check = now
+            if not force and not self._catalog.is_stale():
+                return False
+
+            log_print(f"Rebuilding scenario catalog for {self.scenarios_dir}")
+            self._catalog = ScenarioCatalog.build(self.scenarios_dir)
+
+        for callback in self._refresh_callbacks:
+            try:
+                callback(self._catalog)
+            except Exception as e:
+                log_print(f"Error in scenario catalog refresh callback: {str(e)}")
+        return True
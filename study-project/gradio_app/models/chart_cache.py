@@ -0,0 +1,150 @@
+# Manifest of the rendered report charts, keyed by a hash of the chart input
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+from gradio_app.utils.logger import log_print
+
+CHART_MANIFEST_FILE = "chart_manifest.json"
+MANIFEST_VERSION = 1
+
+
+# JSON-serializable form of the chart arguments that keeps the order of the dict
+# items (it determines the order of the bars) and the type of the keys
+def _canonical(value):
+    if isinstance(value, dict):
+        return [[json.dumps(key, default=str), _canonical(item)] for key, item in value.items()]
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, float):
+        return repr(value)
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    return repr(value)
+
+
+class ChartCache:
+    """
+    Maps the hash of a chart's input data and style to the PNG rendered from
+    it and the URL it was uploaded to. The PNG is kept as a copy named after
+    the chart and the hash (the chart methods overwrite their output file on
+    every render), so an unchanged chart is neither rendered nor uploaded
+    again until its URL is about to expire. Charts that had nothing to show
+    are cached as entries without a file. Entries unused for longer than the
+    cleanup age are removed together with their files.
+    """
+
+    def __init__(self, cache_dir, file_name=CHART_MANIFEST_FILE):
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, file_name)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def chart_key(method_name, args, style):
+        payload = json.dumps([method_name, _canonical(args), _canonical(style)], separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # Returns the entry of a key if its file (if any) still exists, marking it as used
+    def get(self, key):
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                return None
+            if entry.get("file") and not os.path.isfile(os.path.join(self.cache_dir, entry["file"])):
+                del self._entries[key]
+                return None
+            entry["last_used_at"] = time.time()
+            return dict(entry)
+
+    def image_path(self, entry):
+        return os.path.join(self.cache_dir, entry["file"]) if entry.get("file") else None
+
+    # The URL of an entry if it doesn't expire within refresh_margin seconds
+    def valid_url(self, entry, refresh_margin=0):
+        if not entry.get("url"):
+            return None
+        if entry.get("url_expires_at", 0) - refresh_margin <= time.time():
+            return None
+        return entry["url"]
+
+    # Records a rendered chart (chart_path None if the chart had nothing to show), returns the entry
+    def store_image(self, key, chart_name, chart_path):
+        file_name = None
+        if chart_path:
+            file_name = f"{chart_name}_{key[:16]}.png"
+            shutil.copyfile(chart_path, os.path.join(self.cache_dir, file_name))
+
+        now = time.time()
+        entry = {
+            "chart": chart_name,
+            "file": file_name,
+            "url": None,
+            "url_expires_at": 0,
+            "created_at": now,
+            "last_used_at": now
+        }
+        with self._lock:
+            self._load()[key] = entry
+        return dict(entry)
+
+    def store_url(self, key, url, expires_at):
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is not None:
+                entry["url"] = url
+                entry["url_expires_at"] = expires_at
+
+    # File names referenced by the manifest (kept by the cache cleanup)
+    def referenced_files(self):
+        with self._lock:
+            return {entry["file"] for entry in self._load().values() if entry.get("file")}
+
+    # Removes the entries unused for max_age_seconds and their files, returns the number of removed files
+    def prune(self, max_age_seconds):
+        removed_files = 0
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            entries = self._load()
+            for key, entry in list(entries.items()):
+                if entry.get("last_used_at", 0) >= cutoff:
+                    continue
+                del entries[key]
+                if entry.get("file"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, entry["file"]))
+                        removed_files += 1
+                    except FileNotFoundError:
+                        pass
+        return removed_files
+
+    # Writes the manifest atomically (temporary file + rename)
+    def save(self):
+        with self._lock:
+            data = {
+                "version": MANIFEST_VERSION,
+                "entries": self._load()
+            }
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.manifest_path)
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self._entries = data.get("entries", {})
+            except Exception as e:
+                log_print(f"Error reading chart manifest {self.manifest_path}, starting a new one: {str(e)}")
+        return self._entries
@@ -1,55 +1,38 @@
 import time
+import asyncio
 import re
-import random
-import os
 import json
 import requests
+import numpy as np
 
 import gradio as gr
 from gradio_app.config import settings
-from gradio_app.utils.logger import log_print
+from gradio_app.utils.logger import log_print, DEBUG
 from gradio_app.models.scenario import scenario_manager
-import spacy
-import tiktoken
+from gradio_app.models.delay_schedule import DelaySchedule
+from gradio_app.utils.pacing import PacingClock
+from gradio_app.utils.debounce import Debouncer
+from gradio_app.utils.metrics import metrics_registry, turn_stage_seconds
+from gradio_app.models.similarity import create_similarity_backend
+
+# Step types yielded by ChatModel._streaming_steps
+STEP_WAIT = "wait"
+STEP_EMIT = "emit"
 
 class ChatModel:
     def __init__(self):
-        # Initializes the vectorizer with a larger model that includes word vectors
-        try:
-            self.vectorizer = spacy.load("de_core_news_md")  # Try to load medium-sized model first
-        except OSError:
-            import subprocess
-            subprocess.run(["python", "-m", "spacy", "download", "de_core_news_md"])
-            self.vectorizer = spacy.load("de_core_news_md")
-        log_print("ChatModel initialized")
+        # Initializes the similarity model (word vectors of the medium-sized German spaCy model,
+        # either through spaCy or as a memory-mapped vector table, see settings.Chat.SIMILARITY_BACKEND)
+        self.similarity_model = create_similarity_backend()
         
-    # Adds a word delay to the response
-    # e.g. random delay for every word between min and max delay and divide by base delay divisor
-    def _get_word_delay(self):
-        min_delay, max_delay = settings.Chat.RESPONSE_DELAY_RANGE
-        base_delay = random.uniform(min_delay, max_delay) / settings.Chat.RESPONSE_BASE_DELAY_DIVISOR
+        # Debounces input validation per session (only the latest input is validated)
+        self.validation_debouncer = Debouncer(settings.Chat.VALIDATION_DEBOUNCE_SECONDS)
+        log_print("ChatModel initialized")
         
-        # Sometimes add a typing variance to the response delay based on a chance
-        if random.random() < settings.Chat.TYPING_VARIANCE_CHANCE:
-            base_delay *= settings.Chat.TYPING_VARIANCE_RESPONSE_DELAY_MULTIPLIER
-            
-        return base_delay
-    
-    # Adds an extra delay after punctuation
-    def _apply_punctuation_delay(self, word, delay):
-        if word and word[-1] in {'.', ',', '!', '?', ';'}:
-            return delay * settings.Chat.PUNCTUATION_DELAY_MULTIPLIER
-        return delay
-    
-    # Adds an extra delay after hesitation
-    def _apply_hesitation_delay(self, delay):
-        if random.random() < settings.Chat.EXTRA_HESITATION_PROBABILITY:
-            return delay + settings.Chat.EXTRA_HESITATION_DELAY
-        return delay
-    
-    # Generates a streaming response
-    # Streams the response line by line with delays between words and lines
-    def generate_streaming_response(self, user_message, chat_history, session):
+    # Generates the steps of a streaming response
+    # Yields (STEP_WAIT, seconds until the next deadline) for every delay and (STEP_EMIT, outputs)
+    # for every chat update, so the same pacing logic can be driven with time.sleep or asyncio.sleep
+    def _streaming_steps(self, user_message, chat_history, session):
         log_print(f"Generating streaming response for message: {user_message[:50]}...")
         
         # Sets up the assistant message in chat history
@@ -65,102 +48,81 @@ class ChatModel:
             scenario_id = session.current_scenario_id
             condition = session.current_condition
             
-            # Session-specific response loading
+            # Session-specific response loading from the precompiled response cache
             if not scenario_id or not condition:
-                full_response = settings.Chat.NO_RESPONSE_MESSAGE
+                compiled_response = scenario_manager.get_compiled_text(settings.Chat.NO_RESPONSE_MESSAGE)
                 log_print(f"No scenario/condition in session {session.session_id} for response loading")
             else:
-                response_path = os.path.join(
-                    scenario_manager.scenarios_dir, 
-                    scenario_id, 
-                    condition, 
-                    "response.txt"
-                )
-                
-                if not os.path.exists(response_path):
-                    gr.Warning(f"Response file not found for scenario {scenario_id}/{condition}")
-                    full_response = settings.Scenario.NO_RESPONSE_FILE
-                else:
-                    try:
-                        with open(response_path, "r", encoding="utf-8") as f:
-                            full_response = f.read()
-                    except Exception as e:
-                        log_print(f"Error loading response: {str(e)}")
-                        gr.Warning(f"Error loading response: {str(e)}")
-                        full_response = settings.Scenario.RESPONSE_ERROR
+                try:
+                    with turn_stage_seconds.labels("response_load", scenario_id, condition).time():
+                        compiled_response = scenario_manager.get_compiled_response(scenario_id, condition)
+                    if compiled_response is None:
+                        gr.Warning(f"Response file not found for scenario {scenario_id}/{condition}")
+                        compiled_response = scenario_manager.get_compiled_text(settings.Scenario.NO_RESPONSE_FILE)
+                except Exception as e:
+                    log_print(f"Error loading response: {str(e)}")
+                    gr.Warning(f"Error loading response: {str(e)}")
+                    compiled_response = scenario_manager.get_compiled_text(settings.Scenario.RESPONSE_ERROR)
             
             # If no response, shows an error message in the chat
-            if not full_response:
+            if not compiled_response.text:
                 log_print("No response to stream")
                 gr.Warning("Keine Antwort für dieses Szenario gefunden.")
                 history[last_idx] = {"role": "assistant", "content": settings.Chat.NO_RESPONSE_MESSAGE}
-                yield "", history
+                yield STEP_EMIT, ("", history)
                 return
             
-            tokenized_response = tiktoken.encoding_for_model(settings.Chat.TOKENIZER_MODEL_NAME).encode(full_response)
-            log_print(f"Starting to stream response of length {len(tokenized_response)} tokens")
+            log_print(f"Starting to stream response of length {len(compiled_response)} tokens")
             
             # Adds initial thinking delay based on the scenario settings
             # from the session (e.g. slow vs fast condition)
+            # All waits are paced against absolute deadlines from this point on, so
+            # processing and scheduling overhead does not add up over the stream
+            pacing_clock = PacingClock()
             thinking_delay = session.response_delay
-            time.sleep(thinking_delay)
+            yield STEP_WAIT, pacing_clock.advance(thinking_delay)
             
-            # Tracks the state for markdown formatting adjustments
-            accumulated_text = ""
-            in_code_block = False
-            accumulated_tokens = []
+            # Precomputes all typing delays (word, punctuation, hesitation, markdown
+            # and code block delays) for this response from the session's seed
+            delay_schedule = DelaySchedule.build(
+                compiled_response,
+                seed=DelaySchedule.derive_seed(session.delay_seed, scenario_id, condition)
+            )
             
-            # Get the tokenizer for decoding
-            tokenizer = tiktoken.encoding_for_model(settings.Chat.TOKENIZER_MODEL_NAME)
+            # Groups tokens into UI updates (one per coalescing window) and computes
+            # the wait before each update from the planned token offsets
+            chunk_ends = delay_schedule.chunk_ends(settings.Chat.STREAM_COALESCE_WINDOW)
+            chunk_waits = np.diff(delay_schedule.emit_offsets[chunk_ends], prepend=0.0)
+            
+            accumulated_text = ""
             
             # Variables to track tokens per second
             start_time = time.time()
-            token_count = 0
-            tokens_times = []
+            token_count = len(compiled_response)
+            chunk_start = 0
             
-            # Process tokens one by one
-            for i, token in enumerate(tokenized_response):
-                token_count += 1
-                accumulated_tokens.append(token)
-                current_time = time.time()
-                tokens_times.append(current_time)
+            # Replays the precomputed token deltas chunk by chunk. Tokens that end inside
+            # a multi-byte character carry no text and are shown with the following token.
+            for chunk_end, wait in zip(chunk_ends, chunk_waits):
+                yield STEP_WAIT, pacing_clock.advance(wait)
                 
-                # Try to decode accumulated tokens
-                try:
-                    new_text = tokenizer.decode(accumulated_tokens)
-                    token_text = new_text[len(accumulated_text):]  # Get just the new text
-                    
-                    # Check if this token contributes to a code block marker
-                    if '```' in token_text:
-                        in_code_block = not in_code_block
-                        time.sleep(settings.Chat.CODE_BLOCK_MARKER_DELAY)
-                    
-                    # Calculate base delay for this token
-                    delay = self._get_word_delay()
-                    
-                    # Apply punctuation delay if token contains punctuation
-                    delay = self._apply_punctuation_delay(token_text, delay)
-                    
-                    # Apply hesitation delay
-                    delay = self._apply_hesitation_delay(delay)
-                    
-                    # Apply the delay
-                    time.sleep(delay)
-                    
-                    # Add token text to accumulated text
-                    accumulated_text = new_text
-                    
-                    # Update history and yield response
-                    history[last_idx] = {"role": "assistant", "content": accumulated_text}
-                    yield "", history
-                    
-                    # Add extra delay for newlines
-                    if '\n' in token_text:
-                        time.sleep(settings.Chat.NEWLINE_DELAY)
-                        
-                except Exception as decode_error:
-                    # If we can't decode yet, continue to next token
-                    continue
+                # Add chunk text to accumulated text
+                accumulated_text += "".join(compiled_response.deltas[chunk_start:chunk_end + 1])
+                chunk_start = chunk_end + 1
+                
+                # Update history and yield response
+                history[last_idx] = {"role": "assistant", "content": accumulated_text}
+                pacing_clock.mark_emit()
+                yield STEP_EMIT, ("", history)
+            
+            # Add the trailing delay after a final newline
+            if len(chunk_ends) and delay_schedule.post_delays[chunk_ends[-1]]:
+                yield STEP_WAIT, pacing_clock.advance(delay_schedule.post_delays[chunk_ends[-1]])
+            
+            # Store planned-vs-actual pacing of this stream with the session
+            session.stream_pacing = pacing_clock.stats()
+            self._record_stream_metrics(pacing_clock, scenario_id, condition, token_count)
+            log_print(f"Stream pacing for scenario {scenario_id}/{condition}: {session.stream_pacing}")
             
             # Calculate tokens per second
             end_time = time.time()
@@ -185,10 +147,30 @@ class ChatModel:
         except Exception as e:
             log_print(f"Error in streaming response: {str(e)}")
             history[last_idx] = {"role": "assistant", "content": settings.Chat.ERROR_MESSAGE}
-            yield "", history
+            yield STEP_EMIT, ("", history)
             gr.Error(f"Problem bei der Generierung der Antwort: {str(e)}")
             raise gr.Error(settings.Chat.GENERATION_ERROR)
     
+    # Generates a streaming response
+    # Streams the response token by token with delays between tokens and lines.
+    # Blocks a worker thread for the whole simulated typing duration.
+    def generate_streaming_response(self, user_message, chat_history, session):
+        for step, value in self._streaming_steps(user_message, chat_history, session):
+            if step == STEP_WAIT:
+                time.sleep(value)
+            else:
+                yield value
+    
+    # Async variant of generate_streaming_response used by the chat UI
+    # Waits with asyncio.sleep, so streaming participants share the event loop
+    # instead of each holding a worker thread while the response is "typed"
+    async def generate_streaming_response_async(self, user_message, chat_history, session):
+        for step, value in self._streaming_steps(user_message, chat_history, session):
+            if step == STEP_WAIT:
+                await asyncio.sleep(value)
+            else:
+                yield value
+    
     # Adds a user message to the chat history
     def add_user_message(self, message, chat_history, session):
         log_print(f"Adding user message: {message[:50]}...")
@@ -207,6 +189,24 @@ class ChatModel:
         
         return "", updated_history, message.strip()
     
+    # Debounced async variant of validate_input used by the chat UI
+    # Waits for the debounce window and skips the update if a newer input of the
+    # same browser session arrived in the meantime, so only the latest text is validated.
+    # The key is the Gradio session hash (session_id is copied from the gr.State prototype
+    # and therefore shared by all participants), the study token as a fallback.
+    async def validate_input_debounced(self, message, session, request: gr.Request = None):
+        session_key = getattr(request, "session_hash", None) or (session.study_token if session else None)
+        if not await self.validation_debouncer.wait(session_key):
+            return gr.skip()
+        
+        log_print("Input validation stats: %s", self.get_validation_stats(), level=DEBUG)
+        # The similarity check is CPU-bound and must not block the event loop
+        return await asyncio.to_thread(self.validate_input, message, session)
+    
+    # Returns the number of executed and dropped (superseded) input validations
+    def get_validation_stats(self):
+        return self.validation_debouncer.stats()
+    
     # Validates the user input
     def validate_input(self, message, session):
         # Check if session is valid
@@ -239,11 +239,16 @@ class ChatModel:
             return gr.update(interactive=False, variant="secondary")
             
         current_question = session.get_scenario_question()
-        log_print(f"Validating message against session {session.session_id} scenario {current_scenario_id} with question: {current_question}")
+        log_print("Validating message against session %s scenario %s with question: %s", session.session_id, current_scenario_id, current_question, level=DEBUG)
         
         # Validate only if we have a current scenario and question
         if current_scenario_id and current_question:
-            if not self.validate_message_to_scenario_similarity(message, current_question):
+            start = time.perf_counter()
+            is_similar = self.validate_message_to_scenario_similarity(message, current_question)
+            turn_stage_seconds.labels("validation", current_scenario_id, session.current_condition or "").observe(time.perf_counter() - start)
+            validations_total.labels("similar" if is_similar else "not_similar").inc()
+            
+            if not is_similar:
                 gr.Warning(f"{settings.Chat.MESSAGE_VALIDATION_NOT_SIMILAR} Erwartete Frage: {current_question}", visible=settings.Chat.MESSAGE_VALIDATION_NOT_SIMILAR_VISIBLE)
                 return gr.update(interactive=False, variant="primary")
         else:
@@ -254,16 +259,43 @@ class ChatModel:
     
     # Uses cosine similarity to calculate the similarity between the message and the scenario question
     def validate_message_to_scenario_similarity(self, message, scenario_question):
-        # Converts the message and scenario question to vectors
-        message_vector = self.vectorizer(message)
-        scenario_question_vector = self.vectorizer(scenario_question)
-        log_print(f"Message vector: {message_vector}")
-        log_print(f"Scenario question vector: {scenario_question_vector}")
-
-        # Calculates the cosine similarity
-        similarity = message_vector.similarity(scenario_question_vector)
-        log_print(f"Similarity: {similarity}")
+        # Calculates the cosine similarity of the (cached) message and scenario question vectors
+        similarity = self.similarity_model.similarity(message, scenario_question)
+        log_print("Similarity: %s", similarity, level=DEBUG)
         return similarity > settings.Chat.MESSAGE_TO_SCENARIO_SIMILARITY_THRESHOLD
+    
+    # Precomputes the vectors of all scenario questions
+    def warm_similarity_cache(self, questions):
+        return self.similarity_model.warm_questions(questions)
+    
+    # Records the duration, emit lags and token count of a finished stream
+    def _record_stream_metrics(self, pacing_clock, scenario_id, condition, token_count):
+        scenario_id = scenario_id or ""
+        condition = condition or ""
+        
+        turn_stage_seconds.labels("stream", scenario_id, condition).observe(pacing_clock.elapsed)
+        emit_lag = stream_emit_lag_seconds.labels(scenario_id, condition)
+        for lag in pacing_clock.lags:
+            emit_lag.observe(lag)
+        streamed_tokens_total.labels(scenario_id, condition).inc(token_count)
+    
+    # Metrics collector: refreshes the validation debouncer gauges before a snapshot
+    def collect_metrics(self):
+        for outcome, value in self.get_validation_stats().items():
+            validation_debounce_calls.labels(outcome).set(value)
+
+validations_total = metrics_registry.counter(
+    "study_validations_total", "Similarity validations of participant messages by result", ("result",)
+)
+stream_emit_lag_seconds = metrics_registry.histogram(
+    "study_stream_emit_lag_seconds", "Delay of streamed chunks behind their planned time", ("scenario", "condition")
+)
+streamed_tokens_total = metrics_registry.counter(
+    "study_streamed_tokens_total", "Tokens streamed to participants", ("scenario", "condition")
+)
+validation_debounce_calls = metrics_registry.gauge(
+    "study_validation_debounce_calls", "Debounced input validations (executed, dropped, pending)", ("outcome",)
+)
 
 # Create singleton instance
 chat_model = ChatModel() 
\ No newline at end of file
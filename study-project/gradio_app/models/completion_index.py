@@ -0,0 +1,177 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+from gradio_app.utils.logger import log_print
+
+COMPLETION_INDEX_FILE = "completion_index.jsonl"
+SPECIAL_FEEDBACK_DIRS = {"locks", "abandoned"}
+
+
+# Applies one index record to the in-memory completion state. A user completes
+# every scenario/condition pair at most once, so repeated records are ignored.
+def apply_completion_record(record, user_completions, global_completions):
+    user_id = record.get("user_id")
+    if not user_id:
+        return
+
+    if record.get("op") == "purge":
+        for scenario_condition_key in user_completions.pop(user_id, []):
+            global_completions[scenario_condition_key] = global_completions.get(scenario_condition_key, 0) - 1
+            if global_completions[scenario_condition_key] <= 0:
+                del global_completions[scenario_condition_key]
+        return
+
+    scenario_id = record.get("scenario_id")
+    condition = record.get("condition")
+    if not scenario_id or not condition:
+        return
+
+    scenario_condition_key = f"{scenario_id}_{condition}"
+    completions = user_completions.setdefault(user_id, [])
+    if scenario_condition_key not in completions:
+        completions.append(scenario_condition_key)
+        global_completions[scenario_condition_key] = global_completions.get(scenario_condition_key, 0) + 1
+
+
+class CompletionIndex:
+    """
+    Persistent, append-only index of scenario completions stored as one JSON
+    record per line in the feedback directory. "complete" records add a
+    scenario/condition pair to a user, "purge" records drop all completions of
+    a user (abandoned sessions). The completion state is rebuilt at startup in
+    one sequential read instead of crawling every user's feedback files.
+    """
+
+    def __init__(self, feedback_dir, file_name=COMPLETION_INDEX_FILE, journal=None):
+        self.feedback_dir = feedback_dir
+        self.index_path = os.path.join(feedback_dir, file_name)
+        self._lock = threading.Lock()
+        # Optional JournalWriter: appends are then batched on its thread and return a Future
+        self.journal = journal
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    # Replays the index and returns (user_completions, global_completions)
+    def load(self):
+        user_completions = {}
+        global_completions = {}
+
+        if not self.exists():
+            return user_completions, global_completions
+
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash during an append can leave a partial last line
+                    log_print(f"Skipping malformed completion index record at line {line_number}")
+                    continue
+                apply_completion_record(record, user_completions, global_completions)
+
+        return user_completions, global_completions
+
+    # Like load, but replays the feedback files if the index doesn't exist yet (without writing it)
+    def load_or_crawl(self):
+        if self.exists():
+            return self.load()
+
+        user_completions = {}
+        global_completions = {}
+        for record in self.crawl_feedback_dir():
+            apply_completion_record(record, user_completions, global_completions)
+        return user_completions, global_completions
+
+    def append_completion(self, user_id, scenario_id, condition, timestamp=None):
+        return self._append([{
+            "op": "complete",
+            "user_id": user_id,
+            "scenario_id": scenario_id,
+            "condition": condition,
+            "timestamp": timestamp or datetime.now().isoformat()
+        }])
+
+    def append_purge(self, user_id):
+        return self._append([{
+            "op": "purge",
+            "user_id": user_id,
+            "timestamp": datetime.now().isoformat()
+        }])
+
+    def _append(self, records):
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if self.journal is not None:
+            return self.journal.append(self.index_path, data)
+
+        with self._lock:
+            os.makedirs(self.feedback_dir, exist_ok=True)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    # Collects the completion records of every user from the feedback and
+    # completion JSON files in the feedback directory, ordered by timestamp
+    def crawl_feedback_dir(self):
+        records = {}
+
+        if not os.path.exists(self.feedback_dir):
+            return []
+
+        for user_id in sorted(os.listdir(self.feedback_dir)):
+            user_dir = os.path.join(self.feedback_dir, user_id)
+            if not os.path.isdir(user_dir) or user_id in SPECIAL_FEEDBACK_DIRS:
+                continue
+
+            for feedback_file in sorted(os.listdir(user_dir)):
+                if not feedback_file.endswith(".json"):
+                    continue
+
+                feedback_path = os.path.join(user_dir, feedback_file)
+                try:
+                    with open(feedback_path, "r", encoding="utf-8") as f:
+                        feedback_data = json.load(f)
+                except Exception as e:
+                    log_print(f"Error reading feedback file {feedback_path}: {str(e)}")
+                    continue
+
+                scenario_id = feedback_data.get("scenario_id")
+                condition = feedback_data.get("condition")
+                if not scenario_id or not condition:
+                    continue
+
+                timestamp = feedback_data.get("timestamp") or ""
+                key = (user_id, scenario_id, condition)
+                if key not in records or timestamp < records[key]["timestamp"]:
+                    records[key] = {
+                        "op": "complete",
+                        "user_id": user_id,
+                        "scenario_id": scenario_id,
+                        "condition": condition,
+                        "timestamp": timestamp
+                    }
+
+        return sorted(records.values(), key=lambda record: record["timestamp"])
+
+    # Rebuilds the index from the feedback directory tree (replaces an existing index)
+    def rebuild(self):
+        records = self.crawl_feedback_dir()
+        temp_path = f"{self.index_path}.tmp"
+
+        with self._lock:
+            os.makedirs(self.feedback_dir, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.index_path)
+
+        log_print(f"Built completion index with {len(records)} completions at {self.index_path}")
+        return len(records)
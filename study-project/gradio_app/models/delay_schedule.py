@@ -0,0 +1,124 @@
+# Builds the simulated typing delays for a whole response in one vectorized pass
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from gradio_app.config import settings
+
+BLOCK_LEVEL_MARKDOWN = {"HEADER", "LIST_ITEM", "BLOCK_QUOTE", "TABLE", "HORIZONTAL_RULE", "TASK_LIST"}
+
+
+# Computes the parts of the schedule that only depend on the response text
+# (multipliers and fixed delays), memoized per compiled response
+@lru_cache(maxsize=128)
+def _static_delay_components(compiled_response, chat_settings=settings.Chat):
+    has_text = np.fromiter((bool(delta) for delta in compiled_response.deltas), dtype=bool, count=len(compiled_response))
+    code_fence = np.array(compiled_response.code_fence, dtype=bool)
+    in_code_block = np.array(compiled_response.in_code_block, dtype=bool)
+    newline = np.array(compiled_response.newline, dtype=bool)
+    punctuation = np.array(compiled_response.punctuation, dtype=bool)
+
+    multipliers = np.ones(len(compiled_response), dtype=np.float64)
+
+    multipliers[punctuation] *= chat_settings.PUNCTUATION_DELAY_MULTIPLIER
+
+    # Markdown element multipliers (falls back to the generic block-level/inline multiplier)
+    for i, markdown_kind in enumerate(compiled_response.markdown):
+        if markdown_kind is None:
+            continue
+        if markdown_kind in BLOCK_LEVEL_MARKDOWN:
+            fallback = chat_settings.BLOCK_LEVEL_MARKDOWN_DELAY_MULTIPLIER
+        else:
+            fallback = chat_settings.INLINE_MARKDOWN_DELAY_MULTIPLIER
+        multipliers[i] *= chat_settings.MARKDOWN_DELAY_MULTIPLIERS.get(markdown_kind, fallback)
+
+    # Code block multipliers: a fence that leaves us inside a block opens it
+    multipliers[code_fence & in_code_block] *= chat_settings.CODE_BLOCK_START_DELAY_MULTIPLIER
+    multipliers[code_fence & ~in_code_block] *= chat_settings.CODE_BLOCK_END_DELAY_MULTIPLIER
+    multipliers[~code_fence & in_code_block] *= chat_settings.CODE_LINE_DELAY_MULTIPLIER
+
+    marker_delays = np.where(code_fence, chat_settings.CODE_BLOCK_MARKER_DELAY, 0.0)
+    newline_delays = np.where(newline, chat_settings.NEWLINE_DELAY, 0.0)
+
+    for array in (has_text, multipliers, marker_delays, newline_delays):
+        array.setflags(write=False)
+
+    return has_text, multipliers, marker_delays, newline_delays
+
+
+class DelaySchedule:
+    """
+    Precomputed typing delays for every token of a compiled response.
+
+    delays[i] is the pause before token i is shown (typing delay plus code
+    block marker delay) and post_delays[i] the pause after it (newline delay).
+    Tokens without text (partial multi-byte characters) get no delay.
+    """
+
+    def __init__(self, delays, post_delays, has_text, seed=None):
+        self.delays = delays
+        self.post_delays = post_delays
+        self.has_text = has_text
+        self.seed = seed
+
+    def __len__(self):
+        return len(self.delays)
+
+    # Time offsets (relative to the first token) at which each token is shown
+    @property
+    def emit_offsets(self):
+        offsets = np.cumsum(self.delays)
+        offsets[1:] += np.cumsum(self.post_delays)[:-1]
+        return offsets
+
+    @property
+    def total_duration(self):
+        return float(self.delays.sum() + self.post_delays.sum())
+
+    # Groups tokens into chunks that are shown with a single UI update and
+    # returns the index of the last token of every chunk. Tokens are grouped by
+    # the time window their planned offset falls into, so each chunk is shown
+    # when its last token would have been and the overall pacing is unchanged.
+    # A window of 0 gives one chunk per token with text.
+    def chunk_ends(self, window=0.0):
+        emit_indices = np.flatnonzero(self.has_text)
+        if window <= 0 or len(emit_indices) == 0:
+            return emit_indices
+
+        buckets = np.floor(self.emit_offsets[emit_indices] / window)
+        is_last_in_bucket = np.append(buckets[1:] != buckets[:-1], True)
+        return emit_indices[is_last_in_bucket]
+
+    # Derives a reproducible per-response seed from the session seed, so a
+    # participant gets different (but repeatable) schedules per scenario
+    @staticmethod
+    def derive_seed(session_seed, scenario_id=None, condition=None):
+        if session_seed is None:
+            return None
+        return [int(session_seed), zlib.crc32(f"{scenario_id}/{condition}".encode("utf-8"))]
+
+    @classmethod
+    def build(cls, compiled_response, seed=None, chat_settings=settings.Chat):
+        has_text, multipliers, marker_delays, newline_delays = _static_delay_components(compiled_response, chat_settings)
+        token_count = len(compiled_response)
+        rng = np.random.default_rng(seed)
+
+        # Base typing delay per token
+        min_delay, max_delay = chat_settings.RESPONSE_DELAY_RANGE
+        delays = rng.uniform(min_delay, max_delay, token_count) / chat_settings.RESPONSE_BASE_DELAY_DIVISOR
+
+        # Occasional typing variance
+        variance = rng.random(token_count) < chat_settings.TYPING_VARIANCE_CHANCE
+        delays[variance] *= chat_settings.TYPING_VARIANCE_RESPONSE_DELAY_MULTIPLIER
+
+        # Punctuation, markdown and code block multipliers
+        delays *= multipliers
+
+        # Occasional extra hesitation
+        hesitation = rng.random(token_count) < chat_settings.EXTRA_HESITATION_PROBABILITY
+        delays[hesitation] += chat_settings.EXTRA_HESITATION_DELAY
+
+        delays += marker_delays
+        delays[~has_text] = 0.0
+
+        return cls(delays, newline_delays * has_text, has_text, seed)
@@ -1,12 +1,14 @@
 import os
 import json
-import time
 import httpx
+import asyncio
 from datetime import datetime
 
 import gradio as gr
 from gradio_app.config import settings
 from gradio_app.utils.logger import log_print
+from gradio_app.utils.journal import journal_writer
+from gradio_app.utils.metrics import metrics_registry, turn_stage_seconds
 
 class FeedbackModel:
     
@@ -36,22 +38,47 @@ class FeedbackModel:
             log_print(f"Saving feedback for session {session.session_id} with token: {user_id}")
 
             feedback_data = self._create_feedback_data(scenario_id, condition, slider_values, session)
-            file_path = self._save_to_file(feedback_data, user_id)
-            log_print(f"Feedback saved to {file_path}")
-            
-            session.feedback_submitted = True
+            file_path, feedback_future = self._save_to_file(feedback_data, user_id)
             
             from gradio_app.models.scenario import scenario_manager
             task_distributor = scenario_manager.task_distributor
             
-            if task_distributor:
-                task_distributor.mark_scenario_completed(
-                    session.study_token, 
-                    session.current_scenario_id, 
-                    session.current_condition
+            # Waits for the journal writer (one fsync per batch of submissions) without blocking the event loop.
+            # The scenario only counts as completed once its feedback is on disk.
+            with turn_stage_seconds.labels("feedback_persist", scenario_id, condition).time():
+                await asyncio.wrap_future(feedback_future)
+                log_print(f"Feedback saved to {file_path}")
+                
+                session.feedback_submitted = True
+                
+                # Takes the state lock and updates the assignment store, so it runs on a worker thread
+                completion_futures = []
+                if task_distributor:
+                    completion_futures = await asyncio.to_thread(
+                        task_distributor.mark_scenario_completed,
+                        session.study_token, 
+                        session.current_scenario_id, 
+                        session.current_condition
+                    )
+                
+                completion_results = await asyncio.gather(
+                    *(asyncio.wrap_future(future) for future in completion_futures),
+                    return_exceptions=True
                 )
+            for result in completion_results:
+                if isinstance(result, Exception):
+                    log_print(f"Error writing completion record: {str(result)}")
+            
+            feedback_submissions_total.labels(scenario_id, condition).inc()
             
-            time.sleep(settings.Feedback.FEEDBACK_CONFIRMATION_DELAY)
+            # Adds the ratings to the running aggregates read by the metrics report
+            if task_distributor:
+                try:
+                    await asyncio.to_thread(task_distributor.feedback_aggregates.record_feedback, feedback_data)
+                except Exception as e:
+                    log_print(f"Error updating feedback aggregates: {str(e)}")
+            
+            await asyncio.sleep(settings.Feedback.FEEDBACK_CONFIRMATION_DELAY)
             
             gr.Info("Feedback erfolgreich gespeichert!")
             
@@ -60,6 +87,7 @@ class FeedbackModel:
         except gr.Error as e:
             raise
         except Exception as e:
+            feedback_errors_total.inc()
             log_print(f"Error saving feedback: {str(e)}")
             raise gr.Error("Ein Fehler ist aufgetreten beim Speichern des Feedbacks.")
     
@@ -97,6 +125,12 @@ class FeedbackModel:
                 log_print(f"Warning: Failed to add response delay to feedback - invalid value: {session.response_delay}. Error: {str(e)}")
         else:
             log_print("No response delay data available for this feedback submission")
+        
+        if session and getattr(session, "delay_seed", None) is not None:
+            feedback_data["delay_seed"] = session.delay_seed
+        
+        if session and getattr(session, "stream_pacing", None) is not None:
+            feedback_data["stream_pacing"] = session.stream_pacing
             
         return feedback_data
     
@@ -105,16 +139,16 @@ class FeedbackModel:
         os.makedirs(user_dir, exist_ok=True)
         return user_dir
     
+    # Queues the feedback file on the journal writer, returns the path and the write's future
     def _save_to_file(self, feedback_data, user_id):
         timestamp = datetime.now().strftime("%d%m%Y_%H%M%S")
-        user_dir = self.generate_user_directory(user_id)
+        user_dir = os.path.join(self.feedback_dir, user_id)
         filename = f"feedback_{user_id}_{timestamp}.json"
         file_path = os.path.join(user_dir, filename)
         
-        with open(file_path, "w") as f:
-            json.dump(feedback_data, f, indent=2)
+        future = journal_writer.write(file_path, json.dumps(feedback_data, indent=2))
             
-        return file_path
+        return file_path, future
     
     #-------------------------------------------------------------------------
     # UI INTERACTIONS
@@ -125,5 +159,12 @@ class FeedbackModel:
         gr.Info("Bitte geben Sie Ihr Feedback zur Antwort des KI-Systems!")
         return chat_history, gr.update(interactive=True), gr.update(visible=True)
 
+feedback_submissions_total = metrics_registry.counter(
+    "study_feedback_submissions_total", "Saved feedback submissions", ("scenario", "condition")
+)
+feedback_errors_total = metrics_registry.counter(
+    "study_feedback_errors_total", "Feedback submissions that could not be saved"
+)
+
 # Create singleton instance
 feedback_model = FeedbackModel() 
\ No newline at end of file
@@ -0,0 +1,232 @@
+# Running aggregates of the feedback ratings per scenario, condition and category
+import os
+import glob
+import json
+import fcntl
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+from gradio_app.utils.logger import log_print
+from gradio_app.models.completion_index import SPECIAL_FEEDBACK_DIRS
+
+FEEDBACK_AGGREGATES_FILE = "feedback_aggregates.json"
+SNAPSHOT_VERSION = 1
+
+
+class RatingStats:
+    """
+    Count, sum, sum of squares, minimum and maximum of the ratings of one cell.
+    The count of every rating value is kept as well, so removing ratings (e.g.
+    of an abandoned session) leaves the minimum and maximum exact.
+    """
+
+    __slots__ = ("count", "sum", "sum_squares", "min", "max", "value_counts")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.min = None
+        self.max = None
+        self.value_counts = {}
+
+    def add(self, value, delta=1):
+        self.count += delta
+        self.sum += delta * value
+        self.sum_squares += delta * value * value
+
+        remaining = self.value_counts.get(value, 0) + delta
+        if remaining > 0:
+            self.value_counts[value] = remaining
+        else:
+            self.value_counts.pop(value, None)
+
+        self.min = min(self.value_counts) if self.value_counts else None
+        self.max = max(self.value_counts) if self.value_counts else None
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        for value, count in other.value_counts.items():
+            self.value_counts[value] = self.value_counts.get(value, 0) + count
+        self.min = min(self.value_counts) if self.value_counts else None
+        self.max = max(self.value_counts) if self.value_counts else None
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    @property
+    def stddev(self):
+        if self.count < 2:
+            return None
+        variance = (self.sum_squares - self.sum * self.sum / self.count) / (self.count - 1)
+        return max(0.0, variance) ** 0.5
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "sum_squares": self.sum_squares,
+            "min": self.min,
+            "max": self.max,
+            "value_counts": {json.dumps(value): count for value, count in sorted(self.value_counts.items())}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data.get("count", 0)
+        stats.sum = data.get("sum", 0.0)
+        stats.sum_squares = data.get("sum_squares", 0.0)
+        stats.value_counts = {json.loads(value): count for value, count in data.get("value_counts", {}).items()}
+        stats.min = min(stats.value_counts) if stats.value_counts else data.get("min")
+        stats.max = max(stats.value_counts) if stats.value_counts else data.get("max")
+        return stats
+
+
+# Returns the ratings of a feedback record as (scenario_id, condition, category, value)
+def _iter_ratings(feedback_data):
+    scenario_id = feedback_data.get("scenario_id") or ""
+    condition = feedback_data.get("condition") or ""
+    for category, value in (feedback_data.get("ratings") or {}).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield scenario_id, condition, category, value
+
+
+class FeedbackAggregates:
+    """
+    Rating aggregates per (scenario, condition, category) cell and the number
+    of feedback submissions, kept in a small snapshot file in the feedback
+    directory. save_feedback adds every submission and the cleanup of an
+    abandoned session subtracts the user's submissions, so the report reads
+    O(cells) values instead of every feedback file. Updates re-read the
+    snapshot under a file lock, so the Gradio app and the cleanup script
+    can update it concurrently. A missing snapshot is built from the
+    feedback files on first use.
+    """
+
+    def __init__(self, feedback_dir, file_name=FEEDBACK_AGGREGATES_FILE):
+        self.feedback_dir = feedback_dir
+        self.snapshot_path = os.path.join(feedback_dir, file_name)
+        self.lock_path = f"{self.snapshot_path}.lock"
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.snapshot_path)
+
+    # Returns (cells, feedback_count) with cells mapping (scenario_id, condition, category) -> RatingStats
+    def load(self):
+        if not self.exists():
+            with self._locked():
+                if not self.exists():
+                    self._write(*self._crawl_feedback_dir())
+        return self._read()
+
+    def record_feedback(self, feedback_data):
+        self._update([feedback_data], 1)
+
+    # Subtracts the feedback files of a user directory (before it is moved to the backup)
+    def remove_user_feedback(self, user_dir):
+        feedback_records = list(self._read_feedback_files(user_dir))
+        if feedback_records:
+            self._update(feedback_records, -1)
+            log_print(f"Removed {len(feedback_records)} feedback submissions of {os.path.basename(user_dir)} from the aggregates")
+
+    # Rebuilds the snapshot from the feedback files, returns the number of submissions
+    def rebuild(self):
+        with self._locked():
+            cells, feedback_count = self._crawl_feedback_dir()
+            self._write(cells, feedback_count)
+        return feedback_count
+
+    def _update(self, feedback_records, delta):
+        with self._locked():
+            if self.exists():
+                cells, feedback_count = self._read()
+            else:
+                # The crawl already contains the new feedback files
+                cells, feedback_count = self._crawl_feedback_dir()
+                if delta > 0:
+                    self._write(cells, feedback_count)
+                    return
+
+            for feedback_data in feedback_records:
+                feedback_count += delta
+                for scenario_id, condition, category, value in _iter_ratings(feedback_data):
+                    cells.setdefault((scenario_id, condition, category), RatingStats()).add(value, delta)
+
+            self._write(cells, feedback_count)
+
+    # Serializes updates of this process (thread lock) and of other processes (flock)
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            os.makedirs(self.feedback_dir, exist_ok=True)
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        cells = {}
+        for cell in data.get("cells", []):
+            key = (cell.get("scenario_id", ""), cell.get("condition", ""), cell.get("category", ""))
+            cells[key] = RatingStats.from_dict(cell)
+        return cells, data.get("feedback_count", 0)
+
+    # Replaces the snapshot atomically (temporary file + rename)
+    def _write(self, cells, feedback_count):
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "updated_at": datetime.now().isoformat(),
+            "feedback_count": feedback_count,
+            "cells": [
+                dict(scenario_id=scenario_id, condition=condition, category=category, **stats.to_dict())
+                for (scenario_id, condition, category), stats in sorted(cells.items())
+                if stats.count > 0
+            ]
+        }
+
+        temp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+    def _read_feedback_files(self, user_dir):
+        for feedback_path in sorted(glob.glob(os.path.join(user_dir, "feedback_*.json"))):
+            try:
+                with open(feedback_path, "r", encoding="utf-8") as f:
+                    yield json.load(f)
+            except Exception as e:
+                log_print(f"Error reading feedback file {feedback_path}: {str(e)}")
+
+    # Aggregates the feedback files of every user directory (O(files), only without a snapshot)
+    def _crawl_feedback_dir(self):
+        cells = {}
+        feedback_count = 0
+
+        if not os.path.exists(self.feedback_dir):
+            return cells, feedback_count
+
+        for user_id in sorted(os.listdir(self.feedback_dir)):
+            user_dir = os.path.join(self.feedback_dir, user_id)
+            if not os.path.isdir(user_dir) or user_id in SPECIAL_FEEDBACK_DIRS:
+                continue
+
+            for feedback_data in self._read_feedback_files(user_dir):
+                feedback_count += 1
+                for scenario_id, condition, category, value in _iter_ratings(feedback_data):
+                    cells.setdefault((scenario_id, condition, category), RatingStats()).add(value)
+
+        log_print(f"Aggregated {feedback_count} feedback files from {self.feedback_dir}")
+        return cells, feedback_count
@@ -1,15 +1,16 @@
 import os
-import json
+import time
 import requests
 import logging
 from datetime import datetime
 from collections import Counter, defaultdict
-import glob
 
 from gradio_app.utils.logger import log_print
 from gradio_app.models.scenario import scenario_manager
 from gradio_app.models.metrics_visualizer import metrics_visualizer
+from gradio_app.models.feedback_aggregates import RatingStats
 from gradio_app.config import settings
+from gradio_app.utils.metrics import load_snapshot, merge_snapshot_histogram
 
 class MetricsReporter:
     def __init__(self, recipient_email=None):
@@ -42,12 +43,19 @@ class MetricsReporter:
         scenario_distribution = self._get_scenario_distribution(task_distributor)
         condition_distribution = self._get_condition_distribution(task_distributor)
         
-        # In-progress stats
-        in_progress_count = len(task_distributor.in_progress_scenarios)
-        lock_file_count = self._count_lock_files(task_distributor)
+        # In-progress stats and latencies from the live metrics of the running Gradio app
+        # (this process only knows the reservations it loaded itself)
+        live_metrics = self._load_live_metrics()
+        if live_metrics:
+            in_progress_count = self._get_live_value(live_metrics, "study_reservations_in_progress")
+            lock_file_count = self._get_live_value(live_metrics, "study_reservations_stored")
+        else:
+            in_progress_count = len(task_distributor.in_progress_scenarios)
+            lock_file_count = self._count_lock_files(task_distributor)
+        performance_stats = self._get_performance_stats(live_metrics)
         
         # Feedback rating stats
-        feedback_stats = self._get_feedback_rating_stats(task_distributor.feedback_dir)
+        feedback_stats = self._get_feedback_rating_stats(task_distributor.feedback_aggregates)
         
         # Compile the report
         report = {
@@ -67,6 +75,7 @@ class MetricsReporter:
                 "condition_distribution": condition_distribution
             },
             "feedback_stats": feedback_stats,
+            "performance_stats": performance_stats,
             "current_state": {
                 "in_progress_scenarios": in_progress_count,
                 "lock_files": lock_file_count
@@ -123,84 +132,102 @@ class MetricsReporter:
         total_completions = sum(len(completions) for completions in task_distributor.user_completions.values())
         return round(total_completions / len(task_distributor.user_completions), 2)
     
-    def _get_feedback_rating_stats(self, feedback_dir):
-        if not os.path.exists(feedback_dir):
-            return {"error": "Feedback directory not found"}
-        
-        # Track ratings by category and scenario
-        ratings_by_category = defaultdict(list)
-        ratings_by_scenario = defaultdict(lambda: defaultdict(list))
-        ratings_by_condition = defaultdict(lambda: defaultdict(list))
-        
-        # Count total feedback files
-        feedback_file_count = 0
-        
-        # Scan user directories
-        for user_id in os.listdir(feedback_dir):
-            user_dir = os.path.join(feedback_dir, user_id)
-            if not os.path.isdir(user_dir) or user_id == "locks":
-                continue
-                
-            feedback_files = glob.glob(os.path.join(user_dir, "feedback_*.json"))
-            feedback_file_count += len(feedback_files)
-            
-            for feedback_path in feedback_files:
-                try:
-                    with open(feedback_path, 'r', encoding='utf-8') as f:
-                        feedback_data = json.load(f)
-                    
-                    scenario_id = feedback_data.get('scenario_id')
-                    condition = feedback_data.get('condition')
-                    ratings = feedback_data.get('ratings', {})
-                    
-                    for category, rating in ratings.items():
-                        ratings_by_category[category].append(rating)
-                        if scenario_id:
-                            ratings_by_scenario[scenario_id][category].append(rating)
-                        if condition:
-                            ratings_by_condition[condition][category].append(rating)
-                            
-                except Exception as e:
-                    log_print(f"Error reading feedback file {feedback_path}: {str(e)}")
+    # Rating statistics from the running aggregates (O(scenario x condition x category cells))
+    def _get_feedback_rating_stats(self, feedback_aggregates):
+        try:
+            cells, feedback_count = feedback_aggregates.load()
+        except Exception as e:
+            log_print(f"Error loading feedback aggregates: {str(e)}")
+            return {"error": "Feedback aggregates not available"}
+        
+        # Merges the cells by category, by scenario and category and by condition and category
+        by_category = defaultdict(RatingStats)
+        by_scenario = defaultdict(lambda: defaultdict(RatingStats))
+        by_condition = defaultdict(lambda: defaultdict(RatingStats))
+        
+        for (scenario_id, condition, category), stats in cells.items():
+            by_category[category].merge(stats)
+            if scenario_id:
+                by_scenario[scenario_id][category].merge(stats)
+            if condition:
+                by_condition[condition][category].merge(stats)
         
         category_stats = {}
-        for category, ratings in ratings_by_category.items():
-            if ratings:
+        for category, stats in by_category.items():
+            if stats.count:
                 category_stats[category] = {
-                    "avg": round(sum(ratings) / len(ratings), 2),
-                    "count": len(ratings),
-                    "min": min(ratings),
-                    "max": max(ratings)
+                    "avg": round(stats.mean, 2),
+                    "count": stats.count,
+                    "min": stats.min,
+                    "max": stats.max,
+                    "std": round(stats.stddev, 2) if stats.stddev is not None else None
                 }
         
         scenario_stats = {}
-        for scenario_id, categories in ratings_by_scenario.items():
-            scenario_stats[scenario_id] = {}
-            for category, ratings in categories.items():
-                if ratings:
-                    scenario_stats[scenario_id][category] = round(sum(ratings) / len(ratings), 2)
+        for scenario_id, categories in by_scenario.items():
+            scenario_stats[scenario_id] = {
+                category: round(stats.mean, 2) for category, stats in categories.items() if stats.count
+            }
         
         condition_stats = {}
-        for condition, categories in ratings_by_condition.items():
-            condition_stats[condition] = {}
-            for category, ratings in categories.items():
-                if ratings:
-                    condition_stats[condition][category] = round(sum(ratings) / len(ratings), 2)
+        for condition, categories in by_condition.items():
+            condition_stats[condition] = {
+                category: round(stats.mean, 2) for category, stats in categories.items() if stats.count
+            }
         
         return {
-            "total_feedback_files": feedback_file_count,
+            "total_feedback_files": feedback_count,
             "category_stats": category_stats,
             "scenario_stats": scenario_stats,
             "condition_stats": condition_stats
         }
     
     def _count_lock_files(self, task_distributor):
-        lock_file_base = task_distributor.lock_file_base
-        if not os.path.exists(lock_file_base):
-            return 0
+        return task_distributor.store.count_reservations()
+    
+    # Returns the metrics of the last snapshot written by the Gradio app, or None if there is
+    # no snapshot or it is too old to describe the running app
+    def _load_live_metrics(self):
+        snapshot = load_snapshot()
+        if not snapshot:
+            log_print("No metrics snapshot found, using the state of this process")
+            return None
+        
+        age = time.time() - snapshot.get("timestamp", 0)
+        if age > settings.Metrics.SNAPSHOT_MAX_AGE_SECONDS:
+            log_print(f"Metrics snapshot is {age:.0f} seconds old, using the state of this process")
+            return None
+        
+        return snapshot.get("metrics", {})
+    
+    def _get_live_value(self, live_metrics, name):
+        samples = live_metrics.get(name, {}).get("samples", [])
+        return sum(sample.get("value", 0) for sample in samples)
+    
+    # Latency percentiles (in ms) of every turn stage and of the state lock waits
+    def _get_performance_stats(self, live_metrics):
+        if not live_metrics:
+            return {}
+        
+        def to_ms(summary):
+            return {
+                "count": summary["count"],
+                "mean": round(summary["sum"] / summary["count"] * 1000, 2) if summary["count"] else None,
+                "p50": round(summary["p50"] * 1000, 2) if summary["p50"] is not None else None,
+                "p99": round(summary["p99"] * 1000, 2) if summary["p99"] is not None else None,
+                "max": round(summary["max"] * 1000, 2) if summary["max"] is not None else None
+            }
+        
+        stage_metric = live_metrics.get("study_turn_stage_seconds")
+        stages = sorted({sample["labels"].get("stage") for sample in (stage_metric or {}).get("samples", [])})
         
-        lock_files = glob.glob(os.path.join(lock_file_base, "*.lock"))
-        return len(lock_files)
+        stage_stats = {stage: to_ms(merge_snapshot_histogram(stage_metric, stage=stage)) for stage in stages}
+        lock_wait = to_ms(merge_snapshot_histogram(live_metrics.get("study_state_lock_wait_seconds")))
+        
+        return {
+            "stage_latency_ms": stage_stats,
+            "state_lock_wait_ms": lock_wait
+        }
     
     def format_email_body(self, report, image_urls=None):
         if "error" in report:
@@ -446,6 +473,37 @@ class MetricsReporter:
                 </div>
                 """
         
+        # Add performance section
+        if report.get("performance_stats"):
+            body += """
+            <h2>Performance</h2>
+            <table>
+                <tr>
+                    <th>Stage</th>
+                    <th>p50 (ms)</th>
+                    <th>p99 (ms)</th>
+                    <th>Max (ms)</th>
+                    <th>Samples</th>
+                </tr>
+            """
+            
+            stage_rows = list(report['performance_stats']['stage_latency_ms'].items())
+            stage_rows.append(("state lock wait", report['performance_stats']['state_lock_wait_ms']))
+            for stage, stats in stage_rows:
+                body += f"""
+                <tr>
+                    <td>{stage}</td>
+                    <td>{stats['p50']}</td>
+                    <td>{stats['p99']}</td>
+                    <td>{stats['max']}</td>
+                    <td>{stats['count']}</td>
+                </tr>
+                """
+            
+            body += """
+            </table>
+            """
+        
         # Add current state section
         body += f"""
             <h2>Current State</h2>
@@ -518,6 +576,13 @@ Completion Breakdown:
                 for category, avg in categories.items():
                     body += f"    {category}: {avg}\n"
         
+        if report.get("performance_stats"):
+            body += "\nPERFORMANCE (ms)\n----------------\n"
+            for stage, stats in report['performance_stats']['stage_latency_ms'].items():
+                body += f"  {stage}: p50 {stats['p50']}, p99 {stats['p99']}, max {stats['max']} ({stats['count']} samples)\n"
+            lock_wait = report['performance_stats']['state_lock_wait_ms']
+            body += f"  state lock wait: p50 {lock_wait['p50']}, p99 {lock_wait['p99']}, max {lock_wait['max']} ({lock_wait['count']} samples)\n"
+        
         body += f"\nCURRENT STATE\n------------\n"
         body += f"In-Progress Scenarios: {report['current_state']['in_progress_scenarios']}\n"
         body += f"Active Lock Files: {report['current_state']['lock_files']}\n"
@@ -530,12 +595,21 @@ Completion Breakdown:
         if not self.mailgun_domain:
             self.mailgun_domain = os.getenv("MAILGUN_DOMAIN", "")
 
+        report_start = time.perf_counter()
         report = self.generate_report()
+        report_generated = time.perf_counter()
         
         image_urls = metrics_visualizer.create_visualizations(report)
+        charts_created = time.perf_counter()
         
         html_email = self.format_email_body(report, image_urls)
         text_email = self.format_text_email_body(report)
+        
+        chart_timings = metrics_visualizer.last_stage_timings
+        log_print(f"Report stages: data {report_generated - report_start:.2f}s, "
+                  f"charts {charts_created - report_generated:.2f}s "
+                  f"(render {chart_timings.get('render_seconds', 0.0):.2f}s, remaining uploads {chart_timings.get('upload_wait_seconds', 0.0):.2f}s), "
+                  f"formatting {time.perf_counter() - charts_created:.2f}s")
         email_subject = f"Study Progress Report - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         
         if not self.mailgun_api_key or not self.mailgun_domain:
@@ -1,25 +1,36 @@
 import os
 import io
+import time
 import base64
 import requests
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import numpy as np
 from datetime import datetime
-from gradio_app.utils.logger import log_print
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print, DEBUG
+from gradio_app.models.chart_cache import ChartCache, CHART_MANIFEST_FILE
+
+CHART_STYLE = 'seaborn-v0_8-darkgrid'
+CHART_STYLE_VERSION = 1  # Increase when a chart method changes, so cached charts are rendered again
+
 class MetricsVisualizer:
     
     def __init__(self, imgbb_api_key=None):
         self.imgbb_api_key = imgbb_api_key or os.getenv("IMGBB_API_KEY", "")
         
-        plt.style.use('seaborn-v0_8-darkgrid')
+        plt.style.use(CHART_STYLE)
         
         self.cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 
                                      "logs", "metrics_images")
         os.makedirs(self.cache_dir, exist_ok=True)
+        self.chart_cache = ChartCache(self.cache_dir)
         
         self.condition_colors = {
             'fast_easy': '#4a86e8',  # Blue
@@ -36,6 +47,10 @@ class MetricsVisualizer:
             'slow_hard': 'Slow + Hard'
         }
         
+        self._http_session = None
+        self._http_session_lock = threading.Lock()
+        self.last_stage_timings = {}
+        
         log_print("MetricsVisualizer initialized")
     
     def create_visualizations(self, report_data):
@@ -50,61 +65,8 @@ class MetricsVisualizer:
         image_urls = {}
         
         try:
-            completion_counts = report_data["completion_stats"]["completion_counts"]
-            completion_chart_path = self._create_completion_chart(completion_counts, "standard")
-            if completion_chart_path:
-                completion_url = self._upload_image(completion_chart_path, "completion_distribution")
-                if completion_url:
-                    image_urls["completion_chart"] = completion_url
-            
-            scenario_dist = report_data["distribution_stats"]["scenario_distribution"]
-            scenario_chart_path = self._create_scenario_distribution_chart(scenario_dist, "standard")
-            if scenario_chart_path:
-                scenario_url = self._upload_image(scenario_chart_path, "scenario_distribution")
-                if scenario_url:
-                    image_urls["scenario_chart"] = scenario_url
-            
-            condition_dist = report_data["distribution_stats"]["condition_distribution"]
-            condition_chart_path = self._create_condition_distribution_chart(condition_dist, "standard")
-            if condition_chart_path:
-                condition_url = self._upload_image(condition_chart_path, "condition_distribution")
-                if condition_url:
-                    image_urls["condition_chart"] = condition_url
-            
-            design_chart_path = self._create_2x2_design_chart(condition_dist, "standard")
-            if design_chart_path:
-                design_url = self._upload_image(design_chart_path, "design_distribution") 
-                if design_url:
-                    image_urls["design_chart"] = design_url
-            
-            if "feedback_stats" in report_data and "category_stats" in report_data["feedback_stats"]:
-                feedback_stats = report_data["feedback_stats"]["category_stats"]
-                feedback_chart_path = self._create_feedback_ratings_chart(feedback_stats, "standard")
-                if feedback_chart_path:
-                    feedback_url = self._upload_image(feedback_chart_path, "feedback_ratings")
-                    if feedback_url:
-                        image_urls["feedback_chart"] = feedback_url
-                
-                if "condition_stats" in report_data["feedback_stats"]:
-                    condition_feedback = report_data["feedback_stats"]["condition_stats"]
-                    
-                    cond_feedback_path = self._create_condition_feedback_chart(condition_feedback, "standard")
-                    if cond_feedback_path:
-                        cond_feedback_url = self._upload_image(cond_feedback_path, "condition_feedback")
-                        if cond_feedback_url:
-                            image_urls["condition_feedback_chart"] = cond_feedback_url
-                    
-                    trust_chart_path = self._create_trust_visualization(condition_feedback, "standard")
-                    if trust_chart_path:
-                        trust_url = self._upload_image(trust_chart_path, "trust_visualization")
-                        if trust_url:
-                            image_urls["trust_chart"] = trust_url
-                            
-                    trust_metrics_path = self._create_trust_metrics_comparison(condition_feedback, "standard")
-                    if trust_metrics_path:
-                        trust_metrics_url = self._upload_image(trust_metrics_path, "trust_metrics_comparison")
-                        if trust_metrics_url:
-                            image_urls["trust_metrics_chart"] = trust_metrics_url
+            chart_jobs = self._get_chart_jobs(report_data)
+            image_urls = self._run_chart_pipeline(chart_jobs)
             
             log_print(f"Created {len(image_urls)} visualization charts")
             return image_urls
@@ -113,6 +75,139 @@ class MetricsVisualizer:
             log_print(f"Error creating visualizations: {str(e)}")
             return image_urls
     
+    # Returns the charts of the report as (chart method, arguments, upload name, image url key)
+    def _get_chart_jobs(self, report_data):
+        completion_counts = report_data["completion_stats"]["completion_counts"]
+        scenario_dist = report_data["distribution_stats"]["scenario_distribution"]
+        condition_dist = report_data["distribution_stats"]["condition_distribution"]
+        
+        chart_jobs = [
+            ("_create_completion_chart", (completion_counts, "standard"), "completion_distribution", "completion_chart"),
+            ("_create_scenario_distribution_chart", (scenario_dist, "standard"), "scenario_distribution", "scenario_chart"),
+            ("_create_condition_distribution_chart", (condition_dist, "standard"), "condition_distribution", "condition_chart"),
+            ("_create_2x2_design_chart", (condition_dist, "standard"), "design_distribution", "design_chart")
+        ]
+        
+        if "feedback_stats" in report_data and "category_stats" in report_data["feedback_stats"]:
+            feedback_stats = report_data["feedback_stats"]["category_stats"]
+            chart_jobs.append(("_create_feedback_ratings_chart", (feedback_stats, "standard"), "feedback_ratings", "feedback_chart"))
+            
+            if "condition_stats" in report_data["feedback_stats"]:
+                condition_feedback = report_data["feedback_stats"]["condition_stats"]
+                chart_jobs.extend([
+                    ("_create_condition_feedback_chart", (condition_feedback, "standard"), "condition_feedback", "condition_feedback_chart"),
+                    ("_create_trust_visualization", (condition_feedback, "standard"), "trust_visualization", "trust_chart"),
+                    ("_create_trust_metrics_comparison", (condition_feedback, "standard"), "trust_metrics_comparison", "trust_metrics_chart")
+                ])
+        
+        return chart_jobs
+    
+    # Renders the charts one after another and uploads every chart as soon as it is rendered, so the
+    # uploads overlap with the rendering of the remaining charts. Charts whose input is
+    # unchanged reuse the cached PNG and, until it is about to expire, the uploaded URL.
+    def _run_chart_pipeline(self, chart_jobs):
+        image_urls = {}
+        pipeline_start = time.perf_counter()
+        render_seconds = {}
+        upload_seconds = {}
+        render_done = pipeline_start
+        
+        cache_keys = {}
+        cached_uploads = []
+        render_jobs = []
+        cached_count = 0
+        style = self._chart_style()
+        for job in chart_jobs:
+            cache_keys[job[3]] = ChartCache.chart_key(job[0], job[1], style)
+            entry = self.chart_cache.get(cache_keys[job[3]]) if settings.Metrics.CHART_CACHE_ENABLED else None
+            if entry is None:
+                render_jobs.append(job)
+                continue
+            
+            cached_count += 1
+            image_url = self.chart_cache.valid_url(entry, settings.Metrics.CHART_URL_REFRESH_MARGIN_SECONDS)
+            if image_url:
+                image_urls[job[3]] = image_url
+            elif entry["file"]:
+                cached_uploads.append((job, self.chart_cache.image_path(entry)))
+        
+        upload_workers = max(1, settings.Metrics.CHART_UPLOAD_WORKERS)
+        
+        with ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="chart-upload") as upload_pool:
+            upload_futures = {}
+            for job, image_path in cached_uploads:
+                upload_futures[upload_pool.submit(self._timed_upload, image_path, job[2])] = job
+            
+            for job, chart_path, seconds in self._render_charts(render_jobs):
+                render_seconds[job[3]] = seconds
+                render_done = time.perf_counter()
+                entry = self.chart_cache.store_image(cache_keys[job[3]], job[3], chart_path)
+                if chart_path:
+                    upload_futures[upload_pool.submit(self._timed_upload, self.chart_cache.image_path(entry), job[2])] = job
+            
+            for future in as_completed(upload_futures):
+                url_key = upload_futures[future][3]
+                try:
+                    image_url, seconds, expires_at = future.result()
+                except Exception as e:
+                    log_print(f"Error uploading {url_key}: {str(e)}")
+                    continue
+                upload_seconds[url_key] = seconds
+                if image_url:
+                    image_urls[url_key] = image_url
+                    self.chart_cache.store_url(cache_keys[url_key], image_url, expires_at)
+        
+        self.chart_cache.save()
+        
+        pipeline_end = time.perf_counter()
+        self.last_stage_timings = {
+            "render_seconds": round(render_done - pipeline_start, 3),
+            "render_chart_seconds": round(sum(render_seconds.values()), 3),
+            "upload_wait_seconds": round(pipeline_end - render_done, 3),
+            "upload_chart_seconds": round(sum(upload_seconds.values()), 3),
+            "total_seconds": round(pipeline_end - pipeline_start, 3),
+            "charts_cached": cached_count,
+            "charts_rendered": len(render_seconds),
+            "charts_uploaded": len(upload_seconds)
+        }
+        log_print(f"Chart pipeline: {self.last_stage_timings['total_seconds']}s total, "
+                  f"{cached_count} of {len(chart_jobs)} charts from the cache, "
+                  f"render {self.last_stage_timings['render_seconds']}s ({self.last_stage_timings['render_chart_seconds']}s chart time), "
+                  f"uploads after rendering {self.last_stage_timings['upload_wait_seconds']}s ({self.last_stage_timings['upload_chart_seconds']}s upload time, {upload_workers} connections)")
+        for url_key, seconds in render_seconds.items():
+            log_print(f"Chart {url_key}: render {seconds:.3f}s, upload {upload_seconds.get(url_key, 0.0):.3f}s", level=DEBUG)
+        
+        return image_urls
+    
+    # Everything besides the chart input that changes the rendered charts (part of the cache key)
+    def _chart_style(self):
+        return {
+            "version": CHART_STYLE_VERSION,
+            "style": CHART_STYLE,
+            "matplotlib": matplotlib.__version__,
+            "condition_colors": self.condition_colors,
+            "condition_labels": self.condition_labels
+        }
+    
+    # Yields (job, chart path, render seconds) for every chart,
+    # charts that failed to render are logged and skipped
+    def _render_charts(self, chart_jobs):
+        for job in chart_jobs:
+            start = time.perf_counter()
+            try:
+                chart_path = getattr(self, job[0])(*job[1])
+            except Exception as e:
+                log_print(f"Error creating {job[3]}: {str(e)}")
+                continue
+            yield job, chart_path, time.perf_counter() - start
+    
+    # Returns (url, upload seconds, expiration timestamp of the url)
+    def _timed_upload(self, image_path, image_name):
+        start = time.perf_counter()
+        expires_at = time.time() + settings.Metrics.CHART_UPLOAD_EXPIRATION_SECONDS
+        image_url = self._upload_image(image_path, image_name)
+        return image_url, time.perf_counter() - start, expires_at
+    
     def _create_completion_chart(self, completion_counts, timestamp):
         fig, ax = plt.subplots(figsize=(10, 6))
         
@@ -833,7 +928,7 @@ class MetricsVisualizer:
             
             consistent_name = f"{image_name}"
             
-            expiration = 7 * 24 * 60 * 60  # 7 days in seconds
+            expiration = settings.Metrics.CHART_UPLOAD_EXPIRATION_SECONDS
             
             url = "https://api.imgbb.com/1/upload"
             payload = {
@@ -843,7 +938,7 @@ class MetricsVisualizer:
                 "expiration": expiration
             }
             
-            response = requests.post(url, payload)
+            response = self._get_http_session().post(url, payload, timeout=settings.Metrics.CHART_UPLOAD_TIMEOUT_SECONDS)
             
             if response.status_code == 200:
                 json_data = response.json()
@@ -852,7 +947,7 @@ class MetricsVisualizer:
                     delete_url = json_data["data"].get("delete_url", "Not available")
                     log_print(f"Successfully uploaded image: {image_name}")
                     log_print(f"Image delete URL: {delete_url}")
-                    log_print(f"Image will auto-expire in 7 days")
+                    log_print(f"Image will auto-expire in {expiration / 86400:g} days")
                     return image_url
                 else:
                     log_print(f"Failed to upload image: {json_data.get('error', {}).get('message', 'Unknown error')}")
@@ -865,6 +960,16 @@ class MetricsVisualizer:
             log_print(f"Error uploading image to ImgBB: {str(e)}")
             return None
     
+    # HTTP session shared by the concurrent uploads (keeps the connections to ImgBB open)
+    def _get_http_session(self):
+        with self._http_session_lock:
+            if self._http_session is None:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, settings.Metrics.CHART_UPLOAD_WORKERS))
+                session = requests.Session()
+                session.mount("https://", adapter)
+                self._http_session = session
+            return self._http_session
+    
     def get_image_as_base64(self, image_path):
         try:
             with open(image_path, "rb") as image_file:
@@ -880,7 +985,11 @@ class MetricsVisualizer:
             
         try:
             now = datetime.now()
-            count = 0
+            
+            # Cached charts are removed with their manifest entry once they weren't used for max_age_days
+            count = self.chart_cache.prune(max_age_days * 24 * 60 * 60)
+            self.chart_cache.save()
+            cached_files = self.chart_cache.referenced_files()
             
             essential_charts = [
                 "completion_chart.png",
@@ -894,7 +1003,7 @@ class MetricsVisualizer:
                 if not os.path.isfile(file_path):
                     continue
                     
-                if file_name in essential_charts:
+                if file_name in essential_charts or file_name in cached_files or file_name.startswith(CHART_MANIFEST_FILE):
                     continue
                 
                 mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
@@ -910,4 +1019,4 @@ class MetricsVisualizer:
         except Exception as e:
             log_print(f"Error cleaning up cache files: {str(e)}")
             return 0
-metrics_visualizer = MetricsVisualizer() 
\ No newline at end of file
+metrics_visualizer = MetricsVisualizer()
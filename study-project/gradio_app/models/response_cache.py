@@ -0,0 +1,217 @@
+# Precompiles the canned scenario responses into token/delta sequences
+import os
+import re
+import threading
+
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print
+from gradio_app.utils.detokenizer import IncrementalDetokenizer
+from gradio_app.utils.tokenizer import get_encoder
+from gradio_app.utils.metrics import turn_stage_seconds
+
+PUNCTUATION_CHARACTERS = {'.', ',', '!', '?', ';'}
+LIST_ITEM_PATTERN = re.compile(r"^(?:[-*+]|\d+\.)$")
+TASK_LIST_PATTERN = re.compile(r"\[[ xX]?\]?")
+
+
+class CompiledResponse:
+    """
+    Immutable, precomputed form of a response text. All per-token sequences are
+    aligned with token_ids; a delta is empty when its token ends in the middle
+    of a multi-byte character (the text is emitted with the following token).
+    """
+
+    __slots__ = (
+        "scenario_id", "condition", "text", "token_ids", "deltas",
+        "code_fence", "in_code_block", "newline", "punctuation", "markdown"
+    )
+
+    def __init__(self, scenario_id, condition, text, token_ids, deltas,
+                 code_fence, in_code_block, newline, punctuation, markdown):
+        self.scenario_id = scenario_id
+        self.condition = condition
+        self.text = text
+        self.token_ids = token_ids
+        self.deltas = deltas
+        self.code_fence = code_fence
+        self.in_code_block = in_code_block
+        self.newline = newline
+        self.punctuation = punctuation
+        self.markdown = markdown
+
+    def __len__(self):
+        return len(self.token_ids)
+
+
+# Classifies the markdown element a delta opens or closes, using the text of the
+# current line before the delta to tell block-level markers from inline ones.
+# Returns a key of settings.Chat.MARKDOWN_DELAY_MULTIPLIERS or None.
+def _classify_markdown(delta, line_prefix):
+    stripped = delta.strip()
+    if not stripped:
+        return None
+
+    if not line_prefix.strip():
+        if stripped.startswith("#"):
+            return "HEADER"
+        if len(stripped) >= 3 and set(stripped) in ({"-"}, {"*"}, {"_"}):
+            return "HORIZONTAL_RULE"
+        if stripped.startswith(">"):
+            return "BLOCK_QUOTE"
+        if stripped.startswith("|"):
+            return "TABLE"
+        if LIST_ITEM_PATTERN.match(stripped):
+            return "LIST_ITEM"
+
+    if "![" in stripped:
+        return "IMAGE"
+    if LIST_ITEM_PATTERN.match(line_prefix.strip()) and TASK_LIST_PATTERN.fullmatch(stripped):
+        return "TASK_LIST"
+    if "~~" in stripped:
+        return "STRIKETHROUGH"
+    if "**" in stripped or "__" in stripped:
+        return "BOLD"
+    if "`" in stripped:
+        return "INLINE_CODE"
+    if "]" in stripped:
+        return "LINK"
+    if "|" in stripped:
+        return "TABLE"
+    if stripped in ("*", "_"):
+        return "ITALIC"
+    return None
+
+
+def compile_response(text, tokenizer, scenario_id=None, condition=None):
+    token_ids = tokenizer.encode(text)
+    detokenizer = IncrementalDetokenizer(tokenizer)
+
+    deltas = []
+    code_fence = []
+    in_code_block_flags = []
+    newline = []
+    punctuation = []
+    markdown = []
+
+    in_code_block = False
+    line_prefix = ""
+
+    for i, token in enumerate(token_ids):
+        delta = detokenizer.push(token)
+        if i == len(token_ids) - 1:
+            delta += detokenizer.flush()
+
+        is_code_fence = '```' in delta
+        if is_code_fence:
+            in_code_block = not in_code_block
+
+        if is_code_fence or in_code_block:
+            markdown_kind = None
+        else:
+            markdown_kind = _classify_markdown(delta, line_prefix)
+
+        deltas.append(delta)
+        code_fence.append(is_code_fence)
+        in_code_block_flags.append(in_code_block)
+        newline.append('\n' in delta)
+        punctuation.append(bool(delta) and delta[-1] in PUNCTUATION_CHARACTERS)
+        markdown.append(markdown_kind)
+
+        if '\n' in delta:
+            line_prefix = delta.rsplit('\n', 1)[1]
+        else:
+            line_prefix += delta
+
+    return CompiledResponse(
+        scenario_id,
+        condition,
+        text,
+        tuple(token_ids),
+        tuple(deltas),
+        tuple(code_fence),
+        tuple(in_code_block_flags),
+        tuple(newline),
+        tuple(punctuation),
+        tuple(markdown)
+    )
+
+
+class ResponseCache:
+    """
+    Lazily compiles and memoizes the response.txt of every scenario/condition
+    pair (and any fallback message texts), so streaming a response only
+    replays a precomputed sequence without touching disk or the tokenizer.
+    """
+
+    def __init__(self, scenarios_dir):
+        self.scenarios_dir = scenarios_dir
+        self._responses = {}
+        self._texts = {}
+        self._lock = threading.Lock()
+
+    def _get_tokenizer(self):
+        return get_encoder()
+
+    def get_response_path(self, scenario_id, condition):
+        return os.path.join(self.scenarios_dir, scenario_id, condition, "response.txt")
+
+    # Returns the compiled response for a scenario/condition pair, or None if
+    # the response file does not exist. Read errors are raised to the caller.
+    def get(self, scenario_id, condition):
+        key = (scenario_id, condition)
+        compiled_response = self._responses.get(key)
+        if compiled_response is not None:
+            return compiled_response
+
+        with self._lock:
+            compiled_response = self._responses.get(key)
+            if compiled_response is not None:
+                return compiled_response
+
+            response_path = self.get_response_path(scenario_id, condition)
+            if not os.path.exists(response_path):
+                log_print(f"Response file not found: {response_path}")
+                return None
+
+            with open(response_path, "r", encoding="utf-8") as f:
+                text = f.read()
+
+            with turn_stage_seconds.labels("tokenization", scenario_id, condition).time():
+                compiled_response = compile_response(text, self._get_tokenizer(), scenario_id, condition)
+            self._responses[key] = compiled_response
+            log_print(f"Compiled response for {scenario_id}/{condition}: {len(compiled_response)} tokens")
+            return compiled_response
+
+    # Returns a compiled form of a fixed message text (e.g. error messages)
+    def get_text(self, text):
+        compiled_response = self._texts.get(text)
+        if compiled_response is not None:
+            return compiled_response
+
+        with self._lock:
+            compiled_response = self._texts.get(text)
+            if compiled_response is None:
+                compiled_response = compile_response(text, self._get_tokenizer())
+                self._texts[text] = compiled_response
+            return compiled_response
+
+    # Compiles every response and fallback message up front
+    def warm(self, scenario_conditions):
+        compiled_count = 0
+        for scenario_id, condition in scenario_conditions:
+            try:
+                if self.get(scenario_id, condition) is not None:
+                    compiled_count += 1
+            except Exception as e:
+                log_print(f"Error compiling response for {scenario_id}/{condition}: {str(e)}")
+
+        for text in (settings.Chat.NO_RESPONSE_MESSAGE, settings.Scenario.NO_RESPONSE_FILE, settings.Scenario.RESPONSE_ERROR):
+            self.get_text(text)
+
+        log_print(f"Response cache warmed with {compiled_count} responses")
+        return compiled_count
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+            self._texts.clear()
@@ -1,12 +1,13 @@
 # Handles scenario management and loading for the chat application
 import os
-import json
 import random
 
 import gradio as gr
 from gradio_app.config import settings
 from gradio_app.utils.logger import log_print
 from gradio_app.models.selection_algorithm import TaskDistributor
+from gradio_app.models.response_cache import ResponseCache
+from gradio_app.models.catalog import ScenarioCatalogLoader
 
 class ScenarioManager:
     """
@@ -25,55 +26,72 @@ class ScenarioManager:
             "feedback"
         ))
         
-        self.available_scenarios = []
+        # Immutable snapshot of the answers directory, shared with the TaskDistributor
+        self.catalog_loader = ScenarioCatalogLoader(self.scenarios_dir)
         
         from gradio_app.models.selection_algorithm import task_distributor
         import sys
         sys.modules['gradio_app.models.selection_algorithm'].task_distributor = TaskDistributor(
-            self.scenarios_dir, self.feedback_dir
+            self.scenarios_dir, self.feedback_dir, catalog_loader=self.catalog_loader
         )
         self.task_distributor = sys.modules['gradio_app.models.selection_algorithm'].task_distributor
         
-        self.available_scenarios = self._discover_available_scenarios()
+        # Compiled responses are built lazily (or via warm_response_cache at startup)
+        self.response_cache = ResponseCache(self.scenarios_dir)
+        # Responses may have changed when the catalog is rebuilt
+        self.catalog_loader.add_refresh_callback(lambda catalog: self.response_cache.clear())
         log_print(f"ScenarioManager initialized with {len(self.available_scenarios)} scenarios")
     
     #-------------------------------------------------------------------------
-    # SCENARIO DISCOVERY METHODS
+    # SCENARIO CATALOG METHODS
     #-------------------------------------------------------------------------
     
-    def _discover_available_scenarios(self):
-        if not os.path.exists(self.scenarios_dir):
-            log_print(f"Scenarios directory not found: {self.scenarios_dir}")
-            return []
-            
-        available_scenarios = [
-            folder for folder in os.listdir(self.scenarios_dir) 
-            if os.path.isdir(os.path.join(self.scenarios_dir, folder))
-        ]
-        log_print(f"Found {len(available_scenarios)} scenario directories")
-        return available_scenarios
+    @property
+    def available_scenarios(self):
+        return list(self.catalog_loader.get().scenario_ids)
     
     def _get_conditions_for_scenario(self, scenario_id):
-        scenario_path = os.path.join(self.scenarios_dir, scenario_id)
-        if not os.path.exists(scenario_path):
-            log_print(f"Scenario directory not found: {scenario_path}")
-            return []
-            
-        conditions = [
-            folder for folder in os.listdir(scenario_path) 
-            if os.path.isdir(os.path.join(scenario_path, folder))
-        ]
-        
-        if not conditions:
-            log_print(f"No condition folders found for scenario {scenario_id}")
-            return []
-            
-        return conditions
+        return list(self.catalog_loader.get().get_conditions(scenario_id))
+    
+    # Rebuilds the scenario catalog, e.g. after scenarios were added or edited while the app is running
+    def refresh_catalog(self, force=True):
+        return self.catalog_loader.refresh(force=force)
+    
+    #-------------------------------------------------------------------------
+    # RESPONSE CACHE METHODS
+    #-------------------------------------------------------------------------
+    
+    def get_compiled_response(self, scenario_id, condition):
+        return self.response_cache.get(scenario_id, condition)
+    
+    def get_compiled_text(self, text):
+        return self.response_cache.get_text(text)
+    
+    def warm_response_cache(self):
+        return self.response_cache.warm(self.catalog_loader.get().scenario_condition_pairs())
     
     #-------------------------------------------------------------------------
     # SCENARIO DATA METHODS
     #-------------------------------------------------------------------------
     
+    # Returns the questions of all available scenarios and conditions
+    def get_scenario_questions(self):
+        questions = []
+        catalog = self.catalog_loader.get()
+        for scenario_id, condition in catalog.scenario_condition_pairs():
+            scenario_data = catalog.get_scenario_data(scenario_id, condition)
+            if scenario_data and scenario_data.get("question"):
+                questions.append(scenario_data["question"])
+        return questions
+    
+    # Returns a copy of the scenario.json data of a scenario/condition pair from the catalog.
+    # Raises FileNotFoundError if the pair has no (readable) scenario file.
+    def get_scenario_data(self, scenario_id, condition):
+        scenario_data = self.catalog_loader.get().get_scenario_data(scenario_id, condition)
+        if scenario_data is None:
+            raise FileNotFoundError(f"Scenario file not found for {scenario_id}/{condition}")
+        return scenario_data
+    
     def _create_default_scenario(self):
         log_print("Creating default scenario as no scenarios were found")
         return {
@@ -101,24 +119,16 @@ class ScenarioManager:
         return True
         
     def _load_scenario_data(self, scenario_id, condition):
-        scenario_path = os.path.join(self.scenarios_dir, scenario_id, condition, "scenario.json")
-        if not os.path.exists(scenario_path):
-            log_print(f"Scenario file not found: {scenario_path}")
+        scenario_data = self.catalog_loader.get().get_scenario_data(scenario_id, condition)
+        if scenario_data is None:
+            log_print(f"Scenario file not found: {os.path.join(self.scenarios_dir, scenario_id, condition, 'scenario.json')}")
             gr.Warning(f"Scenario file not found for {scenario_id}/{condition}")
             return None
             
-        try:
-            with open(scenario_path, "r", encoding="utf-8") as f:
-                scenario_data = json.load(f)
-                
-            if not self._validate_scenario_data(scenario_data, scenario_id, condition):
-                gr.Warning(f"Invalid scenario data for {scenario_id}/{condition}")
-                return None
-                
-            return scenario_data
-        except Exception as e:
-            log_print(f"Error loading scenario data: {str(e)}")
-            gr.Warning(f"Error loading scenario: {str(e)}")
+        if not self._validate_scenario_data(scenario_data, scenario_id, condition):
+            gr.Warning(f"Invalid scenario data for {scenario_id}/{condition}")
             return None
+            
+        return scenario_data
 
 scenario_manager = ScenarioManager() 
\ No newline at end of file
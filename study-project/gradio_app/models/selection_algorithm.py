@@ -1,13 +1,19 @@
 import os
 import json
 import time
-import random
+import heapq
+import shutil
 import threading
-import fcntl
-import glob
 from datetime import datetime, timedelta
 
-from gradio_app.utils.logger import log_print
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print, DEBUG
+from gradio_app.utils.journal import journal_writer
+from gradio_app.utils.metrics import metrics_registry, turn_stage_seconds, state_lock_wait_seconds, InstrumentedLock
+from gradio_app.models.assignment_store import create_assignment_store
+from gradio_app.models.catalog import ScenarioCatalogLoader
+from gradio_app.models.assignment_engine import AssignmentEngine
+from gradio_app.models.feedback_aggregates import FeedbackAggregates
 
 class TaskDistributor:
     """
@@ -19,248 +25,235 @@ class TaskDistributor:
     concurrent access, and cleaning up abandoned sessions.
     """
     
-    def __init__(self, scenarios_dir, feedback_dir):
+    def __init__(self, scenarios_dir, feedback_dir, catalog_loader=None):
         self.scenarios_dir = scenarios_dir
         self.feedback_dir = feedback_dir
         
+        # Scenarios and conditions come from the in-memory catalog instead of listing the answers directory
+        self.catalog_loader = catalog_loader or ScenarioCatalogLoader(scenarios_dir)
+        
         self.user_completions = {}
         
         self.in_progress_scenarios = {}
         
+        # Reverse index of in_progress_scenarios: user_id -> set of scenario_condition_keys
+        self.user_reservations = {}
+        
         self.global_completions = {}
         self.max_scenarios_per_user = 4
         
+        # Inactivity after which the data of a user who hasn't finished the study is moved to the backup
         self.timeout_minutes = 60
         
-        self.lock_file_base = os.path.join(feedback_dir, "locks")
-        os.makedirs(self.lock_file_base, exist_ok=True)
+        # Reservations are short leases, renewed by the active session (see renew_lease)
+        self.lease_duration = timedelta(seconds=settings.Study.RESERVATION_LEASE_SECONDS)
+        
+        # Last reservation, lease renewal or completion of every user
+        self.user_last_activity = {}
+        
+        # Records the wait of every acquire in study_state_lock_wait_seconds
+        self.state_lock = InstrumentedLock(threading.RLock(), state_lock_wait_seconds)
+        
+        # Min-heap of (expires_at, scenario_condition_key, reserved_at) for the reservations in
+        # in_progress_scenarios. Entries of released or renewed leases are skipped when popped.
+        self.reservation_expiries = []
+        
+        self._reaper_thread = None
+        self._reaper_stop_event = threading.Event()
         
-        self.state_lock = threading.RLock()
+        # Persistent reservations and completions (lock files or SQLite, see settings.Study.ASSIGNMENT_STORE)
+        self.store = create_assignment_store(feedback_dir)
         
+        # Running feedback rating aggregates (updated on feedback submission and user cleanup)
+        self.feedback_aggregates = FeedbackAggregates(feedback_dir)
         self._initialize_completion_tracking()
         
+        # Counter-balanced selection over the completion counts, built from the scenario catalog
+        self.assignment_engine = None
+        self._engine_catalog = None
+        self._get_assignment_engine()
+        
         log_print("TaskDistributor initialized")
     
     def _initialize_completion_tracking(self):
         with self.state_lock:
-            if not os.path.exists(self.feedback_dir):
-                log_print("Feedback directory doesn't exist, creating it")
-                os.makedirs(self.feedback_dir, exist_ok=True)
-                return
-            
-            for user_id in os.listdir(self.feedback_dir):
-                user_dir = os.path.join(self.feedback_dir, user_id)
-                if not os.path.isdir(user_dir) or user_id == "locks":
-                    continue
-                    
-                self.user_completions[user_id] = []
-                
-                for feedback_file in os.listdir(user_dir):
-                    if not feedback_file.endswith('.json'):
-                        continue
-                        
-                    feedback_path = os.path.join(user_dir, feedback_file)
-                    try:
-                        with open(feedback_path, 'r', encoding='utf-8') as f:
-                            feedback_data = json.load(f)
-                        
-                        scenario_id = feedback_data.get('scenario_id')
-                        condition = feedback_data.get('condition')
-                        
-                        if scenario_id and condition:
-                            scenario_condition_key = f"{scenario_id}_{condition}"
-                            
-                            if scenario_condition_key not in self.user_completions[user_id]:
-                                self.user_completions[user_id].append(scenario_condition_key)
-                            
-                            self.global_completions[scenario_condition_key] = self.global_completions.get(scenario_condition_key, 0) + 1
-                    except Exception as e:
-                        log_print(f"Error reading feedback file {feedback_path}: {str(e)}")
+            self.user_completions, self.global_completions = self.store.load_completions()
             
             log_print(f"Initialized with {len(self.user_completions)} users and {len(self.global_completions)} scenario-condition completions")
     
     def get_available_scenarios(self):
-        if not os.path.exists(self.scenarios_dir):
-            log_print(f"Scenarios directory not found: {self.scenarios_dir}")
-            return []
-            
-        return [
-            folder for folder in os.listdir(self.scenarios_dir) 
-            if os.path.isdir(os.path.join(self.scenarios_dir, folder))
-        ]
+        return list(self.catalog_loader.get().scenario_ids)
     
     def get_available_conditions(self, scenario_id):
-        scenario_path = os.path.join(self.scenarios_dir, scenario_id)
-        if not os.path.exists(scenario_path):
-            log_print(f"Scenario directory not found: {scenario_path}")
-            return []
-            
-        return [
-            folder for folder in os.listdir(scenario_path) 
-            if os.path.isdir(os.path.join(scenario_path, folder))
-        ]
+        return list(self.catalog_loader.get().get_conditions(scenario_id))
     
-    def cleanup_abandoned_sessions(self):
+    # Releases all reservations whose timeout has passed and returns the users that held them.
+    # Only pops expired entries from the expiry heap (O(log n) per reservation).
+    def expire_reservations(self, now=None):
+        now = now or datetime.now()
+        expired_users = set()
+        
         with self.state_lock:
-            current_time = datetime.now()
-            timeout_threshold = timedelta(minutes=self.timeout_minutes)
-            
-            keys_to_remove = []
-            
-            abandoned_users = set()
-            
-            for scenario_condition_key, info in self.in_progress_scenarios.items():
-                timestamp = info.get("timestamp")
-                user_id = info.get("user_id")
-                
-                if timestamp and (current_time - timestamp) > timeout_threshold:
-                    log_print(f"Cleaning up abandoned scenario: {scenario_condition_key} for user {user_id}")
-                    keys_to_remove.append(scenario_condition_key)
-                    
-                    if user_id:
-                        abandoned_users.add(user_id)
-            
-            for key in keys_to_remove:
-                if 'lock_handle' in self.in_progress_scenarios[key]:
-                    try:
-                        self.in_progress_scenarios[key]['lock_handle'].close()
-                    except Exception as e:
-                        log_print(f"Error closing lock file handle during cleanup: {str(e)}")
+            while self.reservation_expiries and self.reservation_expiries[0][0] <= now:
+                expires_at, scenario_condition_key, reserved_at = heapq.heappop(self.reservation_expiries)
                 
-                del self.in_progress_scenarios[key]
-                
-                self._release_file_lock(key)
-            
-            if keys_to_remove:
-                log_print(f"Cleaned up {len(keys_to_remove)} abandoned scenarios")
+                info = self.in_progress_scenarios.get(scenario_condition_key)
+                if not info or info.get("expires_at") != expires_at:
+                    continue
                 
-            try:
-                file_age_threshold = timedelta(minutes=60)
+                user_id = info.get("user_id")
+                log_print(f"Lease of {scenario_condition_key} expired for user {user_id}, releasing it")
                 
-                special_dirs = {'locks', 'abandoned'}
-                user_dirs = [d for d in os.listdir(self.feedback_dir) 
-                            if os.path.isdir(os.path.join(self.feedback_dir, d))
-                            and d not in special_dirs]
+                self._remove_in_progress(scenario_condition_key)
+                self.store.release(scenario_condition_key, user_id, expires_at)
                 
-                for user_dir_name in user_dirs:
-                    user_dir_path = os.path.join(self.feedback_dir, user_dir_name)
-                    
-                    try:
-                        dir_mtime = os.path.getmtime(user_dir_path)
-                        dir_age = datetime.now() - datetime.fromtimestamp(dir_mtime)
-                        
-                        if dir_age > file_age_threshold:
-                            log_print(f"Found abandoned user directory: {user_dir_name}, age: {dir_age.total_seconds() / 60:.1f} minutes")
-                            
-                            abandoned_users.add(user_dir_name)
-                    except Exception as e:
-                        log_print(f"Error checking user directory age for {user_dir_name}: {str(e)}")
-            except Exception as e:
-                log_print(f"Error checking for abandoned user directories: {str(e)}")
+                if user_id:
+                    expired_users.add(user_id)
+        
+        if expired_users:
+            log_print(f"Cleaned up expired reservations of {len(expired_users)} users")
+        
+        return expired_users
+    
+    # Whether a user reserved, renewed or completed a scenario within the inactivity timeout
+    def _is_user_active(self, user_id, now=None):
+        last_activity = self.user_last_activity.get(user_id)
+        if last_activity is None:
+            return False
+        return (now or datetime.now()) - last_activity < timedelta(minutes=self.timeout_minutes)
+    
+    # Moves the data of a user who left the study before completing all scenarios to the backup
+    def _cleanup_if_abandoned(self, user_id):
+        user_dir = os.path.join(self.feedback_dir, user_id)
+        if not os.path.exists(user_dir):
+            return
+        
+        # An expired lease only frees the scenario, the data is kept until the user is inactive for the full timeout
+        if self._is_user_active(user_id):
+            return
+        
+        try:
+            user_completion_count = self.get_user_completion_count(user_id)
+            if user_completion_count < self.max_scenarios_per_user:
+                log_print(f"User {user_id} has abandoned the study with {user_completion_count}/{self.max_scenarios_per_user} scenarios completed")
                 
-            for user_id in abandoned_users:
-                user_dir = os.path.join(self.feedback_dir, user_id)
-                if os.path.exists(user_dir):
-                    try:
-                        user_completion_count = self.get_user_completion_count(user_id)
-                        if user_completion_count < self.max_scenarios_per_user:
-                            log_print(f"User {user_id} has abandoned the study with {user_completion_count}/{self.max_scenarios_per_user} scenarios completed")
-                            
-                            self.cleanup_user_data(user_id)
-                    except Exception as e:
-                        log_print(f"Error during user directory cleanup for {user_id}: {str(e)}")
-                        
-            try:
-                lock_files = glob.glob(os.path.join(self.lock_file_base, "*.lock"))
-                for lock_file in lock_files:
-                    try:
-                        scenario_condition_key = os.path.basename(lock_file).replace(".lock", "")
-                        if scenario_condition_key not in self.in_progress_scenarios:
-                            try:
-                                with open(lock_file, 'r') as f:
-                                    content = f.read().strip()
-                                log_print(f"Found orphaned lock file: {scenario_condition_key}, content: {content}")
-                                
-                                mtime = os.path.getmtime(lock_file)
-                                file_age = datetime.now() - datetime.fromtimestamp(mtime)
-                                if file_age > timeout_threshold:
-                                    log_print(f"Removing orphaned lock file: {scenario_condition_key}, age: {file_age}")
-                                    os.remove(lock_file)
-                            except Exception as e:
-                                log_print(f"Error processing orphaned lock file {scenario_condition_key}: {str(e)}")
-                    except Exception as e:
-                        log_print(f"Error checking lock file {os.path.basename(lock_file)}: {str(e)}")
-            except Exception as e:
-                log_print(f"Error scanning for orphaned lock files: {str(e)}")
+                self.cleanup_user_data(user_id)
+        except Exception as e:
+            log_print(f"Error during user directory cleanup for {user_id}: {str(e)}")
     
-    def _acquire_file_lock(self, scenario_condition_key, user_id):
-        lock_file_path = os.path.join(self.lock_file_base, f"{scenario_condition_key}.lock")
-        lock_file = None
+    # Full sweep for abandoned sessions: expired reservations, inactive user directories
+    # and orphaned reservations. Runs in the background reaper (and cleanup scripts),
+    # the directory scan happens without holding the state lock.
+    def cleanup_abandoned_sessions(self):
+        timeout_threshold = timedelta(minutes=self.timeout_minutes)
+        abandoned_users = self.expire_reservations()
+        
         try:
-            with open(lock_file_path, 'w') as f:
-                f.write(f"{user_id}:{datetime.now().isoformat()}")
-                f.flush()
-                os.fsync(f.fileno())
+            file_age_threshold = timedelta(minutes=60)
             
-            log_print(f"Created lock file: {lock_file_path} for user {user_id}")
+            special_dirs = {'locks', 'abandoned'}
+            user_dirs = [d for d in os.listdir(self.feedback_dir) 
+                        if os.path.isdir(os.path.join(self.feedback_dir, d))
+                        and d not in special_dirs]
             
-            lock_file = open(lock_file_path, 'r+')
-            
-            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-            
-            lock_file.seek(0)
-            lock_file.truncate()
-            lock_file.write(f"{user_id}:{datetime.now().isoformat()}")
-            lock_file.flush()
-            os.fsync(lock_file.fileno())
-            
-            return lock_file
-        except IOError:
-            if lock_file:
-                lock_file.close()
-            return False
+            for user_dir_name in user_dirs:
+                user_dir_path = os.path.join(self.feedback_dir, user_dir_name)
+                
+                try:
+                    dir_mtime = os.path.getmtime(user_dir_path)
+                    dir_age = datetime.now() - datetime.fromtimestamp(dir_mtime)
+                    
+                    if dir_age > file_age_threshold:
+                        log_print(f"Found abandoned user directory: {user_dir_name}, age: {dir_age.total_seconds() / 60:.1f} minutes")
+                        
+                        abandoned_users.add(user_dir_name)
+                except Exception as e:
+                    log_print(f"Error checking user directory age for {user_dir_name}: {str(e)}")
         except Exception as e:
-            log_print(f"Error acquiring lock for {scenario_condition_key}: {str(e)}")
-            if lock_file:
-                lock_file.close()
-            return False
-    
-    def _release_file_lock(self, scenario_condition_key):
-        lock_file_path = os.path.join(self.lock_file_base, f"{scenario_condition_key}.lock")
+            log_print(f"Error checking for abandoned user directories: {str(e)}")
+        
+        for user_id in abandoned_users:
+            self._cleanup_if_abandoned(user_id)
+        
+        with self.state_lock:
+            active_keys = set(self.in_progress_scenarios)
+        
         try:
-            if os.path.exists(lock_file_path):
-                os.remove(lock_file_path)
-                log_print(f"Released file lock for {scenario_condition_key}")
+            self.store.remove_orphaned_reservations(active_keys, timeout_threshold)
         except Exception as e:
-            log_print(f"Error releasing lock for {scenario_condition_key}: {str(e)}")
+            log_print(f"Error scanning for orphaned reservations: {str(e)}")
     
     def mark_scenario_in_progress(self, user_id, scenario_id, condition):
-        self.cleanup_abandoned_sessions()
-        
         scenario_condition_key = f"{scenario_id}_{condition}"
         
         with self.state_lock:
-            if scenario_condition_key in self.in_progress_scenarios:
-                current_user = self.in_progress_scenarios[scenario_condition_key].get("user_id")
-                if current_user != user_id:
+            reserved_at = datetime.now()
+            
+            info = self.in_progress_scenarios.get(scenario_condition_key)
+            if info is not None:
+                current_user = info.get("user_id")
+                if current_user == user_id:
+                    return self._extend_lease(scenario_condition_key, user_id, reserved_at)
+                if info["expires_at"] > reserved_at:
                     log_print(f"Scenario {scenario_condition_key} already in progress by user {current_user}")
                     return False
-                return True
+                
+                # Lease expired and not reaped yet: reclaim it right away
+                log_print(f"Reclaiming expired lease of {scenario_condition_key} from user {current_user}")
+                self._remove_in_progress(scenario_condition_key)
             
-            lock_handle = self._acquire_file_lock(scenario_condition_key, user_id)
-            if not lock_handle:
-                log_print(f"Could not acquire file lock for {scenario_condition_key} for user {user_id}")
+            expires_at = reserved_at + self.lease_duration
+            if not self.store.reserve(scenario_condition_key, user_id, expires_at=expires_at):
+                log_print(f"Could not reserve {scenario_condition_key} for user {user_id}")
                 return False
                 
             self.in_progress_scenarios[scenario_condition_key] = {
                 "user_id": user_id,
-                "timestamp": datetime.now(),
-                "lock_handle": lock_handle
+                "timestamp": reserved_at,
+                "expires_at": expires_at
             }
+            self.user_reservations.setdefault(user_id, set()).add(scenario_condition_key)
+            self.user_last_activity[user_id] = reserved_at
+            heapq.heappush(self.reservation_expiries, (expires_at, scenario_condition_key, reserved_at))
             
             log_print(f"Marked scenario {scenario_condition_key} as in-progress for user {user_id}")
             return True
     
+    # Renews the lease of the scenario a user is working on (called from the active session).
+    # Reacquires the reservation if it was already released after expiring, unless another
+    # user got the scenario in the meantime or the user already completed it.
+    def renew_lease(self, user_id, scenario_id, condition):
+        scenario_condition_key = f"{scenario_id}_{condition}"
+        
+        with self.state_lock:
+            if scenario_condition_key in self.user_completions.get(user_id, ()):
+                return False
+            
+            info = self.in_progress_scenarios.get(scenario_condition_key)
+            if info is not None and info.get("user_id") == user_id:
+                if self._extend_lease(scenario_condition_key, user_id, datetime.now()):
+                    return True
+            
+            log_print(f"Lease of {scenario_condition_key} for user {user_id} was released, reacquiring it")
+            return self.mark_scenario_in_progress(user_id, scenario_id, condition)
+    
+    # Moves the expiry of a reservation held by the user forward by one lease duration
+    def _extend_lease(self, scenario_condition_key, user_id, now):
+        expires_at = now + self.lease_duration
+        if not self.store.renew(scenario_condition_key, user_id, expires_at):
+            log_print(f"Could not renew the lease of {scenario_condition_key} for user {user_id}")
+            self._remove_in_progress(scenario_condition_key)
+            return False
+        
+        info = self.in_progress_scenarios[scenario_condition_key]
+        info["expires_at"] = expires_at
+        self.user_last_activity[user_id] = now
+        heapq.heappush(self.reservation_expiries, (expires_at, scenario_condition_key, info["timestamp"]))
+        return True
+    
+    # Updates the in-memory state under the state lock and hands the completion record and
+    # the store update to the journal writer afterwards, so that concurrent submissions
+    # don't wait for each other's disk I/O. Returns the futures of the pending writes.
     def mark_scenario_completed(self, user_id, scenario_id, condition):
         """
         Mark a scenario as completed by a user.
@@ -269,72 +262,66 @@ class TaskDistributor:
         
         with self.state_lock:
             if scenario_condition_key in self.in_progress_scenarios:
-                lock_info = self.in_progress_scenarios[scenario_condition_key]
-                if 'lock_handle' in lock_info:
-                    try:
-                        lock_info['lock_handle'].close()
-                    except Exception as e:
-                        log_print(f"Error closing lock file: {str(e)}")
-                
-                del self.in_progress_scenarios[scenario_condition_key]
-                
-                self._release_file_lock(scenario_condition_key)
-                log_print(f"Released lock file for completed scenario: {scenario_condition_key}")
+                self._remove_in_progress(scenario_condition_key)
+                log_print(f"Released reservation for completed scenario: {scenario_condition_key}")
             
             if user_id not in self.user_completions:
                 self.user_completions[user_id] = []
+            self.user_last_activity[user_id] = datetime.now()
             
+            # Counts every scenario-condition pair once per user (as when loading the index)
             if scenario_condition_key not in self.user_completions[user_id]:
                 self.user_completions[user_id].append(scenario_condition_key)
-            
-            self.global_completions[scenario_condition_key] = self.global_completions.get(scenario_condition_key, 0) + 1
+                self.global_completions[scenario_condition_key] = self.global_completions.get(scenario_condition_key, 0) + 1
+                self.assignment_engine.record_completion(scenario_condition_key)
+                completions_total.labels(scenario_id, condition).inc()
             
             log_print(f"Marked scenario {scenario_condition_key} as completed for user {user_id}")
-            
-            self._save_completion_to_disk(user_id, scenario_id, condition)
+        
+        futures = [self._save_completion_to_disk(user_id, scenario_id, condition)]
+        
+        # Releases the reservation (only if still held by this user) and records the completion
+        try:
+            futures.append(self.store.complete(user_id, scenario_id, condition))
+        except Exception as e:
+            log_print(f"Error storing completion of {scenario_condition_key}: {str(e)}")
+        
+        return [future for future in futures if future is not None]
             
     def release_all_user_locks(self, user_id):
         log_print(f"Releasing locks for user {user_id}")
         
         with self.state_lock:
-            user_locks = []
-            for scenario_condition_key, info in self.in_progress_scenarios.items():
-                if info.get("user_id") == user_id:
-                    user_locks.append(scenario_condition_key)
+            user_locks = list(self.user_reservations.get(user_id, ()))
             
             for key in user_locks:
-                lock_info = self.in_progress_scenarios[key]
-                if 'lock_handle' in lock_info:
-                    try:
-                        lock_info['lock_handle'].close()
-                    except Exception as e:
-                        log_print(f"Error closing lock file for {key}: {str(e)}")
-                
-                del self.in_progress_scenarios[key]
-                self._release_file_lock(key)
-            
-            if user_locks:
-                log_print(f"Released {len(user_locks)} locks for user {user_id}")
+                self._remove_in_progress(key)
             
             try:
-                all_lock_files = glob.glob(os.path.join(self.lock_file_base, "*.lock"))
-                for lock_file in all_lock_files:
-                    try:
-                        with open(lock_file, 'r') as f:
-                            lock_content = f.read().strip()
-                        
-                        if user_id in lock_content:
-                            os.remove(lock_file)
-                    except Exception:
-                        pass
+                released_keys = self.store.release_user(user_id)
             except Exception as e:
-                log_print(f"Error checking for orphaned lock files: {str(e)}")
+                log_print(f"Error releasing stored reservations for user {user_id}: {str(e)}")
+                released_keys = []
+            
+            released_count = len(set(user_locks) | set(released_keys))
+            if released_count:
+                log_print(f"Released {released_count} locks for user {user_id}")
+    
+    # Removes a reservation from in_progress_scenarios and the user reverse index
+    def _remove_in_progress(self, scenario_condition_key):
+        info = self.in_progress_scenarios.pop(scenario_condition_key, None)
+        if not info:
+            return
+        
+        user_keys = self.user_reservations.get(info.get("user_id"))
+        if user_keys is not None:
+            user_keys.discard(scenario_condition_key)
+            if not user_keys:
+                del self.user_reservations[info.get("user_id")]
     
+    # Queues the completion record on the journal writer, returns its future (None on error)
     def _save_completion_to_disk(self, user_id, scenario_id, condition):
         try:
-            user_dir = os.path.join(self.feedback_dir, user_id)
-            os.makedirs(user_dir, exist_ok=True)
-            
             completion_data = {
                 "timestamp": datetime.now().isoformat(),
                 "scenario_id": scenario_id,
@@ -342,13 +329,14 @@ class TaskDistributor:
                 "status": "completed"
             }
             
-            completion_file = os.path.join(user_dir, f"completion_{scenario_id}_{condition}.json")
-            with open(completion_file, 'w') as f:
-                json.dump(completion_data, f, indent=2)
+            completion_file = os.path.join(self.feedback_dir, user_id, f"completion_{scenario_id}_{condition}.json")
+            future = journal_writer.write(completion_file, json.dumps(completion_data, indent=2))
                 
-            log_print(f"Saved completion record to {completion_file}")
+            log_print(f"Queued completion record for {completion_file}")
+            return future
         except Exception as e:
             log_print(f"Error saving completion record: {str(e)}")
+            return None
     
     def get_user_completion_count(self, user_id):
         with self.state_lock:
@@ -372,99 +360,87 @@ class TaskDistributor:
             return list(completed_scenarios)
     
     def select_next_scenario_for_user(self, user_id):
-        # Run cleanup of abandoned sessions
-        self.cleanup_abandoned_sessions()
+        start = time.perf_counter()
+        scenario_id, condition = self._select_next_scenario(user_id)
+        
+        turn_stage_seconds.labels("selection", scenario_id or "", condition or "").observe(time.perf_counter() - start)
+        selections_total.labels("selected" if scenario_id else "unavailable").inc()
+        return scenario_id, condition
+    
+    def _select_next_scenario(self, user_id):
+        # Takes the (throttled) catalog mtime check out of the locked section
+        assignment_engine = self._get_assignment_engine()
         
         with self.state_lock:
             if self.has_user_completed_all_scenarios(user_id):
                 log_print(f"User {user_id} has completed all scenarios")
                 return None, None
             
-            all_scenarios = self.get_available_scenarios()
-            if not all_scenarios:
+            if not assignment_engine.scenario_ids:
                 log_print("No scenarios available")
                 return None, None
             
-            completed_scenarios = self.get_user_completed_scenarios(user_id)
-            available_scenarios = [s for s in all_scenarios if s not in completed_scenarios]
+            completed_scenarios = set(self.get_user_completed_scenarios(user_id))
             
-            log_print(f"USER SELECTION - User {user_id}: completed {len(completed_scenarios)}/{len(all_scenarios)} scenarios")
-            log_print(f"USER SELECTION - Completed scenarios: {completed_scenarios}")
-            log_print(f"USER SELECTION - Available scenarios: {available_scenarios}")
+            log_print("USER SELECTION - User %s: completed %d/%d scenarios", user_id, len(completed_scenarios), len(assignment_engine.scenario_ids), level=DEBUG)
+            log_print("USER SELECTION - Completed scenarios: %s", completed_scenarios, level=DEBUG)
             
-            if not available_scenarios:
+            if completed_scenarios.issuperset(assignment_engine.scenario_ids):
                 log_print(f"User {user_id} has no new scenarios to complete")
                 return None, None
             
             user_experienced_conditions = set()
-            if user_id in self.user_completions:
-                for scenario_condition in self.user_completions[user_id]:
-                    _, condition = scenario_condition.split('_', 1)
-                    user_experienced_conditions.add(condition)
-                    
-            log_print(f"USER SELECTION - Conditions already experienced: {user_experienced_conditions}")
-            
-            random.shuffle(available_scenarios)
-            
-            max_attempts = 3
-            attempt = 0
-            
-            while attempt < max_attempts:
-                attempt += 1
-                
-                for selected_scenario in available_scenarios:
-                    all_conditions = self.get_available_conditions(selected_scenario)
-                    if not all_conditions:
-                        log_print(f"No conditions available for scenario {selected_scenario}")
-                        continue
-                        
-                    unused_conditions = [c for c in all_conditions if c not in user_experienced_conditions]
-                    
-                    log_print(f"USER SELECTION - For scenario {selected_scenario}, unused conditions: {unused_conditions}")
-                    
-                    if unused_conditions:
-                        condition_counts = {}
-                        for condition in unused_conditions:
-                            scenario_condition_key = f"{selected_scenario}_{condition}"
-                            condition_counts[condition] = self.global_completions.get(scenario_condition_key, 0)
-                        
-                        sorted_conditions = sorted(condition_counts.items(), key=lambda x: x[1])
-                        
-                        min_count = sorted_conditions[0][1]
-                        least_completed = [c for c, count in sorted_conditions if count == min_count]
-                        
-                        log_print(f"USER SELECTION - Condition counts: {condition_counts}")
-                        log_print(f"USER SELECTION - Least completed unused conditions: {least_completed} (count: {min_count})")
-                        
-                        selected_condition = random.choice(least_completed)
-                    else:
-                        condition_counts = {}
-                        for condition in all_conditions:
-                            scenario_condition_key = f"{selected_scenario}_{condition}"
-                            condition_counts[condition] = self.global_completions.get(scenario_condition_key, 0)
-                        
-                        sorted_conditions = sorted(condition_counts.items(), key=lambda x: x[1])
-                        
-                        min_count = sorted_conditions[0][1]
-                        least_completed = [c for c, count in sorted_conditions if count == min_count]
-                        
-                        selected_condition = random.choice(least_completed)
-                    
-                    success = self.mark_scenario_in_progress(user_id, selected_scenario, selected_condition)
+            for scenario_condition in self.user_completions.get(user_id, ()):
+                _, condition = scenario_condition.split('_', 1)
+                user_experienced_conditions.add(condition)
                     
-                    if success:
-                        log_print(f"USER SELECTION - SELECTED: scenario {selected_scenario} with condition {selected_condition} for user {user_id}")
-                        return selected_scenario, selected_condition
-                    else:
-                        log_print(f"USER SELECTION - Could not mark scenario {selected_scenario} with condition {selected_condition} as in-progress, retrying")
+            log_print("USER SELECTION - Conditions already experienced: %s", user_experienced_conditions, level=DEBUG)
+            
+            now = datetime.now()
+            
+            # Pairs with an expired lease count as free, mark_scenario_in_progress reclaims them
+            def is_reserved(scenario_condition_key):
+                info = self.in_progress_scenarios.get(scenario_condition_key)
+                return info is not None and info.get("user_id") != user_id and info["expires_at"] > now
+            
+            # Candidates come in priority order (counterbalanced scenario order, least-completed
+            # unused condition first). A failed reservation (held by another process) moves on
+            # to the next candidate instead of sleeping and retrying under the lock.
+            candidates = assignment_engine.iter_candidates(
+                user_id, completed_scenarios, user_experienced_conditions, is_reserved
+            )
+            for selected_scenario, selected_condition in candidates:
+                if self.mark_scenario_in_progress(user_id, selected_scenario, selected_condition):
+                    completion_count = assignment_engine.get_condition_count(selected_scenario, selected_condition)
+                    log_print(f"USER SELECTION - SELECTED: scenario {selected_scenario} with condition {selected_condition} (completed {completion_count} times) for user {user_id}")
+                    return selected_scenario, selected_condition
                 
-                if attempt < max_attempts:
-                    log_print(f"Could not find an available scenario-condition pair on attempt {attempt}, retrying in 0.5 seconds")
-                    time.sleep(0.5)
+                log_print("USER SELECTION - Could not mark scenario %s with condition %s as in-progress, trying next candidate", selected_scenario, selected_condition, level=DEBUG)
             
-            log_print(f"Could not find a valid scenario-condition pair for user {user_id} after {max_attempts} attempts")
+            log_print(f"Could not find an available scenario-condition pair for user {user_id}")
             return None, None
     
+    # Returns the assignment engine, rebuilt from the completion counts if the scenario catalog changed
+    def _get_assignment_engine(self):
+        catalog = self.catalog_loader.get()
+        
+        with self.state_lock:
+            if catalog is not self._engine_catalog:
+                scenario_conditions = {
+                    scenario_id: catalog.get_conditions(scenario_id)
+                    for scenario_id in catalog.scenario_ids
+                }
+                if self.assignment_engine is None:
+                    self.assignment_engine = AssignmentEngine(scenario_conditions, self.global_completions)
+                else:
+                    self.assignment_engine.rebuild(scenario_conditions, self.global_completions)
+                self._engine_catalog = catalog
+            
+            return self.assignment_engine
+    
+    # Moves the data of a user to the backup and forgets the user's reservations and completions.
+    # The disk work (journal flush, aggregates update, directory move) happens before the state
+    # lock is taken, only the in-memory bookkeeping runs under it.
     def cleanup_user_data(self, user_id):
         if not user_id:
             log_print("Cannot cleanup user data: No user ID provided")
@@ -472,59 +448,72 @@ class TaskDistributor:
             
         log_print(f"Performing complete cleanup for user {user_id}")
         
-        with self.state_lock:
-            try:
-                self.release_all_user_locks(user_id)
-                
-                completed_scenario_conditions = []
-                if user_id in self.user_completions:
-                    completed_scenario_conditions = self.user_completions[user_id].copy()
-                    completion_count = len(completed_scenario_conditions)
-                    log_print(f"User {user_id} has {completion_count} completed scenarios")
-                else:
-                    log_print(f"User {user_id} has no completion records in memory")
-                
-                user_dir = os.path.join(self.feedback_dir, user_id)
-                if os.path.exists(user_dir) and os.path.isdir(user_dir):
-                    file_count = len([f for f in os.listdir(user_dir) if os.path.isfile(os.path.join(user_dir, f))])
-                    log_print(f"Backing up user directory: {user_id} with {file_count} files")
-                    
-                    backup_dir = os.path.join(self.feedback_dir, "abandoned")
-                    os.makedirs(backup_dir, exist_ok=True)
-                    
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    user_backup_dir = os.path.join(backup_dir, f"{user_id}_{timestamp}")
-                    
-                    import shutil
-                    try:
-                        shutil.move(user_dir, user_backup_dir)
-                        log_print(f"Moved user data to backup: {user_backup_dir}")
-                    except Exception as e:
-                        log_print(f"Error backing up user directory: {str(e)}")
-                else:
-                    log_print(f"No feedback directory found for user {user_id}")
+        try:
+            self.release_all_user_locks(user_id)
+            
+            # Queued records of the user are written before the directory is moved
+            journal_writer.flush()
+            self._backup_user_directory(user_id)
+            
+            completed_scenario_conditions = None
+            with self.state_lock:
+                self.assignment_engine.forget_user(user_id)
+                self.user_last_activity.pop(user_id, None)
                 
                 if user_id in self.user_completions:
-                    del self.user_completions[user_id]
-                    log_print(f"Removed user {user_id} from completion tracking")
+                    completed_scenario_conditions = self.user_completions.pop(user_id)
+                    log_print(f"Removed user {user_id} with {len(completed_scenario_conditions)} completed scenarios from completion tracking")
                     
                     for scenario_condition_key in completed_scenario_conditions:
                         if scenario_condition_key in self.global_completions:
                             self.global_completions[scenario_condition_key] -= 1
+                            self.assignment_engine.record_removal(scenario_condition_key)
                             if self.global_completions[scenario_condition_key] <= 0:
                                 del self.global_completions[scenario_condition_key]
                                 log_print(f"Removed {scenario_condition_key} from global completions")
                             else:
                                 log_print(f"Decremented completion count for {scenario_condition_key} to {self.global_completions[scenario_condition_key]}")
-                    
-                    if completed_scenario_conditions:
-                        log_print(f"Released {len(completed_scenario_conditions)} scenario-conditions back to the available pool")
-                
-                return True
+                else:
+                    log_print(f"User {user_id} has no completion records in memory")
+            
+            if completed_scenario_conditions is not None:
+                if completed_scenario_conditions:
+                    log_print(f"Released {len(completed_scenario_conditions)} scenario-conditions back to the available pool")
                 
-            except Exception as e:
-                log_print(f"Error during user cleanup for {user_id}: {str(e)}")
-                return False
+                self.store.purge_user(user_id)
+            
+            return True
+            
+        except Exception as e:
+            log_print(f"Error during user cleanup for {user_id}: {str(e)}")
+            return False
+    
+    # Subtracts the user's feedback from the aggregates and moves the user directory to the backup
+    def _backup_user_directory(self, user_id):
+        user_dir = os.path.join(self.feedback_dir, user_id)
+        if not (os.path.exists(user_dir) and os.path.isdir(user_dir)):
+            log_print(f"No feedback directory found for user {user_id}")
+            return
+        
+        file_count = len([f for f in os.listdir(user_dir) if os.path.isfile(os.path.join(user_dir, f))])
+        log_print(f"Backing up user directory: {user_id} with {file_count} files")
+        
+        try:
+            self.feedback_aggregates.remove_user_feedback(user_dir)
+        except Exception as e:
+            log_print(f"Error removing feedback of user {user_id} from the aggregates: {str(e)}")
+        
+        backup_dir = os.path.join(self.feedback_dir, "abandoned")
+        os.makedirs(backup_dir, exist_ok=True)
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        user_backup_dir = os.path.join(backup_dir, f"{user_id}_{timestamp}")
+        
+        try:
+            shutil.move(user_dir, user_backup_dir)
+            log_print(f"Moved user data to backup: {user_backup_dir}")
+        except Exception as e:
+            log_print(f"Error backing up user directory: {str(e)}")
 
     def find_locked_scenario_for_user(self, user_id):
         if not user_id:
@@ -534,38 +523,84 @@ class TaskDistributor:
         log_print(f"Checking for locked scenarios for user {user_id}")
         
         with self.state_lock:
-            for scenario_condition_key, info in self.in_progress_scenarios.items():
-                current_user = info.get("user_id")
-                if current_user == user_id:
-                    scenario_id, condition = scenario_condition_key.split('_', 1)
-                    log_print(f"Found in-memory locked scenario for user {user_id}: {scenario_id}, condition: {condition}")
-                    return scenario_id, condition
+            for scenario_condition_key in sorted(self.user_reservations.get(user_id, ())):
+                scenario_id, condition = scenario_condition_key.split('_', 1)
+                log_print(f"Found in-memory locked scenario for user {user_id}: {scenario_id}, condition: {condition}")
+                return scenario_id, condition
         
         try:
-            lock_files = glob.glob(os.path.join(self.lock_file_base, "*.lock"))
-            for lock_file in lock_files:
-                try:
-                    with open(lock_file, 'r') as f:
-                        content = f.read().strip()
-                    
-                    if content.startswith(f"{user_id}:"):
-                        scenario_condition_key = os.path.basename(lock_file).replace(".lock", "")
-                        scenario_id, condition = scenario_condition_key.split('_', 1)
-                        
-                        log_print(f"Found existing lock file for user {user_id}: {scenario_id}, condition: {condition}")
-                        
-                        success = self.mark_scenario_in_progress(user_id, scenario_id, condition)
-                        if success:
-                            log_print(f"Successfully reacquired lock for scenario {scenario_id}, condition: {condition}")
-                            return scenario_id, condition
-                        else:
-                            log_print(f"Failed to reacquire lock for scenario {scenario_id}, condition: {condition}")
-                except Exception as e:
-                    log_print(f"Error checking lock file {os.path.basename(lock_file)}: {str(e)}")
+            for scenario_condition_key in self.store.find_user_reservations(user_id):
+                scenario_id, condition = scenario_condition_key.split('_', 1)
+                
+                log_print(f"Found existing reservation for user {user_id}: {scenario_id}, condition: {condition}")
+                
+                success = self.mark_scenario_in_progress(user_id, scenario_id, condition)
+                if success:
+                    log_print(f"Successfully reacquired lock for scenario {scenario_id}, condition: {condition}")
+                    return scenario_id, condition
+                else:
+                    log_print(f"Failed to reacquire lock for scenario {scenario_id}, condition: {condition}")
         except Exception as e:
             log_print(f"Error scanning for locked scenarios: {str(e)}")
         
         log_print(f"No locked scenarios found for user {user_id}")
         return None, None
 
-task_distributor = None 
\ No newline at end of file
+    # Metrics collector: refreshes the reservation and participant gauges before a snapshot
+    def collect_metrics(self):
+        with self.state_lock:
+            reservations_in_progress.set(len(self.in_progress_scenarios))
+            participants_tracked.set(len(self.user_completions))
+        reservations_stored.set(self.store.count_reservations())
+    
+    #-------------------------------------------------------------------------
+    # BACKGROUND REAPER
+    #-------------------------------------------------------------------------
+    
+    # Starts a daemon thread that releases expired leases and periodically runs
+    # the full abandoned session cleanup, off the assignment request path
+    def start_reaper(self):
+        if self._reaper_thread and self._reaper_thread.is_alive():
+            return
+        
+        self._reaper_stop_event.clear()
+        self._reaper_thread = threading.Thread(target=self._run_reaper, name="reservation-reaper", daemon=True)
+        self._reaper_thread.start()
+        log_print("Started reservation reaper")
+    
+    def stop_reaper(self):
+        self._reaper_stop_event.set()
+        if self._reaper_thread:
+            self._reaper_thread.join()
+            self._reaper_thread = None
+    
+    def _run_reaper(self):
+        last_sweep = time.monotonic()
+        
+        while not self._reaper_stop_event.wait(settings.Study.RESERVATION_REAPER_INTERVAL_SECONDS):
+            try:
+                if time.monotonic() - last_sweep >= settings.Study.ABANDONED_SESSION_SWEEP_INTERVAL_SECONDS:
+                    last_sweep = time.monotonic()
+                    self.cleanup_abandoned_sessions()
+                else:
+                    self.expire_reservations()
+            except Exception as e:
+                log_print(f"Error in reservation reaper: {str(e)}")
+
+selections_total = metrics_registry.counter(
+    "study_selections_total", "Scenario selections by result", ("result",)
+)
+completions_total = metrics_registry.counter(
+    "study_completions_total", "Completed scenario-condition pairs", ("scenario", "condition")
+)
+reservations_in_progress = metrics_registry.gauge(
+    "study_reservations_in_progress", "Scenario-condition pairs currently reserved"
+)
+reservations_stored = metrics_registry.gauge(
+    "study_reservations_stored", "Reservations in the assignment store (lock files or database rows)"
+)
+participants_tracked = metrics_registry.gauge(
+    "study_participants_tracked", "Participants with completion records in memory"
+)
+
+task_distributor = None
@@ -0,0 +1,177 @@
+# Computes the similarity between participant messages and scenario questions
+import os
+import json
+import threading
+import subprocess
+from functools import lru_cache
+
+import numpy as np
+import spacy
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print
+
+# Files of an exported vector table (see export_similarity_vectors.py)
+VECTOR_TABLE_METADATA_FILE = "metadata.json"
+VECTOR_TABLE_VECTORS_FILE = "vectors.npy"
+VECTOR_TABLE_KEYS_FILE = "keys.npy"
+VECTOR_TABLE_ROWS_FILE = "rows.npy"
+
+
+# Normalizes a text before vectorizing it, so messages that only differ in
+# surrounding or repeated whitespace share a cache entry
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+class TextVector:
+    """
+    Averaged word vector of a tokenized text. The token ids are kept to
+    reproduce spaCy's shortcut of scoring identical texts as 1.0.
+    """
+
+    __slots__ = ("orths", "vector", "norm")
+
+    def __init__(self, orths, vector, norm):
+        self.orths = orths
+        self.vector = vector
+        self.norm = norm
+
+
+# Cosine similarity of two text vectors, with the same edge cases as spaCy's Doc.similarity
+def cosine_similarity(first, second):
+    if first.orths == second.orths:
+        return 1.0
+    if first.norm == 0 or second.norm == 0:
+        return 0.0
+    return float(np.dot(first.vector, second.vector) / (first.norm * second.norm))
+
+
+class SimilarityBackend:
+    """
+    Base class of the similarity backends. Question vectors are computed once
+    and message vectors are kept in an LRU cache keyed by the normalized text;
+    subclasses only implement how a text is turned into a TextVector.
+    """
+
+    def __init__(self, cache_size=None):
+        self._question_vectors = {}
+        self._lock = threading.Lock()
+        self._message_vector = lru_cache(maxsize=cache_size or settings.Chat.SIMILARITY_CACHE_SIZE)(self._vectorize)
+
+    def _vectorize(self, normalized_text):
+        raise NotImplementedError
+
+    def _vectorize_batch(self, normalized_texts):
+        return [self._vectorize(text) for text in normalized_texts]
+
+    # Vectorizes a batch of scenario questions up front
+    def warm_questions(self, questions):
+        questions = [normalize_text(question) for question in questions if question]
+        missing_questions = [question for question in dict.fromkeys(questions) if question not in self._question_vectors]
+
+        with self._lock:
+            for question, question_vector in zip(missing_questions, self._vectorize_batch(missing_questions)):
+                self._question_vectors[question] = question_vector
+
+        log_print(f"Precomputed vectors for {len(missing_questions)} scenario questions")
+        return len(self._question_vectors)
+
+    def question_vector(self, question):
+        normalized_question = normalize_text(question)
+        question_vector = self._question_vectors.get(normalized_question)
+        if question_vector is None:
+            question_vector = self._vectorize(normalized_question)
+            with self._lock:
+                self._question_vectors[normalized_question] = question_vector
+        return question_vector
+
+    def message_vector(self, message):
+        return self._message_vector(normalize_text(message))
+
+    def similarity(self, message, question):
+        return cosine_similarity(self.message_vector(message), self.question_vector(question))
+
+
+class SpacySimilarity(SimilarityBackend):
+    """
+    Uses the static word vectors of a spaCy model. Only the tokenizer and the
+    vector table are needed, so the model is loaded without its pipeline
+    components; Doc.vector is the same as with the full pipeline.
+    """
+
+    def __init__(self, model_name=None, cache_size=None):
+        super().__init__(cache_size)
+        self.model_name = model_name or settings.Chat.SIMILARITY_SPACY_MODEL
+        self.nlp = self._load_model(self.model_name)
+
+    def _load_model(self, model_name):
+        excluded_pipes = settings.Chat.SIMILARITY_EXCLUDED_PIPES
+        try:
+            return spacy.load(model_name, exclude=excluded_pipes)
+        except OSError:
+            subprocess.run(["python", "-m", "spacy", "download", model_name])
+            return spacy.load(model_name, exclude=excluded_pipes)
+
+    def _to_text_vector(self, doc):
+        return TextVector(tuple(token.orth for token in doc), doc.vector, float(doc.vector_norm))
+
+    def _vectorize(self, normalized_text):
+        return self._to_text_vector(self.nlp.make_doc(normalized_text))
+
+    def _vectorize_batch(self, normalized_texts):
+        return [self._to_text_vector(doc) for doc in self.nlp.tokenizer.pipe(normalized_texts)]
+
+
+class VectorTableSimilarity(SimilarityBackend):
+    """
+    Uses only the word vector table of a spaCy model, exported with
+    export_similarity_vectors.py, and a blank spaCy tokenizer of the same
+    language. The vector table is memory-mapped and token vectors are averaged
+    with NumPy, giving the same scores as SpacySimilarity without loading the
+    model into memory.
+    """
+
+    def __init__(self, vectors_dir=None, cache_size=None):
+        super().__init__(cache_size)
+        self.vectors_dir = vectors_dir or settings.Chat.SIMILARITY_VECTORS_DIR
+
+        with open(os.path.join(self.vectors_dir, VECTOR_TABLE_METADATA_FILE), "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+
+        self.tokenizer = spacy.blank(self.metadata["language"]).tokenizer
+        self.use_lower = self.metadata.get("attr") == "LOWER"
+        self.vectors = np.load(os.path.join(self.vectors_dir, VECTOR_TABLE_VECTORS_FILE), mmap_mode="r")
+        self.keys = np.load(os.path.join(self.vectors_dir, VECTOR_TABLE_KEYS_FILE))
+        self.rows = np.load(os.path.join(self.vectors_dir, VECTOR_TABLE_ROWS_FILE))
+        log_print(f"Loaded vector table of {self.metadata['model']} ({self.vectors.shape[0]} vectors, {len(self.keys)} keys)")
+
+    def _vectorize(self, normalized_text):
+        doc = self.tokenizer(normalized_text)
+        orths = tuple(token.orth for token in doc)
+        vector = np.zeros(self.vectors.shape[1], dtype=np.float32)
+
+        if orths:
+            if self.use_lower:
+                keys = np.fromiter((token.lower for token in doc), dtype=np.uint64, count=len(doc))
+            else:
+                keys = np.array(orths, dtype=np.uint64)
+
+            # Tokens without a vector count as zero vectors in the average (as in spaCy)
+            positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            found = self.keys[positions] == keys
+            if found.any():
+                vector = self.vectors[self.rows[positions[found]]].sum(axis=0, dtype=np.float32) / len(orths)
+
+        return TextVector(orths, vector, float(np.sqrt((vector ** 2).sum())))
+
+
+# Creates the similarity backend selected in settings.Chat.SIMILARITY_BACKEND
+def create_similarity_backend(backend_name=None):
+    backend_name = backend_name or settings.Chat.SIMILARITY_BACKEND
+    log_print(f"Using similarity backend: {backend_name}")
+
+    if backend_name == "vectors":
+        return VectorTableSimilarity()
+    if backend_name == "spacy":
+        return SpacySimilarity()
+    raise ValueError(f"Unknown similarity backend: {backend_name}")
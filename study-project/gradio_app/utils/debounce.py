@@ -0,0 +1,43 @@
+import asyncio
+
+
+class Debouncer:
+    """
+    Server-side debouncing for async event handlers. Every call waits for the
+    debounce window; if a newer call for the same key (e.g. the Gradio session
+    hash) arrived in the meantime, the call is superseded and should be
+    dropped, so only the latest pending input per key is processed. Runs on
+    the event loop, so the state needs no lock.
+    """
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self._latest_calls = {}
+        self._call_counter = 0
+        self.executed_count = 0
+        self.dropped_count = 0
+
+    # Waits for the debounce window and returns True if this call is still the
+    # latest one for the key (and should be executed), False if it was superseded
+    async def wait(self, key):
+        self._call_counter += 1
+        call_id = self._call_counter
+        self._latest_calls[key] = call_id
+
+        if self.window_seconds > 0:
+            await asyncio.sleep(self.window_seconds)
+
+        if self._latest_calls.get(key) != call_id:
+            self.dropped_count += 1
+            return False
+
+        del self._latest_calls[key]
+        self.executed_count += 1
+        return True
+
+    def stats(self):
+        return {
+            "executed": self.executed_count,
+            "dropped": self.dropped_count,
+            "pending": len(self._latest_calls)
+        }
@@ -0,0 +1,34 @@
+import codecs
+
+
+class IncrementalDetokenizer:
+    """
+    Decodes a token stream one token at a time and returns only the text that
+    each token adds. Multi-byte UTF-8 characters that are split across token
+    boundaries are buffered until they are complete, so the concatenated
+    deltas are identical to decoding the full token list at once.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        # Uses the same error handling as tiktoken's Encoding.decode
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.text_length = 0
+
+    # Decodes a single token and returns the newly completed text (may be empty
+    # if the token ends in the middle of a multi-byte character)
+    def push(self, token):
+        token_bytes = self.tokenizer.decode_single_token_bytes(token)
+        delta = self._decoder.decode(token_bytes)
+        self.text_length += len(delta)
+        return delta
+
+    # Flushes any bytes still buffered at the end of the stream
+    def flush(self):
+        delta = self._decoder.decode(b"", final=True)
+        self.text_length += len(delta)
+        return delta
+
+    def reset(self):
+        self._decoder.reset()
+        self.text_length = 0
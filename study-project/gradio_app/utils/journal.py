@@ -0,0 +1,179 @@
+# Group-commit writer for the feedback and completion records
+import os
+import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
+
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print
+
+WRITE = "write"
+APPEND = "append"
+BARRIER = "barrier"
+
+
+class JournalWriter:
+    """
+    Writes files on a background thread in batches (group commit): the records
+    queued while a batch is being written form the next batch, which is made
+    durable with one fsync per file and per newly created directory entry.
+    Every submitted record gets a Future that resolves once its batch is on
+    disk, so callers can wait for durability without doing the I/O themselves.
+    The queue is bounded; submitting blocks while it is full.
+    """
+
+    def __init__(self, max_queue_size=None, max_batch_size=None, max_batch_delay=None):
+        self.max_batch_size = max_batch_size or settings.Feedback.JOURNAL_MAX_BATCH_SIZE
+        self.max_batch_delay = settings.Feedback.JOURNAL_MAX_BATCH_DELAY if max_batch_delay is None else max_batch_delay
+        self._queue = queue.Queue(maxsize=max_queue_size or settings.Feedback.JOURNAL_MAX_QUEUE_SIZE)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+        self.batch_count = 0
+        self.record_count = 0
+
+    # Replaces the content of a file, returns a Future resolving to the path
+    def write(self, path, content):
+        return self._submit(WRITE, path, content)
+
+    # Appends to a file, returns a Future resolving to the path
+    def append(self, path, content):
+        return self._submit(APPEND, path, content)
+
+    # Waits until everything submitted so far is on disk
+    def flush(self, timeout=None):
+        if self._thread is None:
+            return
+        self._submit(BARRIER, None, None).result(timeout)
+
+    # Writes the pending records and stops the writer thread
+    def close(self):
+        with self._start_lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def stats(self):
+        return {
+            "batches": self.batch_count,
+            "records": self.record_count,
+            "pending": self._queue.qsize()
+        }
+
+    def _submit(self, op, path, content):
+        future = Future()
+        if self._closed:
+            # After close (e.g. during interpreter shutdown) records are written directly
+            self._write_batch([(op, path, content, future)])
+            return future
+
+        self._ensure_started()
+        self._queue.put((op, path, content, future))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+
+        with self._start_lock:
+            if self._closed:
+                raise RuntimeError("Journal writer is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+                self._thread.start()
+                # Pending records are written before the interpreter exits
+                atexit.register(self.close)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            record = self._queue.get()
+            if record is None:
+                break
+
+            batch = [record]
+            deadline = time.monotonic() + self.max_batch_delay
+            while len(batch) < self.max_batch_size:
+                try:
+                    record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        open_files = {}
+        new_dirs = set()
+        errors = {}
+
+        for index, (op, path, content, _) in enumerate(batch):
+            if op == BARRIER:
+                continue
+
+            try:
+                directory = os.path.dirname(path)
+                os.makedirs(directory, exist_ok=True)
+                if not os.path.exists(path):
+                    new_dirs.add(directory)
+
+                # One fsync per file covers earlier writes to it in the same batch
+                previous = open_files.pop(path, None)
+                if previous is not None:
+                    previous.close()
+
+                f = open(path, "a" if op == APPEND else "w", encoding="utf-8")
+                try:
+                    f.write(content)
+                    f.flush()
+                except Exception:
+                    f.close()
+                    raise
+                open_files[path] = f
+            except Exception as e:
+                errors[index] = e
+
+        sync_errors = {}
+        for path, f in open_files.items():
+            try:
+                os.fsync(f.fileno())
+            except Exception as e:
+                sync_errors[path] = e
+            finally:
+                f.close()
+
+        for directory in new_dirs:
+            try:
+                dir_fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError:
+                pass
+
+        for index, (op, path, _, future) in enumerate(batch):
+            error = errors.get(index) or sync_errors.get(path)
+            if error is not None:
+                log_print(f"Error writing journal record to {path}: {str(error)}")
+                future.set_exception(error)
+            else:
+                future.set_result(path)
+
+        self.batch_count += 1
+        self.record_count += sum(1 for op, _, _, _ in batch if op != BARRIER)
+
+
+# Writer shared by the feedback model, the task distributor and the completion index
+journal_writer = JournalWriter()
@@ -1,14 +1,105 @@
 import os
-import inspect
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
 from gradio_app.config import GradioSettings
 
-def log_print(message):
-    if GradioSettings.Logging.ENABLED:
-        caller_frame = inspect.stack()[1]
-        filename = os.path.basename(caller_frame.filename)
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
 
-        formatted_message = GradioSettings.Logging.FORMAT.format(
-            filename=filename,
-            message=message
+LOGGER_NAME = "gradio_app"
+
+# Module loggers keyed by the source file of the caller
+_module_loggers = {}
+_queue_listener = None
+
+
+class _SettingsFormatter(logging.Formatter):
+    """
+    Formats records with GradioSettings.Logging.FORMAT.
+    """
+
+    def format(self, record):
+        return GradioSettings.Logging.FORMAT.format(
+            filename=record.filename,
+            message=record.getMessage(),
+            level=record.levelname
         )
-        print(formatted_message)
+
+
+class _PrintHandler(logging.Handler):
+    """
+    Prints records to the current sys.stdout, like the former print based log_print.
+    """
+
+    def emit(self, record):
+        try:
+            print(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+# Sets up the gradio_app logger: level from the settings, printed directly or through a
+# QueueHandler whose listener thread does the printing. Called on first use.
+def configure_logging(level=None, use_queue=None):
+    global _queue_listener
+
+    level = level or GradioSettings.Logging.LEVEL
+    use_queue = GradioSettings.Logging.ASYNC if use_queue is None else use_queue
+
+    root_logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+    print_handler = _PrintHandler()
+    print_handler.setFormatter(_SettingsFormatter())
+
+    if use_queue:
+        record_queue = queue.SimpleQueue()
+        _queue_listener = logging.handlers.QueueListener(record_queue, print_handler)
+        _queue_listener.start()
+        atexit.register(_queue_listener.stop)
+        root_logger.addHandler(logging.handlers.QueueHandler(record_queue))
+    else:
+        root_logger.addHandler(print_handler)
+
+    root_logger.setLevel(level.upper() if isinstance(level, str) else level)
+    # The scripts configure the root logger with their own format
+    root_logger.propagate = False
+    return root_logger
+
+
+# Returns the cached logger of a source file (gradio_app.<module>)
+def get_logger(source_file):
+    logger = _module_loggers.get(source_file)
+    if logger is None:
+        if not logging.getLogger(LOGGER_NAME).handlers:
+            configure_logging()
+        module_name = os.path.splitext(os.path.basename(source_file))[0]
+        logger = logging.getLogger(f"{LOGGER_NAME}.{module_name}")
+        _module_loggers[source_file] = logger
+    return logger
+
+
+# Logs a message as "[caller.py] message". Arguments are merged %-style only if the
+# record passes the level filter, e.g. log_print("Selected %s for %s", key, user_id, level=DEBUG).
+# The caller is looked up with sys._getframe instead of building the whole stack.
+def log_print(message, *args, level=INFO):
+    if not GradioSettings.Logging.ENABLED:
+        return
+
+    caller_frame = sys._getframe(1)
+    source_file = caller_frame.f_code.co_filename
+    logger = _module_loggers.get(source_file) or get_logger(source_file)
+    if not logger.isEnabledFor(level):
+        return
+
+    record = logger.makeRecord(logger.name, level, source_file, caller_frame.f_lineno, message, args, None)
+    logger.handle(record)
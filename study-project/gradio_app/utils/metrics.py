@@ -0,0 +1,464 @@
+# In-process metrics: counters, gauges and HDR-style latency histograms with labels.
+# The registry is rendered as Prometheus text and written as periodic snapshots, so the
+# backend and the report script (separate processes) can read the live values.
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+PROMETHEUS_FILE = "metrics.prom"
+SNAPSHOT_FILE = "metrics.json"
+
+# Histogram resolution: 2**SUB_BUCKET_BITS buckets per power of two microseconds,
+# i.e. values are kept with a relative error of at most 1/16 (about 6%)
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+
+# Index of the bucket holding a value in whole microseconds. Values below SUB_BUCKET_COUNT
+# get one bucket each, larger ones SUB_BUCKET_COUNT buckets per power of two: the value is
+# shifted right until it has SUB_BUCKET_BITS + 1 bits, whose lower SUB_BUCKET_BITS select the bucket.
+def _bucket_index(value_us):
+    if value_us < SUB_BUCKET_COUNT:
+        return value_us
+    shift = value_us.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift << SUB_BUCKET_BITS) + (value_us >> shift)
+
+
+# Exclusive upper bound of a bucket in seconds
+def _bucket_upper_bound(index):
+    if index < SUB_BUCKET_COUNT:
+        return (index + 1) / 1e6
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return (((index & (SUB_BUCKET_COUNT - 1)) + SUB_BUCKET_COUNT + 1) << shift) / 1e6
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class CounterValue:
+    """
+    Monotonically increasing value of one label combination.
+    """
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class GaugeValue:
+    """
+    Value of one label combination that can go up and down.
+    """
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class HistogramValue:
+    """
+    Latency distribution of one label combination. Observations are counted in
+    log-linear buckets (HDR histogram layout), so recording is O(1), memory is
+    bounded by the value range and percentiles are exact to the bucket width.
+    """
+
+    __slots__ = ("buckets", "count", "sum", "min", "max", "_lock")
+
+    def __init__(self, lock):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = lock
+
+    # Records a duration in seconds (negative durations count as 0)
+    def observe(self, seconds):
+        seconds = max(0.0, seconds)
+        index = _bucket_index(int(seconds * 1e6))
+        with self._lock:
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+            self.count += 1
+            self.sum += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    # Records the duration of the with block
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    # Upper bound of the bucket holding the given fraction of observations (capped at the maximum)
+    def percentile(self, fraction):
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, fraction * self.count)
+            seen = 0
+            for index in sorted(self.buckets):
+                seen += self.buckets[index]
+                if seen >= rank:
+                    return min(_bucket_upper_bound(index), self.max)
+            return self.max
+
+    # Number of observations below each bound (cumulative, as Prometheus "le" buckets)
+    def cumulative_counts(self, bounds):
+        with self._lock:
+            ordered = sorted(self.buckets.items())
+        counts = []
+        position = 0
+        seen = 0
+        for bound in bounds:
+            while position < len(ordered) and _bucket_upper_bound(ordered[position][0]) <= bound:
+                seen += ordered[position][1]
+                position += 1
+            counts.append(seen)
+        return counts
+
+    # Count, sum, extremes and percentiles; with_buckets adds the bucket counts (for merging)
+    def summary(self, with_buckets=False):
+        summary = {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.50),
+            "p90": self.percentile(0.90),
+            "p99": self.percentile(0.99)
+        }
+        if with_buckets:
+            with self._lock:
+                summary["buckets"] = {str(index): count for index, count in sorted(self.buckets.items())}
+        return summary
+
+    # Adds the observations of a snapshot summary (with buckets)
+    def merge_summary(self, summary):
+        with self._lock:
+            for index, count in summary.get("buckets", {}).items():
+                self.buckets[int(index)] = self.buckets.get(int(index), 0) + count
+            self.count += summary.get("count", 0)
+            self.sum += summary.get("sum", 0.0)
+            for name, pick in (("min", min), ("max", max)):
+                value = summary.get(name)
+                if value is not None:
+                    current = getattr(self, name)
+                    setattr(self, name, value if current is None else pick(current, value))
+
+
+_VALUE_TYPES = {COUNTER: CounterValue, GAUGE: GaugeValue, HISTOGRAM: HistogramValue}
+
+
+class MetricFamily:
+    """
+    A named metric with a fixed set of label names and one value per label
+    combination, created on first use. A family without labels can be used
+    like its single value (inc, set, observe, time).
+    """
+
+    def __init__(self, name, help_text, kind, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    # Returns the value of a label combination, given positionally or by name
+    def labels(self, *values, **named_values):
+        if named_values:
+            values = tuple(named_values.get(name, "") for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+
+        value = self._values.get(key)
+        if value is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                value = self._values.get(key)
+                if value is None:
+                    value = _VALUE_TYPES[self.kind](self._lock)
+                    self._values[key] = value
+        return value
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, seconds):
+        self.labels().observe(seconds)
+
+    def time(self):
+        return self.labels().time()
+
+    def items(self):
+        with self._lock:
+            return [(tuple(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class MetricsRegistry:
+    """
+    Holds the metric families of the process. Collectors registered with
+    add_collector are called before every render or snapshot to refresh gauges
+    that are read from other components (e.g. queue lengths).
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._writer_thread = None
+        self._writer_stop_event = threading.Event()
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(name, help_text, COUNTER, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(name, help_text, GAUGE, labelnames)
+
+    def histogram(self, name, help_text, labelnames=()):
+        return self._register(name, help_text, HISTOGRAM, labelnames)
+
+    # Returns the existing family of that name, so modules can declare metrics independently
+    def _register(self, name, help_text, kind, labelnames):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, help_text, kind, labelnames)
+                self._families[name] = family
+            elif family.kind != kind or family.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as {family.kind} with labels {family.labelnames}")
+            return family
+
+    def get(self, name):
+        return self._families.get(name)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                log_print(f"Error in metrics collector: {str(e)}")
+        with self._lock:
+            return list(self._families.values())
+
+    #-------------------------------------------------------------------------
+    # EXPOSITION
+    #-------------------------------------------------------------------------
+
+    # Prometheus text exposition format (version 0.0.4)
+    def render_prometheus(self):
+        bounds = settings.Metrics.PROMETHEUS_BUCKETS
+        lines = []
+
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {family.help_text}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+
+            for labels, value in family.items():
+                if family.kind != HISTOGRAM:
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(value.value)}")
+                    continue
+
+                for bound, count in zip(bounds, value.cumulative_counts(bounds)):
+                    bucket_labels = labels + (("le", _format_value(bound)),)
+                    lines.append(f"{family.name}_bucket{_format_labels(bucket_labels)} {count}")
+                lines.append(f"{family.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {value.count}")
+                lines.append(f"{family.name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                lines.append(f"{family.name}_count{_format_labels(labels)} {value.count}")
+
+        return "\n".join(lines) + "\n"
+
+    # JSON-serializable view: counters and gauges as values, histograms as summaries
+    def snapshot(self):
+        metrics = {}
+        for family in self.collect():
+            samples = []
+            for labels, value in family.items():
+                sample = {"labels": dict(labels)}
+                if family.kind == HISTOGRAM:
+                    sample.update(value.summary(with_buckets=True))
+                else:
+                    sample["value"] = value.value
+                samples.append(sample)
+
+            metrics[family.name] = {
+                "type": family.kind,
+                "help": family.help_text,
+                "samples": samples
+            }
+
+        return {
+            "timestamp": time.time(),
+            "pid": os.getpid(),
+            "metrics": metrics
+        }
+
+    # Writes metrics.prom and metrics.json to the directory (each replaced atomically)
+    def write_snapshot(self, directory=None):
+        directory = directory or settings.Metrics.SNAPSHOT_DIR
+        os.makedirs(directory, exist_ok=True)
+
+        contents = {
+            PROMETHEUS_FILE: self.render_prometheus(),
+            SNAPSHOT_FILE: json.dumps(self.snapshot(), indent=2)
+        }
+        for file_name, content in contents.items():
+            path = os.path.join(directory, file_name)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+
+    # Starts a daemon thread that writes a snapshot every interval
+    def start_snapshot_writer(self, directory=None, interval=None):
+        interval = settings.Metrics.SNAPSHOT_INTERVAL_SECONDS if interval is None else interval
+        if not interval or (self._writer_thread and self._writer_thread.is_alive()):
+            return
+
+        self._writer_stop_event.clear()
+        self._writer_thread = threading.Thread(
+            target=self._run_snapshot_writer, args=(directory, interval), name="metrics-snapshot-writer", daemon=True
+        )
+        self._writer_thread.start()
+        log_print(f"Started metrics snapshot writer ({interval} s interval)")
+
+    def stop_snapshot_writer(self):
+        self._writer_stop_event.set()
+        if self._writer_thread:
+            self._writer_thread.join()
+            self._writer_thread = None
+
+    def _run_snapshot_writer(self, directory, interval):
+        while not self._writer_stop_event.wait(interval):
+            try:
+                self.write_snapshot(directory)
+            except Exception as e:
+                log_print(f"Error writing metrics snapshot: {str(e)}")
+
+
+# Reads the last snapshot written by the Gradio app (None if there is none)
+def load_snapshot(directory=None):
+    path = os.path.join(directory or settings.Metrics.SNAPSHOT_DIR, SNAPSHOT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log_print(f"Error reading metrics snapshot {path}: {str(e)}")
+        return None
+
+
+# Combines the histogram samples of a snapshot metric whose labels match the given
+# values (e.g. one stage over all scenarios and conditions) into one summary
+def merge_snapshot_histogram(snapshot_metric, **label_values):
+    merged = HistogramValue(threading.Lock())
+    for sample in (snapshot_metric or {}).get("samples", []):
+        labels = sample.get("labels", {})
+        if all(labels.get(name) == value for name, value in label_values.items()):
+            merged.merge_summary(sample)
+    return merged.summary()
+
+
+class InstrumentedLock:
+    """
+    Wraps a (reentrant) lock and records how long every outermost acquire
+    waited. Nested acquires of a thread that already holds the lock never
+    wait, so they are not recorded.
+    """
+
+    def __init__(self, lock, wait_histogram):
+        self._lock = lock
+        self._wait_histogram = wait_histogram
+        self._local = threading.local()
+
+    def acquire(self, *args, **kwargs):
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            acquired = self._lock.acquire(*args, **kwargs)
+        else:
+            start = time.perf_counter()
+            acquired = self._lock.acquire(*args, **kwargs)
+            self._wait_histogram.observe(time.perf_counter() - start)
+        if acquired:
+            self._local.depth = depth + 1
+        return acquired
+
+    def release(self):
+        self._lock.release()
+        self._local.depth -= 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+# Registry of the Gradio app process
+metrics_registry = MetricsRegistry()
+
+# Metrics shared by several modules
+turn_stage_seconds = metrics_registry.histogram(
+    "study_turn_stage_seconds",
+    "Duration of the stages of a participant's turn",
+    ("stage", "scenario", "condition")
+)
+state_lock_wait_seconds = metrics_registry.histogram(
+    "study_state_lock_wait_seconds",
+    "Time spent waiting for the TaskDistributor state lock"
+)
@@ -0,0 +1,54 @@
+import time
+
+
+class PacingClock:
+    """
+    Paces a stream against absolute deadlines (start time + cumulative planned
+    delay) instead of summing relative sleeps. Time lost to decoding, logging,
+    yielding or a busy server is taken out of the next wait, so the real
+    duration of a stream stays at its planned duration. Records how late every
+    emit was compared to its planned time.
+    """
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.planned_offset = 0.0
+        self.lags = []
+
+    # Moves the next deadline by a planned delay and returns how long to wait
+    # until it (0 if the stream is already behind schedule)
+    def advance(self, delay):
+        self.planned_offset += float(delay)
+        return max(0.0, self.start_time + self.planned_offset - time.monotonic())
+
+    # Records how far behind (positive) or ahead (negative) of the current
+    # deadline an emit happens
+    def mark_emit(self):
+        self.lags.append(time.monotonic() - (self.start_time + self.planned_offset))
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    # Planned-vs-actual summary of the stream (lags in milliseconds)
+    def stats(self):
+        lags = sorted(self.lags)
+        actual_duration = self.elapsed
+
+        stats = {
+            "planned_duration_seconds": round(self.planned_offset, 4),
+            "actual_duration_seconds": round(actual_duration, 4),
+            "drift_seconds": round(actual_duration - self.planned_offset, 4),
+            "emit_count": len(lags),
+            "late_emit_count": sum(1 for lag in lags if lag > 0),
+            "mean_lag_ms": None,
+            "p95_lag_ms": None,
+            "max_lag_ms": None
+        }
+
+        if lags:
+            stats["mean_lag_ms"] = round(sum(lags) / len(lags) * 1000, 3)
+            stats["p95_lag_ms"] = round(lags[min(len(lags) - 1, int(len(lags) * 0.95))] * 1000, 3)
+            stats["max_lag_ms"] = round(lags[-1] * 1000, 3)
+
+        return stats
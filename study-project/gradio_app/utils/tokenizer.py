@@ -0,0 +1,35 @@
+# Shared registry of tiktoken encoders
+import threading
+
+import tiktoken
+from gradio_app.config import settings
+from gradio_app.utils.logger import log_print
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+# Returns the shared encoder for a model (defaults to settings.Chat.TOKENIZER_MODEL_NAME).
+# The BPE ranks are loaded once per model; tiktoken encoders are safe to use
+# from multiple threads, so the same instance is shared by all requests.
+def get_encoder(model_name=None):
+    model_name = model_name or settings.Chat.TOKENIZER_MODEL_NAME
+
+    encoder = _encoders.get(model_name)
+    if encoder is not None:
+        return encoder
+
+    with _encoders_lock:
+        encoder = _encoders.get(model_name)
+        if encoder is None:
+            log_print(f"Loading tiktoken encoder for model: {model_name}")
+            encoder = tiktoken.encoding_for_model(model_name)
+            _encoders[model_name] = encoder
+        return encoder
+
+
+# Loads the encoders at startup, so the first participant does not pay the load cost
+def warm_encoders(model_names=None):
+    for model_name in model_names or [settings.Chat.TOKENIZER_MODEL_NAME]:
+        get_encoder(model_name)
+    return len(_encoders)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Builds the completion index (feedback/completion_index.jsonl) from the existing
+# feedback directory tree. The Gradio app builds it automatically on first start,
+# this script allows to build or rebuild it while the app is stopped.
+
+import os
+import sys
+import logging
+import argparse
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+
+from gradio_app.models.completion_index import CompletionIndex
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build the completion index from the feedback directory')
+    parser.add_argument('--feedback-dir', default=os.path.join(script_dir, "gradio_app", "feedback"), help='Feedback directory of the Gradio app')
+    parser.add_argument('--force', action='store_true', help='Rebuild the index even if it already exists')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    completion_index = CompletionIndex(args.feedback_dir)
+
+    if completion_index.exists() and not args.force:
+        logging.info(f"Completion index already exists at {completion_index.index_path} (use --force to rebuild)")
+        sys.exit(0)
+
+    record_count = completion_index.rebuild()
+    user_completions, global_completions = completion_index.load()
+
+    logging.info(f"Wrote {record_count} completion records to {completion_index.index_path}")
+    logging.info(f"Users: {len(user_completions)}, scenario-condition pairs: {len(global_completions)}")
+    for scenario_condition_key, count in sorted(global_completions.items()):
+        logging.info(f"  {scenario_condition_key}: {count}")
+
+    sys.exit(0)